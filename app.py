@@ -1,167 +1,217 @@
 import streamlit as st
+import numpy as np
 import os
 import json
-import re
-from typing import Any, Dict
+import math
+import pickle
+from collections.abc import Mapping
+from typing import Any, Dict, Optional
+
+from icecream_core.config import (
+    ALIASES_FILE, CONTAINERS_FILE, DB_FILE, DEFAULT_CONTAINERS, DEFAULT_DENSITY, DEFAULT_INGREDIENT_ALIASES,
+    DIAGNOSTICS, EXCLUDE_FILE, INGREDIENT_FILE, INVENTORY_FILE, LEDGER_FILE, LINEUP_FILE, MAX_BATCH_G,
+    PROFILE_LOG_FILE, RECIPES_PATH, STORAGE_BACKEND, THRESHOLD_FILE, UNIT_OPTIONS, UNITS_FILE,
+)
+from icecream_core.containers import container_capacity_g, containers_weight_g, pack_containers, target_weight_g
+from icecream_core.index import (
+    RecipeCatalog, RecipeCycleError, draw_from_stock, explode_recipe, inventory_vector, lineup_targets,
+    max_batches, merge_stock, optimize_allocation, plan_requirements, post_batch_consumption, reorder_rows,
+    scaled_ingredients, scaled_subrecipes, threshold_vector,
+)
+from icecream_core.ledger import InventoryLedger
+from icecream_core.profiler import ProfileStore, count, span, timed
+from icecream_core.schema import (
+    normalize_aliases_schema, normalize_containers_schema, normalize_lineup_schema, normalize_recipes_schema,
+    normalize_thresholds_schema, plan_units, scale_subrecipes, slugify,
+)
+from icecream_core.storage import (
+    FileWatcher, JsonStorage, SaveConflict, WriteBehind, open_storage, read_json, save_merged,
+)
+from icecream_core.units import UnitRegistry, normalize_units_schema, to_grams
 #
 # =========================
 # Config
 # =========================
 st.set_page_config(page_title="Ice Cream App", layout="wide")
 
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+NS_KEEP = 8  # recipes whose scale / step widget state a session keeps
+
+
+# =========================
+# Storage (one watcher, writer and backend per process)
+# =========================
+@st.cache_resource(show_spinner=False)
+def get_file_watcher() -> FileWatcher:
+    # One watcher per process; every session reads versions from it
+    return FileWatcher(
+        [RECIPES_PATH, LINEUP_FILE, INVENTORY_FILE, INGREDIENT_FILE, THRESHOLD_FILE,
+         EXCLUDE_FILE, CONTAINERS_FILE, UNITS_FILE, ALIASES_FILE],
+        logs=[LEDGER_FILE],
+    )
+
+@st.cache_resource(show_spinner=False)
+def get_write_behind() -> WriteBehind:
+    # One writer per process, so saves from every session coalesce together
+    return WriteBehind(on_written=get_file_watcher().check)
 
-RECIPES_PATH    = os.path.join(BASE_DIR, "recipes.json")
-LINEUP_FILE     = os.path.join(BASE_DIR, "weekly_lineup.json")
-INVENTORY_FILE  = os.path.join(BASE_DIR, "inventory.json")  # flavor inventory
-INGREDIENT_FILE = os.path.join(BASE_DIR, "ingredient_inventory.json")
-THRESHOLD_FILE  = os.path.join(BASE_DIR, "ingredient_thresholds.json")
-EXCLUDE_FILE    = os.path.join(BASE_DIR, "excluded_ingredients.json")
+@st.cache_data(max_entries=64, show_spinner=False)
+def _load_json_cached(path: str, version: str) -> Any:
+    # version (content hash) is only here to key the cache; the body only runs on a miss
+    count("json_cache.miss")
+    return read_json(path)
 
-UNIT_OPTIONS = ["cans", "50lbs bags", "grams", "liters", "gallons"]
-UNIT_FACTORS = {"g": 1.0, "kg": 1000.0, "lb": 453.59237, "oz": 28.349523125}
+def _read_json_counted(path: str, version: str) -> Any:
+    count("json_cache.read")
+    return _load_json_cached(path, version)
+
+@st.cache_resource(show_spinner=False)
+def get_storage():
+    """The process-wide storage backend picked by STORAGE_BACKEND."""
+    if STORAGE_BACKEND == "json":
+        return JsonStorage(get_file_watcher(), get_write_behind(), reader=_read_json_counted)
+    return open_storage(STORAGE_BACKEND, DB_FILE)
+
+@st.cache_resource(show_spinner=False)
+def get_profiler() -> ProfileStore:
+    # One store per process: recent reruns of every session (and the optional JSONL log)
+    return ProfileStore(log_path=PROFILE_LOG_FILE)
 
 
 # =========================
 # Helpers (IO + keys)
 # =========================
-def _mtime(path: str) -> float:
-    try:
-        return os.path.getmtime(path)
-    except FileNotFoundError:
-        return 0.0
-
-@st.cache_data(ttl=60)
-def _load_json_cached(path: str, mtime: float) -> Any:
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
-
 def load_json(path: str, default: Any):
-    if not os.path.exists(path):
-        return default
     try:
-        return _load_json_cached(path, _mtime(path))
+        with span("load_json"):
+            return get_storage().load(path, default)
     except json.JSONDecodeError as e:
         st.error(f"❌ Invalid JSON: {os.path.basename(path)}")
         st.caption(f"Error: {e.msg} at line {e.lineno}, column {e.colno}")
         st.stop()
 
-def save_json(path: str, data: Any):
-    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+def save_json(path: str, data: Any, wait: bool = False):
+    """Save a whole document (JSON: queued atomic write, see WriteBehind; `wait` blocks until it's on disk)."""
+    get_storage().save(path, data, wait=wait)
 
-def slugify(s: str) -> str:
-    return re.sub(r"[^a-z0-9]+", "_", (s or "x").lower()).strip("_")
+def document_version(path: str) -> Optional[str]:
+    """Version stamp of a persisted document: changes whenever anyone saves it."""
+    return get_storage().version(path)
+
+def save_json_merged(path: str, changes: Mapping[str, Any], base: Mapping[str, Any], base_version: Optional[str] = None,
+                     default: Any = None, normalize=None) -> list[SaveConflict]:
+    """Per-key merged save (see icecream_core.storage.save_merged)."""
+    try:
+        return save_merged(get_storage(), path, changes, base, base_version, default, normalize)
+    except json.JSONDecodeError as e:
+        st.error(f"❌ Invalid JSON: {os.path.basename(path)}")
+        st.caption(f"Error: {e.msg} at line {e.lineno}, column {e.colno}")
+        st.stop()
 
 def ns_key(ns: str, name: str) -> str:
     return f"{ns}__{name}"
 
-def to_grams(amount: float, unit: str) -> float:
-    return float(amount) * UNIT_FACTORS.get((unit or "g").lower(), 1.0)
-###
-def scale_subrecipes(subrecipes: dict, scale_factor: float) -> dict:
-    """Return a scaled copy of subrecipes (ingredients scaled, instructions unchanged)."""
-    scaled_subs = {}
-    for sname, srec in (subrecipes or {}).items():
-        if not isinstance(srec, dict):
+def touch_namespaces(group: tuple, keep: int = NS_KEEP) -> list[tuple]:
+    """Mark a group of key namespaces (e.g. one recipe's scale__/steps__ keys)
+    as just used, and delete the keys of the least recently used groups
+    beyond `keep`. A group with a batch in progress (a "step" key that
+    isn't None) is never evicted. Returns the evicted groups.
+    """
+    ss = st.session_state
+    lru = ss.setdefault("_ns_lru", {})  # insertion order = recency
+    lru.pop(group, None)
+    lru[group] = True
+    evicted = []
+    for old in list(lru):
+        if len(lru) <= keep:
+            break
+        if old == group or any(ss.get(ns_key(p, "step")) is not None for p in old):
             continue
-        base_ings = (srec.get("ingredients") or {})
-        new_ings = {}
-        for ing, qty in base_ings.items():
-            try:
-                new_ings[ing] = round(float(qty) * scale_factor, 2)
-            except Exception:
-                # keep non-numeric as-is
-                new_ings[ing] = qty
-
-        scaled_subs[sname] = {
-            "ingredients": new_ings,
-            "instruction": (srec.get("instruction") or []),
-        }
-    return scaled_subs
-###
+        prefixes = tuple(f"{p}__" for p in old)
+        for key in [k for k in ss if str(k).startswith(prefixes)]:
+            del ss[key]
+        del lru[old]
+        evicted.append(old)
+    return evicted
+
+def session_state_size() -> tuple[int, int]:
+    """(keys, approximate pickled bytes) held in this session's state."""
+    ss = st.session_state
+    total = 0
+    keys = list(ss.keys())
+    for k in keys:
+        try:
+            total += len(pickle.dumps(ss[k]))
+        except Exception:  # widget values that can't be read or pickled
+            pass
+    return len(keys), total
 
-# =========================
-# Recipe schema normalizer
-# =========================
-def normalize_recipes_schema(recipes: dict) -> dict:
-    if not isinstance(recipes, dict):
-        return {}
-    for name, r in list(recipes.items()):
-        if not isinstance(r, dict):
-            continue
-        r.setdefault("ingredients", {})
-        instr = r.get("instruction", [])
-        if instr is None:
-            instr = []
-        elif isinstance(instr, str):
-            instr = [instr]
-        r["instruction"] = instr
-        r.setdefault("subrecipes", {})
-        if not isinstance(r["subrecipes"], dict):
-            r["subrecipes"] = {}
-
-        for sname, s in r["subrecipes"].items():
-            if not isinstance(s, dict):
-                continue
-            s.setdefault("ingredients", {})
-            sinstr = s.get("instruction", [])
-            if sinstr is None:
-                sinstr = []
-            elif isinstance(sinstr, str):
-                sinstr = [sinstr]
-            s["instruction"] = sinstr
-    return recipes
+def _script_run_ctx():
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+    except ImportError:  # moved around between Streamlit versions
+        return None
+    return get_script_run_ctx()
+
+def widget_count() -> int:
+    """Widgets created so far in this script run (0 if Streamlit doesn't say)."""
+    return len(getattr(_script_run_ctx(), "widget_ids_this_run", None) or ())
 
 
 # =========================
-# Threshold/inventory schema normalizers
+# Cached loaders (one per document version)
 # =========================
-def get_all_ingredients_from_recipes(recipes: Dict[str, Any]) -> list[str]:
-    names = set()
-    for r in (recipes or {}).values():
-        if not isinstance(r, dict):
-            continue
-        for ing in (r.get("ingredients") or {}).keys():
-            names.add(str(ing).strip())
-        for s in (r.get("subrecipes") or {}).values():
-            if not isinstance(s, dict):
-                continue
-            for ing in (s.get("ingredients") or {}).keys():
-                names.add(str(ing).strip())
-    return sorted(names)
-
-def normalize_thresholds_schema(thresholds: Dict[str, Any]) -> Dict[str, Any]:
-    upgraded: Dict[str, Any] = {}
-    for ing, val in (thresholds or {}).items():
-        if isinstance(val, dict):
-            min_val = float(val.get("min", 0) or 0)
-            unit = val.get("unit", "grams")
-            if unit not in UNIT_OPTIONS:
-                unit = "grams"
-            upgraded[ing] = {"min": min_val, "unit": unit}
-        else:
-            upgraded[ing] = {"min": float(val) if val is not None else 0.0, "unit": "grams"}
-    return upgraded
-
-def normalize_inventory_schema(raw: dict) -> tuple[dict, bool]:
-    inv, changed = {}, False
-    for k, v in (raw or {}).items():
-        if isinstance(v, dict):
-            amt = float(v.get("amount", 0) or 0)
-            unit = (v.get("unit") or "g").lower()
-        else:
-            amt = float(v or 0)
-            unit = "g"
-            changed = True
-        inv[str(k)] = {"amount": amt, "unit": unit}
-    return inv, changed
+@st.cache_resource(max_entries=2, show_spinner=False)
+def _load_unit_registry_cached(path: str, version: Optional[str]) -> UnitRegistry:
+    try:
+        raw = get_storage().load(path, {})
+    except json.JSONDecodeError:
+        raw = {}
+    return UnitRegistry(normalize_units_schema(raw))
+
+def load_unit_registry() -> UnitRegistry:
+    return _load_unit_registry_cached(UNITS_FILE, get_storage().version(UNITS_FILE))
+
+def load_ingredient_aliases() -> Dict[str, str]:
+    return normalize_aliases_schema(load_json(ALIASES_FILE, DEFAULT_INGREDIENT_ALIASES))
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def _load_recipe_catalog_cached(path: str, version: str, aliases_version: Optional[str]) -> RecipeCatalog:
+    # cache_resource hands every session the same object (no pickling/copying);
+    # the document versions are only here to build a new catalog when either one changes.
+    raw = get_storage().load(path, {})
+    with span("normalize_recipes_schema"):
+        normalized = normalize_recipes_schema(raw)
+    with span("compile_recipe_index"):
+        return RecipeCatalog(path, version, normalized, load_ingredient_aliases())
+
+def load_recipe_catalog(path: str) -> RecipeCatalog:
+    storage = get_storage()
+    try:
+        return _load_recipe_catalog_cached(path, storage.version(path), storage.version(ALIASES_FILE))
+    except json.JSONDecodeError as e:
+        st.error(f"❌ Invalid JSON: {os.path.basename(path)}")
+        st.caption(f"Error: {e.msg} at line {e.lineno}, column {e.colno}")
+        st.stop()
+
+def load_containers() -> Dict[str, Any]:
+    return normalize_containers_schema(load_json(CONTAINERS_FILE, DEFAULT_CONTAINERS))
+
+@st.cache_resource(show_spinner=False)
+def get_ledger() -> InventoryLedger:
+    # One ledger (and one materialized view) per process, shared by all sessions
+    return get_storage().ledger()
+
+def load_inventory() -> Dict[str, Any]:
+    ledger = get_ledger()
+    if ledger.stale():
+        ledger.refresh()
+    return ledger.inventory()
 
 
 # =========================
 # Render helpers
 # =========================
+@timed()
 def render_ingredients_block(ingredients: dict):
     if not ingredients:
         return
@@ -181,6 +231,7 @@ def render_ingredients_block(ingredients: dict):
             line += f" ({whole_gal} gal + {rem_g} g)"
         st.write(line)
 
+@timed()
 def render_instructions(title: str, steps: list[str]):
     if not steps:
         return
@@ -188,6 +239,7 @@ def render_instructions(title: str, steps: list[str]):
         for line in steps:
             st.markdown(f"- {line}")
 
+@timed()
 def render_subrecipes(subrecipes: dict):
     if not subrecipes:
         return
@@ -215,35 +267,75 @@ def render_subrecipes(subrecipes: dict):
 #     render_instructions("🛠️ Instructions", rec.get("instruction", []))
 #     render_subrecipes(rec.get("subrecipes", {}))
 
-def show_scaled_result(selected_name: str, scaled_ingredients: dict, recipes_dict: dict, scale_factor: float):
+@timed()
+def show_scaled_result(selected_name: str, scaled_ings: dict, recipes_dict: Mapping[str, Any], scale_factor: float):
     base = recipes_dict.get(selected_name, {}) or {}
+    entry = catalog.index.recipes.get(selected_name)
+    base_subs = base.get("subrecipes", {}) or {}
 
     rec = {
-        "ingredients": scaled_ingredients or {},
+        "ingredients": scaled_ings or {},
         "instruction": base.get("instruction", []) or [],
-        "subrecipes": scale_subrecipes(base.get("subrecipes", {}) or {}, scale_factor),
+        "subrecipes": (
+            scaled_subrecipes(entry, base_subs, scale_factor) if entry is not None
+            else scale_subrecipes(base_subs, scale_factor)
+        ),
     }
 
     render_ingredients_block(rec.get("ingredients", {}))
     render_instructions("🛠️ Instructions", rec.get("instruction", []))
     render_subrecipes(rec.get("subrecipes", {}))
 
+@timed()
+def render_exploded(selected_name: str, scale_factor: float):
+    idx = catalog.index
+    entry = idx.recipes.get(selected_name)
+    if entry is None or not (entry.subrecipes or idx.depends_on[selected_name] or selected_name in idx.blocked):
+        return
+    with st.expander("🧮 Raw ingredients (all sub-recipes expanded)", expanded=False):
+        try:
+            raw = explode_recipe(idx, selected_name, scale_factor)
+        except RecipeCycleError as e:
+            st.warning(f"Can't expand: {e}")
+            return
+        for k, v in sorted(raw.items(), key=lambda kv: -kv[1]):
+            st.write(f"- {k}: {int(round(v))} g")
+
+
+# =========================
+# Rerun profile (finished at the end of the script; see page_diagnostics)
+# =========================
+_profile = get_profiler().start(session=getattr(_script_run_ctx(), "session_id", ""))
+
+def _finish_profile():
+    _profile.extra["session_keys"] = len(st.session_state)
+    if PROFILE_LOG_FILE:
+        _profile.extra["session_bytes"] = session_state_size()[1]
+    get_profiler().finish(_profile)
+
 
 # =========================
 # Load recipes (single source of truth)
 # =========================
-if not os.path.exists(RECIPES_PATH):
-    st.error(f"Missing recipes file: {RECIPES_PATH}")
-    st.info("Fix: add recipes.json to the repo (same folder as app.py).")
-    st.stop()
+try:
+    if get_storage().version(RECIPES_PATH) is None:
+        st.error(f"Missing recipes file: {RECIPES_PATH}")
+        st.info("Fix: add recipes.json to the repo (same folder as app.py).")
+        st.stop()
 
-recipes: Dict[str, Any] = load_json(RECIPES_PATH, default={})
-recipes = normalize_recipes_schema(recipes)
+    with span("load_recipe_catalog"):
+        catalog = load_recipe_catalog(RECIPES_PATH)
+    recipes: Mapping[str, Any] = catalog.recipes
 
-recipe_names = sorted(recipes.keys())
-if not recipe_names:
-    st.error("No recipes found in recipes.json.")
-    st.stop()
+    recipe_names = catalog.names
+    if not recipe_names:
+        st.error("No recipes found in recipes.json.")
+        st.stop()
+except BaseException:
+    # st.stop() or a load error ends the run before the pages' try/finally: record it here
+    _profile.label = "(recipes not loaded)"
+    _finish_profile()
+    raise
 
 
 # =========================
@@ -267,23 +359,27 @@ def page_batching():
 
     rec = recipes.get(selected_name, {}) or {}
     base_ings = rec.get("ingredients", {}) or {}
-    original_weight = float(sum([float(x) for x in base_ings.values()]) or 0.0)
+    entry = catalog.index.recipes[selected_name]
+    original_weight = entry.total_weight
 
     st.divider()
     st.subheader("Scale")
 
-    # Namespace scaling keys by recipe so you never collide
-    scale_ns = f"scale__{slugify(selected_name)}"
+    # Namespace scaling keys by recipe so you never collide; only the
+    # NS_KEEP most recently opened recipes keep theirs
+    scale_ns = f"scale__{entry.slug}"
+    touch_namespaces((scale_ns, f"steps__{entry.slug}"))
     def k(name: str) -> str:
         return ns_key(scale_ns, name)
 
+    containers = load_containers()
+
     scale_mode = st.radio(
         "Method",
         [
             "Target batch weight (g)",
-            "Container: 5 L",
-            "Container: 1.5 gal",
-            "Containers: combo (5 L + 1.5 gal)",
+            "Containers",
+            "Fill capacity (best container mix)",
             "Scale by ingredient weight",
             "Multiplier x",
         ],
@@ -292,17 +388,13 @@ def page_batching():
     )
 
     density_g_per_ml = None
-    if scale_mode in {"Container: 5 L", "Container: 1.5 gal", "Containers: combo (5 L + 1.5 gal)"}:
+    if scale_mode in {"Containers", "Fill capacity (best container mix)"}:
         density_g_per_ml = st.number_input(
             "Mix density (g/mL)",
-            min_value=0.5, max_value=1.5, value=1.03, step=0.01,
+            min_value=0.5, max_value=1.5, value=DEFAULT_DENSITY, step=0.01,
             key=k("density"),
         )
 
-    GAL_TO_L     = 3.785411784
-    VOL_5L_L     = 5.0
-    VOL_1_5GAL_L = 1.5 * GAL_TO_L
-
     info_lines: list[str] = []
     scale_factor = 1.0
     target_weight = None
@@ -322,39 +414,53 @@ def page_batching():
         scale_factor = (target_weight / original_weight) if original_weight else 1.0
         info_lines.append(f"Target weight: {target_weight:,.0f} g")
 
-    elif scale_mode == "Container: 5 L":
-        n_5l = st.number_input("How many 5 L pans?", min_value=1, value=1, step=1, key=k("n5l"))
-        total_l = n_5l * VOL_5L_L
-        density_g_per_ml = density_g_per_ml or 1.03
-        target_weight = total_l * 1000.0 * density_g_per_ml
-        scale_factor = (target_weight / original_weight) if original_weight else 1.0
-        info_lines += [f"Total volume: {total_l:,.2f} L", f"Target weight: {target_weight:,.0f} g"]
-
-    elif scale_mode == "Container: 1.5 gal":
-        n_15 = st.number_input("How many 1.5 gal tubs?", min_value=1, value=1, step=1, key=k("n15"))
-        total_l = n_15 * VOL_1_5GAL_L
-        density_g_per_ml = density_g_per_ml or 1.03
-        target_weight = total_l * 1000.0 * density_g_per_ml
-        scale_factor = (target_weight / original_weight) if original_weight else 1.0
-        info_lines += [f"Total volume: {total_l:,.2f} L", f"Target weight: {target_weight:,.0f} g"]
+    elif scale_mode == "Containers":
+        counts = {}
+        cols = st.columns(len(containers))
+        for i, (cname, col) in enumerate(zip(containers, cols)):
+            with col:
+                counts[cname] = st.number_input(
+                    cname, min_value=0, value=1 if i == 0 else 0, step=1,
+                    key=k(f"n__{slugify(cname)}"),
+                )
+        density_g_per_ml = density_g_per_ml or DEFAULT_DENSITY
+        target_weight = containers_weight_g(counts, containers, density_g_per_ml)
+        if target_weight <= 0:
+            st.warning("Set at least one container.")
+        scale_factor = (target_weight / original_weight) if original_weight and target_weight > 0 else 1.0
+        total_l = sum(n * containers[c]["volume_l"] * containers[c]["fill"] for c, n in counts.items())
+        info_lines += [
+            "  |  ".join(f"{c}: {n}" for c, n in counts.items()),
+            f"Total volume: {total_l:,.2f} L",
+            f"Target weight: {target_weight:,.0f} g",
+        ]
 
-    elif scale_mode == "Containers: combo (5 L + 1.5 gal)":
+    elif scale_mode == "Fill capacity (best container mix)":
         c1, c2 = st.columns(2)
         with c1:
-            n_5l = st.number_input("5 L pans", min_value=0, value=1, step=1, key=k("n5l_combo"))
+            capacity = st.number_input(
+                "Batch / machine capacity (g)",
+                min_value=1.0,
+                max_value=MAX_BATCH_G,
+                value=min(float(original_weight or 1000.0), MAX_BATCH_G),
+                step=100.0,
+                key=k("capacity"),
+            )
         with c2:
-            n_15 = st.number_input("1.5 gal tubs", min_value=0, value=0, step=1, key=k("n15_combo"))
-        total_l = n_5l * VOL_5L_L + n_15 * VOL_1_5GAL_L
-        if total_l <= 0:
-            st.warning("Set at least one container.")
-            total_l = 0.0
-        density_g_per_ml = density_g_per_ml or 1.03
-        target_weight = total_l * 1000.0 * density_g_per_ml
-        scale_factor = (target_weight / original_weight) if original_weight else 1.0
+            max_slots = st.number_input(
+                "Freezer slots available (0 = no limit)",
+                min_value=0.0, value=0.0, step=1.0,
+                key=k("max_slots"),
+            )
+        density_g_per_ml = density_g_per_ml or DEFAULT_DENSITY
+        packing = pack_containers(capacity, containers, density_g_per_ml, max_slots or None)
+        target_weight = packing.packed_g
+        if target_weight <= 0:
+            st.warning("No container fits in that capacity.")
+        scale_factor = (target_weight / original_weight) if original_weight and target_weight > 0 else 1.0
         info_lines += [
-            f"5 L pans: {n_5l}  |  1.5 gal tubs: {n_15}",
-            f"Total volume: {total_l:,.2f} L",
-            f"Target weight: {target_weight:,.0f} g",
+            "Best fit: " + "  |  ".join(f"{c}: {n}" for c, n in packing.counts.items() if n),
+            f"Target weight: {target_weight:,.0f} g  (leftover capacity {packing.leftover_g:,.0f} g, {packing.slots:g} slots)",
         ]
 
     elif scale_mode == "Scale by ingredient weight":
@@ -381,7 +487,7 @@ def page_batching():
         )
         info_lines.append(f"Scale factor: ×{scale_factor:.3f}")
 
-    scaled = {ing: round(float(qty) * scale_factor, 2) for ing, qty in base_ings.items()}
+    scaled = scaled_ingredients(entry, scale_factor)
     total_scaled = round(sum(scaled.values()), 2)
 
     st.metric("Total batch weight (g)", f"{total_scaled:,.2f}")
@@ -390,17 +496,38 @@ def page_batching():
         st.caption(f"Estimated volume: {est_l:,.2f} L @ {density_g_per_ml:.2f} g/mL")
     for line in info_lines:
         st.caption(line)
+    if total_scaled > 0 and scale_mode not in {"Containers", "Fill capacity (best container mix)"}:
+        packing = pack_containers(total_scaled, containers, density_g_per_ml or DEFAULT_DENSITY)
+        fill = "  |  ".join(f"{c}: {n}" for c, n in packing.counts.items() if n) or "nothing fits"
+        st.caption(f"📦 Fills {fill}  (leftover {packing.leftover_g:,.0f} g)")
 
     st.divider()
     #show_scaled_result(selected_name, scaled, recipes)
     show_scaled_result(selected_name, scaled, recipes, scale_factor)
+    render_exploded(selected_name, scale_factor)
 
     st.divider()
     st.subheader("Execute batch (step-by-step)")
+    batch_executor(selected_name, entry.slug, scaled, scale_factor)
+
+
+# Partial reruns need Streamlit 1.33+; older versions rerun the whole page
+fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None) or (lambda f: f)
 
-    step_ns = f"steps__{slugify(selected_name)}"
+
+@fragment
+def batch_executor(name: str, slug: str, scaled: dict, scale_factor: float):
+    """Step-by-step weighing for one batch.
+
+    Runs as a fragment: Start / Back / Next only rerun this function, not the
+    page. Quantities are snapshotted when the batch starts, so a step change
+    never rescales, and changing the scale mid-batch doesn't move the numbers.
+    """
+    step_ns = f"steps__{slug}"
     step_key  = ns_key(step_ns, "step")
     order_key = ns_key(step_ns, "order")
+    batch_key = ns_key(step_ns, "batch")    # (grams per ingredient, scale factor) at start
+    posted_key = ns_key(step_ns, "posted")  # txn id once the batch was taken out of inventory
 
     if step_key not in st.session_state:
         st.session_state[step_key] = None
@@ -411,14 +538,17 @@ def page_batching():
     if start_clicked:
         st.session_state[step_key] = 0
         st.session_state[order_key] = list(scaled.keys())
+        st.session_state[batch_key] = (dict(scaled), scale_factor)
+        st.session_state[posted_key] = None
 
     step = st.session_state[step_key]
     order = st.session_state[order_key]
+    grams_by_ing, scale_factor = st.session_state.get(batch_key) or (scaled, scale_factor)
 
     if step is not None:
         if step < len(order):
             ing = order[step]
-            grams = float(scaled.get(ing, 0))
+            grams = float(grams_by_ing.get(ing, 0))
             st.info(f"**{ing} {grams:.0f} grams**")
 
             c1, c2, c3 = st.columns(3)
@@ -433,29 +563,158 @@ def page_batching():
                 st.button(
                     "⏹ Reset",
                     key=ns_key(step_ns, "reset"),
-                    on_click=lambda: st.session_state.update({step_key: None}),
+                    on_click=lambda: st.session_state.update({step_key: None, batch_key: None, posted_key: None}),
                 )
             with c3:
                 st.button(
                     "Next ➡️",
                     key=ns_key(step_ns, "next"),
-                    on_click=lambda: st.session_state.update({step_key: step + 1}),
+                    on_click=_next_step,
+                    args=(step_key, posted_key, step, len(order), name, scale_factor),
                 )
         else:
             st.success("✅ Batch complete")
+            txn = st.session_state.get(posted_key)
+            if txn:
+                st.caption(f"Inventory updated ({txn}).")
             st.button(
                 "Start over",
                 key=ns_key(step_ns, "restart"),
-                on_click=lambda: st.session_state.update({step_key: 0}),
+                on_click=lambda: st.session_state.update({step_key: 0, posted_key: None}),
             )
 
 
+def _next_step(step_key: str, posted_key: str, step: int, n_steps: int, name: str, scale_factor: float):
+    ss = st.session_state
+    ss[step_key] = step + 1
+    if step + 1 >= n_steps and not ss.get(posted_key):
+        ss[posted_key] = post_batch_consumption(get_ledger(), catalog.index, name, scale_factor)
+
+
+def _forget_table_edits(ns: str, keys=None, table: str = "rows"):
+    # A table editor keeps its edits as deltas on top of the data it was given;
+    # drop them so the page shows the new values instead of writing stale ones back.
+    # Unsaved rows of `table` go too (only `keys` if given); other rows are
+    # still in the pending dict and come back through _with_edits().
+    ss = st.session_state
+    for key in [k for k in ss if str(k).startswith(ns_key(ns, "table__"))]:
+        del ss[key]
+    pending = ss.get(ns_key(ns, f"pending__{table}"), {})
+    bases = ss.get(ns_key(ns, "bases")) if table == "rows" else None
+    for k in list(pending) if keys is None else keys:
+        pending.pop(k, None)
+        if bases:
+            bases[0].pop(k, None)
+    if table == "rows" and not pending:
+        ss.pop(ns_key(ns, "bases"), None)
+
+
+def _paged(ns: str, items: list, sizes=(25, 50, 100)) -> tuple[list, str]:
+    """Server-side paging: only the current page's rows go into the table editor.
+
+    Also returns a key for that editor, so edits stay attached to the rows
+    they were made on when the page, page size or filter changes.
+    """
+    ss = st.session_state
+    c1, c2 = st.columns([1, 3])
+    size = c1.selectbox("Rows per page", sizes, index=1, key=ns_key(ns, "page_size"))
+    n_pages = max(1, math.ceil(len(items) / size))
+    page_key = ns_key(ns, "page")
+    if ss.get(page_key, 1) > n_pages:  # the filter shrank the list
+        ss[page_key] = n_pages
+    page = int(c2.number_input(f"Page (of {n_pages})", min_value=1, max_value=n_pages, value=1, step=1, key=page_key))
+    first = (page - 1) * size
+    q = slugify(ss.get(ns_key(ns, "filter"), ""))
+    return items[first:first + size], ns_key(ns, f"table__{size}_{page}__{q}")
+
+
+def _with_edits(ns: str, rows: list[dict], table: str = "rows") -> list[dict]:
+    """A page of stored rows with this session's unsaved edits on top (what the editor gets)."""
+    pending = st.session_state.get(ns_key(ns, f"pending__{table}"), {})
+    return [pending.get(row["Ingredient"], row) for row in rows]
+
+
+def _table_edits(ns: str, rows: list[dict], after: list[dict], table: str = "rows") -> Dict[str, dict]:
+    """Unsaved rows of a paged table editor, from every page: {ingredient: edited row}.
+
+    Only the current page has an editor, and its state is dropped when
+    another page is shown, so each rerun folds the page's rows that differ
+    from the stored `rows` into a session dict (and drops rows edited back).
+    Save writes the whole dict.
+    """
+    pending = st.session_state.setdefault(ns_key(ns, f"pending__{table}"), {})
+    for old, new in zip(rows, after):
+        if new != old:
+            pending[old["Ingredient"]] = new
+        else:
+            pending.pop(old["Ingredient"], None)
+    elsewhere = len(pending.keys() - {row["Ingredient"] for row in rows})
+    if elsewhere:
+        st.caption(f"{elsewhere} unsaved change(s) on other pages or hidden by the filter; saving includes them.")
+    return pending
+
+
+def _edit_bases(ns: str, keys, base_of, version: Optional[str] = None) -> tuple[Dict[str, Any], Optional[str]]:
+    """What each edited row looked like when it was first edited, kept across
+    reruns until it's saved or discarded; plus the document version then."""
+    ss = st.session_state
+    old_rows, old_version = ss.get(ns_key(ns, "bases")) or ({}, None)
+    rows = {k: old_rows[k] if k in old_rows else base_of(k) for k in keys}
+    version = old_version if old_rows else version
+    ss[ns_key(ns, "bases")] = (rows, version)
+    return rows, version
+
+
+def _show_conflicts(ns: str, resolve):
+    """Conflict report left by the last save; `resolve(ns, overwrite)` handles the buttons."""
+    conflicts = st.session_state.get(ns_key(ns, "conflicts"))
+    if not conflicts:
+        return
+    st.warning(f"{len(conflicts)} row(s) were changed on another device while you were editing. They were not saved.")
+    st.dataframe([{k: v for k, v in c.items() if not k.startswith("_")} for c in conflicts], use_container_width=True, hide_index=True)
+    c1, c2 = st.columns(2)
+    c1.button("Overwrite with mine", key=ns_key(ns, "conflicts_mine"), on_click=resolve, args=(ns, True))
+    c2.button("Keep theirs", key=ns_key(ns, "conflicts_theirs"), on_click=resolve, args=(ns, False))
+
+
+def _resolve_inventory_conflicts(ns: str, overwrite: bool):
+    conflicts = st.session_state.pop(ns_key(ns, "conflicts"), None) or []
+    if overwrite:
+        get_ledger().append([ev for c in conflicts for ev in c["_events"]])
+    _forget_table_edits(ns)
+
+
+def _resolve_threshold_conflicts(ns: str, overwrite: bool):
+    conflicts = st.session_state.pop(ns_key(ns, "conflicts"), None) or []
+    if overwrite and conflicts:
+        save_json_merged(
+            THRESHOLD_FILE,
+            {c["Ingredient"]: c["_mine"] for c in conflicts},
+            {c["Ingredient"]: c["_theirs"] for c in conflicts},
+            normalize=lambda raw: catalog.index.names.rekey(normalize_thresholds_schema(raw)),
+        )
+    _forget_table_edits(ns)
+
+
+def _record_inventory_event(ns: str):
+    ss = st.session_state
+    etype, ing = ss[ns_key(ns, "ev_type")], ss[ns_key(ns, "ev_ing")]
+    amt, unit = ss[ns_key(ns, "ev_amt")], ss[ns_key(ns, "ev_unit")]
+    ledger = get_ledger()
+    ev = {"type": etype, "ingredient": ing, "amount": amt, "unit": unit, "note": ss[ns_key(ns, "ev_note")]}
+    # usage and waste come out of whichever spellings still hold the stock
+    ledger.append(draw_from_stock(ledger, catalog.index.names, [ev]))
+    _forget_table_edits(ns, [ing])
+    ss[ns_key(ns, "ev_msg")] = f"Recorded {etype}: {amt:g} {unit} {ing}."
+
+
 def page_ingredient_inventory():
     ns = "inv"
 
-    all_ingredients = get_all_ingredients_from_recipes(recipes)
+    all_ingredients = catalog.index.ingredients
+    names = catalog.index.names
     excluded = load_json(EXCLUDE_FILE, [])
-    excluded = [e for e in excluded if e in all_ingredients]
+    excluded = list(dict.fromkeys(names.canonical(e) for e in excluded if names.id(e) >= 0))
 
     st.subheader("Ingredient Inventory")
 
@@ -469,52 +728,110 @@ def page_ingredient_inventory():
         save_json(EXCLUDE_FILE, exclude_list)
         st.success("Saved.")
 
-    raw_inv = load_json(INGREDIENT_FILE, {})
-    inv, changed = normalize_inventory_schema(raw_inv)
+    ledger = get_ledger()
+    stored = load_inventory()
+    inv = names.rekey(stored, merge_stock)
 
     # Ensure all ingredients exist
     for ing in all_ingredients:
         inv.setdefault(ing, {"amount": 0.0, "unit": "g"})
 
-    if changed:
-        save_json(INGREDIENT_FILE, inv)
-
     q = st.text_input("Filter ingredients", "", key=ns_key(ns, "filter")).strip().lower()
 
     unit_options = ["g", "kg", "lb", "oz"]
     items = [i for i in all_ingredients if i not in exclude_list and q in i.lower()]
+    page_items, table_key = _paged(ns, items)
+
+    # One table editor for the page instead of two widgets per ingredient
+    rows = [
+        {
+            "Ingredient": ing,
+            "Amount": float(inv[ing]["amount"]),
+            "Unit": inv[ing]["unit"] if inv[ing]["unit"] in unit_options else "g",
+        }
+        for ing in page_items
+    ]
+    after = st.data_editor(
+        _with_edits(ns, rows),
+        disabled=["Ingredient"],
+        column_config={
+            "Amount": st.column_config.NumberColumn(min_value=0.0, step=1.0),
+            "Unit": st.column_config.SelectboxColumn(options=unit_options, required=True),
+        },
+        hide_index=True,
+        use_container_width=True,
+        key=table_key,
+    )
 
-    cols = st.columns(3)
-    updated: Dict[str, Any] = {}
-
-    for i, ing in enumerate(items):
-        with cols[i % 3]:
-            amt = st.number_input(
-                ing,
-                min_value=0.0,
-                value=float(inv.get(ing, {}).get("amount", 0.0)),
-                step=1.0,
-                key=ns_key(ns, f"amt__{slugify(ing)}"),
-            )
-            unit0 = (inv.get(ing, {}).get("unit") or "g").lower()
-            idx = unit_options.index(unit0) if unit0 in unit_options else 0
-            unit = st.selectbox(
-                "Unit",
-                unit_options,
-                index=idx,
-                key=ns_key(ns, f"unit__{slugify(ing)}"),
-            )
-            updated[ing] = {"amount": amt, "unit": unit}
+    # Remember each edited row's ledger version, so a count made on stock
+    # that another device has changed since isn't saved over it
+    changed = list(_table_edits(ns, rows, after).values())
+
+    def base_of(ing: str) -> tuple:
+        spellings = (ing, *(k for k in stored if k != ing and names.canonical(k) == ing))
+        return spellings, ledger.version(*spellings)
+
+    bases, _ = _edit_bases(ns, [row["Ingredient"] for row in changed], base_of)
 
     if st.button("💾 Save ingredient inventory", key=ns_key(ns, "save")):
-        inv.update(updated)
-        save_json(INGREDIENT_FILE, inv)
-        st.success("Ingredient inventory saved.")
+        # Only the rows that changed become (count) events; a count also
+        # zeroes stock still filed under other spellings of the ingredient.
+        events: Dict[str, list] = {}
+        for row in changed:
+            ing = row["Ingredient"]
+            events[ing] = [{"type": "count", "ingredient": ing, "amount": float(row["Amount"] or 0), "unit": row["Unit"], "key": ing}]
+            events[ing] += [
+                {"type": "count", "ingredient": k, "amount": 0.0, "unit": "g", "note": f"merged into {ing}", "key": ing}
+                for k in bases[ing][0][1:]
+                if stored.get(k, {}).get("amount")
+            ]
+        records, stale = ledger.append_checked([ev for evs in events.values() for ev in evs], bases)
+        now = names.rekey(ledger.inventory(), merge_stock)
+        for row in changed:
+            if row["Ingredient"] not in stale:
+                inv[row["Ingredient"]] = {"amount": float(row["Amount"] or 0), "unit": row["Unit"]}
+        st.session_state[ns_key(ns, "conflicts")] = [
+            {
+                "Ingredient": ing,
+                "Yours": f"{events[ing][0]['amount']:g} {events[ing][0]['unit']}",
+                "Now": f"{now[ing]['amount']:g} {now[ing]['unit']}" if ing in now else "—",
+                "Changed by": " / ".join(f"{e['type']} {e['ts']}" for e in map(ledger.last_event, bases[ing][0]) if e),
+                "_events": events[ing],
+            }
+            for ing in stale
+        ]
+        _forget_table_edits(ns)
+        st.success(f"Ingredient inventory saved ({len(records)} change(s)).")
+
+    _show_conflicts(ns, _resolve_inventory_conflicts)
+
+    with st.expander("📥 Record a delivery, usage or waste", expanded=False):
+        c1, c2, c3, c4 = st.columns([2, 3, 2, 1])
+        c1.selectbox("Event", ["receive", "consume", "waste"], key=ns_key(ns, "ev_type"))
+        c2.selectbox("Ingredient", all_ingredients, key=ns_key(ns, "ev_ing"))
+        ev_amt = c3.number_input("Amount", min_value=0.0, step=1.0, key=ns_key(ns, "ev_amt"))
+        c4.selectbox("Unit", unit_options, key=ns_key(ns, "ev_unit"))
+        st.text_input("Note (optional)", key=ns_key(ns, "ev_note"))
+        st.button("Record", key=ns_key(ns, "ev_save"), disabled=ev_amt <= 0, on_click=_record_inventory_event, args=(ns,))
+        msg = st.session_state.pop(ns_key(ns, "ev_msg"), None)
+        if msg:
+            st.success(msg)
+
+    with st.expander("🕘 Recent inventory history", expanded=False):
+        recent = list(ledger.recent)[::-1][:50]
+        if recent:
+            st.dataframe(
+                [{k: r.get(k) for k in ("seq", "ts", "type", "ingredient", "amount", "unit", "note")} for r in recent],
+                use_container_width=True,
+                hide_index=True,
+            )
+        else:
+            st.caption("No events yet.")
 
     # Summary table
     summary = {
         ing: f"{inv[ing]['amount']:.2f} {inv[ing]['unit']}  ({to_grams(inv[ing]['amount'], inv[ing]['unit']):,.0f} g)"
-        for ing in items
+        for ing in page_items
     }
     st.dataframe(summary, use_container_width=True)
 
@@ -523,65 +840,514 @@ def page_set_min_inventory():
     ns = "min"
 
     st.subheader("Set Minimum Inventory Levels")
-    all_ings = get_all_ingredients_from_recipes(recipes)
+    all_ings = catalog.index.ingredients
     if not all_ings:
         st.info("No ingredients found in recipes.")
         return
 
     thresholds_raw = load_json(THRESHOLD_FILE, {})
-    thresholds = normalize_thresholds_schema(thresholds_raw)
+    thresholds = catalog.index.names.rekey(normalize_thresholds_schema(thresholds_raw))
 
-    edited: Dict[str, Any] = {}
+    q = st.text_input("Filter ingredients", "", key=ns_key(ns, "filter")).strip().lower()
+    page_ings, table_key = _paged(ns, [i for i in all_ings if q in i.lower()])
+
+    rows = [
+        {
+            "Ingredient": ing,
+            "Min Level": float(thresholds.get(ing, {}).get("min", 0.0)),
+            "Unit": thresholds.get(ing, {}).get("unit", "grams"),
+        }
+        for ing in page_ings
+    ]
+    after = st.data_editor(
+        _with_edits(ns, rows),
+        disabled=["Ingredient"],
+        column_config={
+            "Min Level": st.column_config.NumberColumn(min_value=0.0, step=1.0, format="%.2f"),
+            "Unit": st.column_config.SelectboxColumn(options=UNIT_OPTIONS, required=True),
+        },
+        hide_index=True,
+        use_container_width=True,
+        key=table_key,
+    )
+    changes = {ing: {"min": float(row["Min Level"] or 0), "unit": row["Unit"]} for ing, row in _table_edits(ns, rows, after).items()}
+    edited = {**thresholds, **changes}
+    bases, base_version = _edit_bases(ns, changes, thresholds.get, document_version(THRESHOLD_FILE))
 
-    header = st.columns([3, 2, 2])
-    header[0].markdown("**Ingredient**")
-    header[1].markdown("**Min Level**")
-    header[2].markdown("**Unit**")
+    if st.button("💾 Save Minimums & Units", type="primary", key=ns_key(ns, "save")):
+        # Merged into the latest file per ingredient; rows someone else
+        # changed meanwhile are reported instead of overwritten
+        conflicts = save_json_merged(
+            THRESHOLD_FILE, changes, bases, base_version,
+            normalize=lambda raw: catalog.index.names.rekey(normalize_thresholds_schema(raw)),
+        )
+        st.session_state[ns_key(ns, "conflicts")] = [
+            {
+                "Ingredient": c.key,
+                "Yours": f"{c.mine['min']:g} {c.mine['unit']}",
+                "Theirs": f"{c.theirs['min']:g} {c.theirs['unit']}" if c.theirs else "—",
+                "_mine": c.mine,
+                "_theirs": c.theirs,
+            }
+            for c in conflicts
+        ]
+        _forget_table_edits(ns)
+        st.success(f"Minimum inventory levels and units saved ({len(changes) - len(conflicts)} change(s)).")
+
+    _show_conflicts(ns, _resolve_threshold_conflicts)
+
+    # Threshold check for the whole table at once, on the values shown above
+    registry = load_unit_registry()
+    min_g = threshold_vector(catalog.index, edited, registry)
+    stock = inventory_vector(catalog.index, load_inventory())
+    unknown = np.isnan(min_g)
+    below = ~unknown & (stock < min_g)
+    if below.any():
+        st.warning(f"{int(below.sum())} ingredient(s) below minimum: " + ", ".join(all_ings[j] for j in np.flatnonzero(below)))
+    if unknown.any():
+        st.caption(
+            "No pack size / density on file, so these minimums can't be compared with stock: "
+            + ", ".join(f"{all_ings[j]} ({edited.get(all_ings[j], {}).get('unit')})" for j in np.flatnonzero(unknown))
+        )
 
-    for ing in all_ings:
-        cur = thresholds.get(ing, {"min": 0.0, "unit": "grams"})
+    with st.expander("📦 Pack sizes & densities", expanded=bool(unknown.any())):
+        spec = registry.per_ingredient
+        table = [
+            {
+                "Ingredient": ing,
+                "g per can": (spec.get(ing, {}).get("packs") or {}).get("can"),
+                "Density (g/mL)": spec.get(ing, {}).get("density_g_per_ml"),
+            }
+            for ing in page_ings
+        ]
+        units_edited = st.data_editor(
+            _with_edits(ns, table, "units"),
+            disabled=["Ingredient"],
+            hide_index=True,
+            use_container_width=True,
+            key=f"{table_key}__units",
+        )
+        units_changed = _table_edits(ns, table, units_edited, "units")
+        if st.button("💾 Save pack sizes & densities", key=ns_key(ns, "save_units")):
+            new_spec = {ing: {"packs": dict(v.get("packs") or {}), **{k: x for k, x in v.items() if k != "packs"}} for ing, v in spec.items()}
+            for row in units_changed.values():
+                entry = new_spec.setdefault(row["Ingredient"], {"packs": {}})
+                entry["packs"].pop("can", None)
+                entry.pop("density_g_per_ml", None)
+                if row["g per can"]:
+                    entry["packs"]["can"] = float(row["g per can"])
+                if row["Density (g/mL)"]:
+                    entry["density_g_per_ml"] = float(row["Density (g/mL)"])
+            save_json(UNITS_FILE, normalize_units_schema(new_spec))
+            _forget_table_edits(ns, table="units")
+            st.success("Pack sizes and densities saved.")
+
+
+def page_production_plan():
+    ns = "plan"
+
+    st.subheader("Production Plan")
+    containers = load_containers()
+    units = plan_units(containers)
+    lineup = normalize_lineup_schema(load_json(LINEUP_FILE, {}), units)
+
+    flavors = st.multiselect(
+        "Weekly lineup",
+        recipe_names,
+        default=[f for f in lineup if f in catalog],
+        key=ns_key(ns, "lineup"),
+    )
+    density = st.number_input(
+        "Mix density (g/mL)",
+        min_value=0.5, max_value=1.5, value=DEFAULT_DENSITY, step=0.01,
+        key=ns_key(ns, "density"),
+    )
+
+    edited: Dict[str, Any] = {}
+    targets: Dict[str, float] = {}
+    blocked = []
+    for name in flavors:
+        slug = catalog.index.recipes[name].slug
+        cur = lineup.get(name, {"amount": 0.0, "unit": units[0]})
         c1, c2, c3 = st.columns([3, 2, 2])
-        c1.write(ing)
-        new_min = c2.number_input(
-            "min",
-            value=float(cur.get("min", 0.0)),
+        c1.write(name)
+        amount = c2.number_input(
+            "amount",
             min_value=0.0,
+            value=float(cur["amount"]),
             step=1.0,
-            format="%.2f",
             label_visibility="collapsed",
-            key=ns_key(ns, f"min__{slugify(ing)}"),
+            key=ns_key(ns, f"amt__{slug}"),
         )
-        cur_unit = cur.get("unit", "grams")
-        unit_idx = UNIT_OPTIONS.index(cur_unit) if cur_unit in UNIT_OPTIONS else UNIT_OPTIONS.index("grams")
-        new_unit = c3.selectbox(
+        unit = c3.selectbox(
             "unit",
-            options=UNIT_OPTIONS,
-            index=unit_idx,
+            units,
+            index=units.index(cur["unit"]),
             label_visibility="collapsed",
-            key=ns_key(ns, f"unit__{slugify(ing)}"),
+            key=ns_key(ns, f"unit__{slug}"),
         )
-        edited[ing] = {"min": new_min, "unit": new_unit}
+        edited[name] = {"amount": amount, "unit": unit}
+        if name in catalog.index.blocked:
+            blocked.append(name)
+        else:
+            targets[name] = target_weight_g(amount, unit, density, containers)
 
-    if st.button("💾 Save Minimums & Units", type="primary", key=ns_key(ns, "save")):
-        save_json(THRESHOLD_FILE, edited)
-        st.success("Minimum inventory levels and units saved.")
+    if st.button("💾 Save lineup", key=ns_key(ns, "save")):
+        save_json(LINEUP_FILE, edited)
+        st.success("Lineup saved.")
+
+    for name in blocked:
+        st.warning(f"Skipping {name}: it is part of a recipe cycle.")
+
+    totals = plan_requirements(catalog.index, targets)
+    st.metric("Total mix (g)", f"{sum(targets.values()):,.0f}")
+
+    st.divider()
+    st.markdown("### 🧾 Ingredients needed")
+    order = np.argsort(-totals)
+    rows = [
+        {"Ingredient": catalog.index.ingredients[j], "Grams": round(float(totals[j]), 1), "Kg": round(float(totals[j]) / 1000.0, 2)}
+        for j in order if totals[j] > 0
+    ]
+    if rows:
+        st.dataframe(rows, use_container_width=True, hide_index=True)
+    else:
+        st.info("Set a quantity for at least one flavor.")
+
+
+def page_what_can_i_make():
+    ns = "feas"
+
+    st.subheader("What Can I Make Right Now")
+    inv = load_inventory()
+    excluded = load_json(EXCLUDE_FILE, [])
+
+    c1, c2 = st.columns(2)
+    with c1:
+        unlimited = st.checkbox(
+            "Treat excluded ingredients as unlimited",
+            value=True,
+            key=ns_key(ns, "unlimited"),
+        )
+    with c2:
+        density = st.number_input(
+            "Mix density (g/mL)",
+            min_value=0.5, max_value=1.5, value=DEFAULT_DENSITY, step=0.01,
+            key=ns_key(ns, "density"),
+        )
+    only_possible = st.checkbox("Only show recipes I can make", value=False, key=ns_key(ns, "only_possible"))
+
+    idx = catalog.index
+    stock = inventory_vector(idx, inv, excluded if unlimited else ())
+    feas = max_batches(idx, stock)
+
+    per_container = {c: container_capacity_g(v, density) for c, v in load_containers().items()}
+    rows = []
+    for name in recipe_names:
+        r = idx.rows[name]
+        w = float(feas.max_weight[r])
+        if only_possible and not w > 0:
+            continue
+        b = int(feas.binding[r])
+        limited = np.isfinite(w)
+        row = {
+            "Recipe": name,
+            "Max batch (g)": round(w) if limited else None,
+            "× recipe": round(float(feas.max_factor[r]), 2) if limited else None,
+        }
+        for c, cap_g in per_container.items():
+            row[c] = round(w / cap_g, 1) if limited else None
+        row["Limited by"] = idx.ingredients[b] if b >= 0 else ("recipe cycle" if name in idx.blocked else "—")
+        rows.append(row)
+    st.dataframe(rows, use_container_width=True, hide_index=True)
+
+
+def page_optimize_production():
+    ns = "opt"
+
+    st.subheader("Optimize Production")
+    st.caption("Split scarce stock across the lineup to get the most (priority-weighted) mix out of it.")
+
+    idx = catalog.index
+    containers = load_containers()
+    lineup = normalize_lineup_schema(load_json(LINEUP_FILE, {}), plan_units(containers))
+    flavors = [f for f in lineup if f in catalog and f not in idx.blocked]
+    if not flavors:
+        st.info("No lineup yet. Build one on the Production Plan page.")
+        return
+
+    inv = load_inventory()
+    excluded = load_json(EXCLUDE_FILE, [])
+
+    c1, c2 = st.columns(2)
+    with c1:
+        unlimited = st.checkbox("Treat excluded ingredients as unlimited", value=True, key=ns_key(ns, "unlimited"))
+    with c2:
+        density = st.number_input(
+            "Mix density (g/mL)",
+            min_value=0.5, max_value=1.5, value=DEFAULT_DENSITY, step=0.01,
+            key=ns_key(ns, "density"),
+        )
+
+    # Default cap = the planned quantity, so the optimizer never makes more than planned
+    table = [
+        {
+            "Flavor": f,
+            "Priority": 1.0,
+            "Min (g)": 0.0,
+            "Max (g)": target_weight_g(lineup[f]["amount"], lineup[f]["unit"], density, containers) or None,
+        }
+        for f in flavors
+    ]
+    edited = st.data_editor(
+        table,
+        disabled=["Flavor"],
+        hide_index=True,
+        use_container_width=True,
+        key=ns_key(ns, "table"),
+    )
+
+    stock = inventory_vector(idx, inv, excluded if unlimited else ())
+    alloc = optimize_allocation(
+        idx,
+        [row["Flavor"] for row in edited],
+        stock,
+        [float(row["Priority"] or 0) for row in edited],
+        [float(row["Min (g)"] or 0) for row in edited],
+        [np.nan if row["Max (g)"] is None else float(row["Max (g)"]) for row in edited],
+    )
+
+    if not alloc.ok:
+        st.error(f"No feasible plan: {alloc.message}")
+        st.caption("Lower some minimums, or set a max for flavors that nothing in stock limits.")
+        return
+
+    st.metric("Total mix (g)", f"{alloc.weights.sum():,.0f}")
+    result = []
+    for row, w in zip(edited, alloc.weights):
+        packing = pack_containers(float(w), containers, density)
+        result.append({
+            "Flavor": row["Flavor"],
+            "Batch (g)": round(float(w)),
+            "Containers": "  |  ".join(f"{c}: {n}" for c, n in packing.counts.items() if n) or "—",
+        })
+    st.dataframe(result, use_container_width=True, hide_index=True)
+    if alloc.binding:
+        st.caption("Used up: " + ", ".join(idx.ingredients[j] for j in alloc.binding))
+
+
+def page_containers():
+    ns = "cont"
+
+    st.subheader("Container Types")
+    containers = load_containers()
+    edited = st.data_editor(
+        [
+            {"Container": name, "Volume (L)": c["volume_l"], "Fill (0-1)": c["fill"], "Freezer slots": c["slots"]}
+            for name, c in containers.items()
+        ],
+        num_rows="dynamic",
+        hide_index=True,
+        use_container_width=True,
+        key=ns_key(ns, "table"),
+    )
+    if st.button("💾 Save container types", key=ns_key(ns, "save")):
+        new = normalize_containers_schema({
+            row["Container"]: {"volume_l": row["Volume (L)"], "fill": row["Fill (0-1)"], "slots": row["Freezer slots"]}
+            for row in edited
+            if row.get("Container")
+        })
+        save_json(CONTAINERS_FILE, new)
+        st.success("Container types saved.")
+
+
+def page_ingredient_names():
+    ns = "names"
+
+    st.subheader("Ingredient Names")
+    st.caption("Spellings that only differ by case or spacing are merged automatically. Aliases merge the rest.")
+    names = catalog.index.names
+
+    merged = [{"Ingredient": c, "Also written as": ", ".join(v)} for c, v in sorted(names.variants.items()) if v]
+    if merged:
+        st.dataframe(merged, use_container_width=True, hide_index=True)
+
+    aliases = load_ingredient_aliases()
+    edited = st.data_editor(
+        [{"Alias": a, "Same as": t} for a, t in sorted(aliases.items())],
+        num_rows="dynamic",
+        hide_index=True,
+        use_container_width=True,
+        key=ns_key(ns, "aliases"),
+    )
+
+    st.markdown("### 🔎 Possible duplicates")
+    cutoff = st.slider("Similarity", min_value=0.5, max_value=1.0, value=0.8, step=0.05, key=ns_key(ns, "cutoff"))
+    # On a tie in recipe lines, the spelling with stock or pack sizes on file is kept
+    known = [k for k, v in load_inventory().items() if v.get("amount")] + list(load_unit_registry().per_ingredient)
+    # Alias / Same as stay editable: the more common spelling isn't always the right one
+    suggested = st.data_editor(
+        [
+            {"Merge": False, "Alias": s.alias, "Same as": s.into, "Similarity": round(s.similarity, 2),
+             "Check": "" if s.decided else "tie: pick which to keep"}
+            for s in names.suggestions(cutoff, known)
+        ],
+        disabled=["Similarity", "Check"],
+        hide_index=True,
+        use_container_width=True,
+        key=ns_key(ns, "suggested"),
+    )
+
+    if st.button("💾 Save aliases", key=ns_key(ns, "save")):
+        new = {row["Alias"]: row["Same as"] for row in edited if row.get("Alias")}
+        new.update({row["Alias"]: row["Same as"] for row in suggested if row["Merge"]})
+        save_json(ALIASES_FILE, normalize_aliases_schema(new))
+        st.success("Aliases saved.")
+
+
+
+def page_reorder():
+    ns = "reorder"
+
+    st.subheader("Reorder")
+    idx = catalog.index
+    registry = load_unit_registry()
+    containers = load_containers()
+    thresholds = idx.names.rekey(normalize_thresholds_schema(load_json(THRESHOLD_FILE, {})))
+    lineup = normalize_lineup_schema(load_json(LINEUP_FILE, {}), plan_units(containers))
+    excluded = set(idx.names.ids(load_json(EXCLUDE_FILE, [])).tolist())
+
+    c1, c2, c3 = st.columns(3)
+    lead_days = c1.number_input("Lead time (days)", min_value=0.0, value=2.0, step=1.0, key=ns_key(ns, "lead"))
+    cover_days = c2.number_input("Order enough for (days)", min_value=0.0, value=7.0, step=1.0, key=ns_key(ns, "cover"))
+    show_all = c3.checkbox("Show all ingredients", value=False, key=ns_key(ns, "all"))
+
+    # Everything below is aligned with idx.ingredients and computed in one pass
+    stock = inventory_vector(idx, load_inventory())
+    min_g = threshold_vector(idx, thresholds, registry)
+    weekly = plan_requirements(idx, lineup_targets(idx, lineup, containers))
+    units = tuple(thresholds.get(ing, {}).get("unit", "grams") for ing in idx.ingredients)
+    rows = reorder_rows(idx, stock, min_g, weekly, units, registry, lead_days, cover_days, excluded, show_all)
+
+    if not show_all and not rows:
+        st.success("✅ Nothing to reorder.")
+    else:
+        st.metric("Ingredients to reorder", int(sum(1 for r in rows if r["Order (g)"] > 0)))
+        st.dataframe(rows, use_container_width=True, hide_index=True)
+    if np.isnan(min_g).any():
+        st.caption("Some minimums use units with no pack size / density on file and are ignored (see Set Min Inventory).")
+
+
+def page_diagnostics():
+    ns = "diag"
+
+    st.subheader("Diagnostics")
+    records, totals, reruns = get_profiler().snapshot()
+    log_note = f"logging to {PROFILE_LOG_FILE}" if PROFILE_LOG_FILE else "log off (set ICECREAM_PROFILE_LOG)"
+    st.caption(f"{reruns} reruns profiled since the server started; {log_note}.")
+
+    reads, misses = totals.get("json_cache.read", 0), totals.get("json_cache.miss", 0)
+    n_keys, n_bytes = session_state_size()
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("JSON cache hits", f"{reads - misses:,}")
+    c2.metric("JSON cache misses", f"{misses:,}")
+    c3.metric("Hit rate", f"{(reads - misses) / reads:.0%}" if reads else "—")
+    c4.metric("Session state", f"{n_bytes / 1024:,.1f} KB", f"{n_keys} keys", delta_color="off")
+
+    if st.radio("Reruns", ["This session", "All sessions"], horizontal=True, key=ns_key(ns, "scope")) == "This session":
+        records = [r for r in records if r["session"] == _profile.session]
+    records = records[::-1]
+    if not records:
+        st.caption("No finished reruns yet.")
+        return
+    st.dataframe(
+        [
+            {
+                "Time": r["ts"],
+                "Page": r["label"],
+                "ms": r["ms"],
+                "Widgets": sum(r["widgets"].values()),
+                "JSON reads": r["counters"].get("json_cache.read", 0),
+                "JSON misses": r["counters"].get("json_cache.miss", 0),
+                "State keys": r.get("session_keys"),
+            }
+            for r in records
+        ],
+        use_container_width=True,
+        hide_index=True,
+    )
+
+    i = st.selectbox("Phases of rerun", range(len(records)), key=ns_key(ns, "pick"),
+                     format_func=lambda i: f"{records[i]['ts']}  {records[i]['label']}  ({records[i]['ms']:,.1f} ms)")
+    rec = records[i]
+    st.dataframe(
+        [
+            {"Phase": name, "Calls": sp["calls"], "ms": sp["ms"], "% of rerun": round(100 * sp["ms"] / rec["ms"], 1) if rec["ms"] else 0.0}
+            for name, sp in sorted(rec["spans"].items(), key=lambda kv: -kv[1]["ms"])
+        ],
+        use_container_width=True,
+        hide_index=True,
+    )
+    st.caption("Phases nest (a page includes the render helpers it calls), so the percentages add up to more than 100.")
+
+    widgets: Dict[str, int] = {}
+    for r in reversed(records):  # newest count per page
+        widgets.update(r["widgets"])
+    st.markdown("**Widgets per page** (latest rerun of each)")
+    st.dataframe([{"Page": k, "Widgets": v} for k, v in sorted(widgets.items())], use_container_width=True, hide_index=True)
 
 
 # =========================
 # Sidebar navigation (ONE radio only)
 # =========================
+PAGES = ["Batching System", "Production Plan", "Optimize Production", "What Can I Make", "Ingredient Inventory", "Set Min Inventory", "Reorder", "Containers", "Ingredient Names"]
+if DIAGNOSTICS or st.query_params.get("diagnostics") == "1":
+    PAGES.append("Diagnostics")  # hidden unless asked for
+
 page = st.sidebar.radio(
     "Go to",
-    ["Batching System", "Ingredient Inventory", "Set Min Inventory"],
+    PAGES,
     key="sidebar_nav",
 )
-
-if page == "Batching System":
-    page_batching()
-elif page == "Ingredient Inventory":
-    page_ingredient_inventory()
-elif page == "Set Min Inventory":
-    page_set_min_inventory()
+_profile.label = page
+
+if STORAGE_BACKEND == "json":  # sqlite saves synchronously: no writer thread (or watcher) to start
+    for path, err in get_write_behind().take_errors():
+        st.error(f"❌ Couldn't save {os.path.basename(path)}: {err}")
+
+try:
+    widgets_before = widget_count()
+    with span(f"page: {page}"):
+        if page == "Batching System":
+            page_batching()
+        elif page == "Production Plan":
+            page_production_plan()
+        elif page == "Optimize Production":
+            page_optimize_production()
+        elif page == "What Can I Make":
+            page_what_can_i_make()
+        elif page == "Ingredient Inventory":
+            page_ingredient_inventory()
+        elif page == "Set Min Inventory":
+            page_set_min_inventory()
+        elif page == "Reorder":
+            page_reorder()
+        elif page == "Containers":
+            page_containers()
+        elif page == "Ingredient Names":
+            page_ingredient_names()
+        elif page == "Diagnostics":
+            page_diagnostics()
+    _profile.widgets[page] = widget_count() - widgets_before
+
+    with st.sidebar.expander("Session", expanded=False):
+        if st.checkbox("Measure session state", value=False, key="diag_session"):
+            n_keys, n_bytes = session_state_size()
+            kept = len(st.session_state.get("_ns_lru", {}))
+            st.caption(f"{n_keys} keys, ~{n_bytes / 1024:,.1f} KB. Recipes with saved settings: {kept} (max {NS_KEEP}).")
+finally:
+    # also runs for st.stop() / st.rerun(), so those reruns are recorded too
+    _finish_profile()
 
 # import streamlit as st
 # import os
@@ -2659,7 +3425,7 @@ elif page == "Set Min Inventory":
 # elif scale_mode == "Container: 5 L":
 #     n_5l = st.number_input("How many 5 L pans?", min_value=1, value=1, step=1, key=k("n5l"))
 #     total_l = n_5l * VOL_5L_L
-#     density_g_per_ml = density_g_per_ml or 1.03
+#     density_g_per_ml = density_g_per_ml or DEFAULT_DENSITY
 #     target_weight = total_l * 1000.0 * density_g_per_ml
 #     scale_factor = (target_weight / original_weight) if original_weight else 1.0
 #     info_lines += [f"Total volume: {total_l:,.2f} L", f"Target weight: {target_weight:,.0f} g"]
@@ -2667,7 +3433,7 @@ elif page == "Set Min Inventory":
 # elif scale_mode == "Container: 1.5 gal":
 #     n_15 = st.number_input("How many 1.5 gal tubs?", min_value=1, value=1, step=1, key=k("n15"))
 #     total_l = n_15 * VOL_1_5GAL_L
-#     density_g_per_ml = density_g_per_ml or 1.03
+#     density_g_per_ml = density_g_per_ml or DEFAULT_DENSITY
 #     target_weight = total_l * 1000.0 * density_g_per_ml
 #     scale_factor = (target_weight / original_weight) if original_weight else 1.0
 #     info_lines += [f"Total volume: {total_l:,.2f} L", f"Target weight: {target_weight:,.0f} g"]
@@ -2682,7 +3448,7 @@ elif page == "Set Min Inventory":
 #     if total_l <= 0:
 #         st.warning("Set at least one container.")
 #         total_l = 0.0
-#     density_g_per_ml = density_g_per_ml or 1.03
+#     density_g_per_ml = density_g_per_ml or DEFAULT_DENSITY
 #     target_weight = total_l * 1000.0 * density_g_per_ml
 #     scale_factor = (target_weight / original_weight) if original_weight else 1.0
 #     info_lines += [
@@ -2846,7 +3612,7 @@ elif page == "Set Min Inventory":
 # # elif scale_mode == "Container: 5 L":
 # #     n_5l = st.number_input("How many 5 L pans?", min_value=1, value=1, step=1, key=k("n5l"))
 # #     total_l = n_5l * VOL_5L_L
-# #     density_g_per_ml = density_g_per_ml or 1.03
+# #     density_g_per_ml = density_g_per_ml or DEFAULT_DENSITY
 # #     target_weight = total_l * 1000.0 * density_g_per_ml
 # #     scale_factor = (target_weight / original_weight) if original_weight else 1.0
 # #     info_lines += [f"Total volume: {total_l:,.2f} L", f"Target weight: {target_weight:,.0f} g"]
@@ -2854,7 +3620,7 @@ elif page == "Set Min Inventory":
 # # elif scale_mode == "Container: 1.5 gal":
 # #     n_15 = st.number_input("How many 1.5 gal tubs?", min_value=1, value=1, step=1, key=k("n15"))
 # #     total_l = n_15 * VOL_1_5GAL_L
-# #     density_g_per_ml = density_g_per_ml or 1.03
+# #     density_g_per_ml = density_g_per_ml or DEFAULT_DENSITY
 # #     target_weight = total_l * 1000.0 * density_g_per_ml
 # #     scale_factor = (target_weight / original_weight) if original_weight else 1.0
 # #     info_lines += [f"Total volume: {total_l:,.2f} L", f"Target weight: {target_weight:,.0f} g"]
@@ -2869,7 +3635,7 @@ elif page == "Set Min Inventory":
 # #     if total_l <= 0:
 # #         st.warning("Set at least one container.")
 # #         total_l = 0.0
-# #     density_g_per_ml = density_g_per_ml or 1.03
+# #     density_g_per_ml = density_g_per_ml or DEFAULT_DENSITY
 # #     target_weight = total_l * 1000.0 * density_g_per_ml
 # #     scale_factor = (target_weight / original_weight) if original_weight else 1.0
 # #     info_lines += [
@@ -3092,7 +3858,7 @@ elif page == "Set Min Inventory":
 # #     elif scale_mode == "Container: 5 L":
 # #         n_5l = st.session_state.get(k("n5l"), 1)
 # #         total_l = n_5l * VOL_5L_L
-# #         density_g_per_ml = density_g_per_ml or 1.03
+# #         density_g_per_ml = density_g_per_ml or DEFAULT_DENSITY
 # #         target_weight = total_l * 1000.0 * density_g_per_ml
 # #         scale_factor = (target_weight / original_weight) if original_weight else 1.0
 # #         info_lines += [f"Total volume: {total_l:,.2f} L", f"Target weight: {target_weight:,.0f} g"]
@@ -3100,7 +3866,7 @@ elif page == "Set Min Inventory":
 # #     elif scale_mode == "Container: 1.5 gal":
 # #         n_15 = st.session_state.get(k("n15"), 1)
 # #         total_l = n_15 * VOL_1_5GAL_L
-# #         density_g_per_ml = density_g_per_ml or 1.03
+# #         density_g_per_ml = density_g_per_ml or DEFAULT_DENSITY
 # #         target_weight = total_l * 1000.0 * density_g_per_ml
 # #         scale_factor = (target_weight / original_weight) if original_weight else 1.0
 # #         info_lines += [f"Total volume: {total_l:,.2f} L", f"Target weight: {target_weight:,.0f} g"]
@@ -3111,7 +3877,7 @@ elif page == "Set Min Inventory":
 # #         total_l = n_5l * VOL_5L_L + n_15 * VOL_1_5GAL_L
 # #         if total_l <= 0:
 # #             total_l = 0.0
-# #         density_g_per_ml = density_g_per_ml or 1.03
+# #         density_g_per_ml = density_g_per_ml or DEFAULT_DENSITY
 # #         target_weight = total_l * 1000.0 * density_g_per_ml
 # #         scale_factor = (target_weight / original_weight) if original_weight else 1.0
 # #         info_lines += [
@@ -3158,7 +3924,7 @@ elif page == "Set Min Inventory":
 # #     elif scale_mode == "Container: 5 L":
 # #         n_5l = st.number_input("How many 5 L pans?", min_value=1, value=1, step=1, key=k("n5l"))
 # #         total_l = n_5l * VOL_5L_L
-# #         density_g_per_ml = density_g_per_ml or 1.03
+# #         density_g_per_ml = density_g_per_ml or DEFAULT_DENSITY
 # #         target_weight = total_l * 1000.0 * density_g_per_ml
 # #         scale_factor = (target_weight / original_weight) if original_weight else 1.0
 # #         info_lines += [f"Total volume: {total_l:,.2f} L", f"Target weight: {target_weight:,.0f} g"]
@@ -3166,7 +3932,7 @@ elif page == "Set Min Inventory":
 # #     elif scale_mode == "Container: 1.5 gal":
 # #         n_15 = st.number_input("How many 1.5 gal tubs?", min_value=1, value=1, step=1, key=k("n15"))
 # #         total_l = n_15 * VOL_1_5GAL_L
-# #         density_g_per_ml = density_g_per_ml or 1.03
+# #         density_g_per_ml = density_g_per_ml or DEFAULT_DENSITY
 # #         target_weight = total_l * 1000.0 * density_g_per_ml
 # #         scale_factor = (target_weight / original_weight) if original_weight else 1.0
 # #         info_lines += [f"Total volume: {total_l:,.2f} L", f"Target weight: {target_weight:,.0f} g"]
@@ -3181,7 +3947,7 @@ elif page == "Set Min Inventory":
 # #         if total_l <= 0:
 # #             st.warning("Set at least one container.")
 # #             total_l = 0.0
-# #         density_g_per_ml = density_g_per_ml or 1.03
+# #         density_g_per_ml = density_g_per_ml or DEFAULT_DENSITY
 # #         target_weight = total_l * 1000.0 * density_g_per_ml
 # #         scale_factor = (target_weight / original_weight) if original_weight else 1.0
 # #         info_lines += [
@@ -3266,7 +4032,7 @@ elif page == "Set Min Inventory":
 # #     n_5l = st.number_input("How many 5 L pans?", min_value=1, value=1, step=1, key=k("n5l"))
 # #     total_l = n_5l * VOL_5L_L
 # #     # if user didn’t set density earlier, assume 1.03 g/mL
-# #     density_g_per_ml = density_g_per_ml or 1.03
+# #     density_g_per_ml = density_g_per_ml or DEFAULT_DENSITY
 # #     target_weight = total_l * 1000.0 * density_g_per_ml
 # #     scale_factor = (target_weight / original_weight) if original_weight else 1.0
 # #     info_lines += [f"Total volume: {total_l:,.2f} L", f"Target weight: {target_weight:,.0f} g"]
@@ -3274,7 +4040,7 @@ elif page == "Set Min Inventory":
 # # elif scale_mode == "Container: 1.5 gal":
 # #     n_15 = st.number_input("How many 1.5 gal tubs?", min_value=1, value=1, step=1, key=k("n15"))
 # #     total_l = n_15 * VOL_1_5GAL_L
-# #     density_g_per_ml = density_g_per_ml or 1.03
+# #     density_g_per_ml = density_g_per_ml or DEFAULT_DENSITY
 # #     target_weight = total_l * 1000.0 * density_g_per_ml
 # #     scale_factor = (target_weight / original_weight) if original_weight else 1.0
 # #     info_lines += [f"Total volume: {total_l:,.2f} L", f"Target weight: {target_weight:,.0f} g"]
@@ -3289,7 +4055,7 @@ elif page == "Set Min Inventory":
 # #     if total_l <= 0:
 # #         st.warning("Set at least one container.")
 # #         total_l = 0.0
-# #     density_g_per_ml = density_g_per_ml or 1.03
+# #     density_g_per_ml = density_g_per_ml or DEFAULT_DENSITY
 # #     target_weight = total_l * 1000.0 * density_g_per_ml
 # #     scale_factor = (target_weight / original_weight) if original_weight else 1.0
 # #     info_lines += [
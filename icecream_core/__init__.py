@@ -0,0 +1,56 @@
+"""Headless core of the ice cream app: recipe scaling, planning and inventory.
+
+Nothing here imports Streamlit, so scripts, tests and benchmarks can use it
+directly. Names are loaded on first access: `from icecream_core import
+slugify` only imports the small `schema` module, and numpy (and scipy) are
+only pulled in by the modules that need them (`index`, `names`).
+
+    from icecream_core import RecipeCatalog, open_storage
+    storage = open_storage()
+    catalog = RecipeCatalog(RECIPES_PATH, storage.version(RECIPES_PATH),
+                            normalize_recipes_schema(storage.load(RECIPES_PATH, {})))
+"""
+import importlib
+
+_EXPORTS = {
+    "schema": [
+        "slugify", "scale_subrecipes", "normalize_recipes_schema", "get_all_ingredients_from_recipes",
+        "normalize_thresholds_schema", "normalize_inventory_schema", "normalize_containers_schema",
+        "plan_units", "normalize_lineup_schema", "fold_name", "normalize_aliases_schema",
+    ],
+    "units": ["canonical_unit", "normalize_units_schema", "UnitRegistry", "BASE_UNITS", "to_grams"],
+    "names": ["IngredientNames", "Suggestion"],
+    "index": [
+        "CompiledRecipe", "RecipeIndex", "find_recipe_references", "compile_recipe_index", "RecipeCatalog",
+        "recipe_rows", "scale_recipes", "RecipeCycleError", "explode_recipes", "plan_requirements",
+        "inventory_vector", "threshold_vector", "merge_stock", "Feasibility", "max_batches", "Allocation",
+        "optimize_allocation", "lineup_targets", "ReorderPlan", "reorder_plan", "reorder_rows", "explode_recipe",
+        "scaled_ingredients", "scaled_subrecipes", "scale_target", "scale_sheet", "batch_consumption",
+        "draw_from_stock", "post_batch_consumption",
+    ],
+    "containers": ["container_capacity_g", "containers_weight_g", "target_weight_g", "Packing", "pack_containers"],
+    "storage": [
+        "content_hash", "FileWatcher", "atomic_write_json", "WriteBehind", "read_json", "JsonStorage",
+        "SqliteStorage", "import_json_storage", "open_storage", "SaveConflict", "save_merged",
+    ],
+    "ledger": ["InventoryLedger", "SqliteLedger"],
+    "bench": ["synthetic_catalog", "best_time", "run_benchmarks", "compare_to_baseline"],
+    "profiler": ["RerunProfile", "ProfileStore", "span", "count", "timed"],
+    "api": ["ApiError", "ApiState", "dispatch", "serve"],
+}
+_MODULE_OF = {name: module for module, names in _EXPORTS.items() for name in names}
+
+__all__ = list(_MODULE_OF)
+
+
+def __getattr__(name: str):
+    module = _MODULE_OF.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value  # later lookups skip __getattr__
+    return value
+
+
+def __dir__():
+    return sorted([*globals(), *__all__])
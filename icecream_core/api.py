@@ -0,0 +1,331 @@
+"""Local HTTP/JSON API over the engine (asyncio, standard library only).
+
+    python -m icecream_core serve --port 8765
+
+    GET  /health
+    GET  /recipes                       names
+    GET  /recipes/{name}                the recipe as stored
+    POST /scale       {"recipe", one of "factor" | "weight_g" | "containers": {"1.5 gal tub": 4}, "density"?}
+    POST /explode     same body: raw ingredients with every subrecipe expanded
+    GET  /feasibility[?recipe=...]      largest batch the current stock allows
+    GET  /inventory                     current stock and ledger position
+    POST /inventory/events {"events": [{"type", "ingredient", "amount", "unit", "note"?}],
+                            "txn"?, "expect"?: {ingredient: version}}
+
+One process keeps one catalog, one ledger and one storage connection,
+shared by every request; the catalog is rebuilt only when recipes.json or
+the aliases change. Requests are handled on one event loop with HTTP/1.1
+keep-alive. The work per request is a few numpy operations, so it runs
+inline rather than in a thread pool.
+"""
+import asyncio
+import json
+import logging
+import math
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from .config import (
+    ALIASES_FILE, CONTAINERS_FILE, DEFAULT_CONTAINERS, DEFAULT_DENSITY, DEFAULT_INGREDIENT_ALIASES, EXCLUDE_FILE,
+    INGREDIENT_FILE, INVENTORY_FILE, LEDGER_FILE, LINEUP_FILE, RECIPES_PATH, STORAGE_BACKEND, THRESHOLD_FILE,
+    UNITS_FILE,
+)
+from .index import (
+    RecipeCatalog, RecipeCycleError, draw_from_stock, explode_recipe, inventory_vector, max_batches, scale_sheet,
+    scale_target,
+)
+from .schema import fold_name, normalize_aliases_schema, normalize_containers_schema, normalize_recipes_schema
+from .storage import FileWatcher, JsonStorage, open_storage
+
+log = logging.getLogger("icecream_core.api")
+
+MAX_BODY_BYTES = 1 << 20
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 409: "Conflict",
+           413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class ApiError(Exception):
+    def __init__(self, status: int, message: str, **extra):
+        super().__init__(message)
+        self.status = status
+        self.extra = extra
+
+
+class ApiState:
+    """Everything requests share: storage, ledger and the current catalog."""
+
+    def __init__(self, backend: str = STORAGE_BACKEND, storage=None):
+        if storage is not None:  # tests: a storage on temporary files
+            self.storage = storage
+        elif backend == "json":
+            # versions from the watcher: no hashing or stat() per request
+            watcher = FileWatcher(
+                [RECIPES_PATH, LINEUP_FILE, INVENTORY_FILE, INGREDIENT_FILE, THRESHOLD_FILE,
+                 EXCLUDE_FILE, CONTAINERS_FILE, UNITS_FILE, ALIASES_FILE],
+                logs=[LEDGER_FILE],
+            )
+            self.storage = JsonStorage(watcher)
+        else:
+            self.storage = open_storage(backend)
+        self.ledger = self.storage.ledger()
+        self._docs: Dict[str, tuple] = {}  # path -> (version, data)
+        self._catalog: Optional[RecipeCatalog] = None
+        self._catalog_key: Optional[tuple] = None
+
+    def doc(self, path: str, default: Any) -> Any:
+        """A document, re-read only when its version changes. Treat as read-only."""
+        version = self.storage.version(path)
+        hit = self._docs.get(path)
+        if hit is None or hit[0] != version:
+            hit = (version, self.storage.load(path, default))
+            self._docs[path] = hit
+        return hit[1]
+
+    def catalog(self) -> RecipeCatalog:
+        key = (self.storage.version(RECIPES_PATH), self.storage.version(ALIASES_FILE))
+        if self._catalog is None or key != self._catalog_key:
+            raw = self.storage.load(RECIPES_PATH, {})
+            aliases = normalize_aliases_schema(self.doc(ALIASES_FILE, DEFAULT_INGREDIENT_ALIASES))
+            self._catalog = RecipeCatalog(RECIPES_PATH, key[0], normalize_recipes_schema(raw), aliases)
+            self._catalog_key = key
+        return self._catalog
+
+    def containers(self) -> Dict[str, Any]:
+        return normalize_containers_schema(self.doc(CONTAINERS_FILE, DEFAULT_CONTAINERS))
+
+    def inventory(self) -> Dict[str, Any]:
+        if self.ledger.stale():
+            self.ledger.refresh()
+        return self.ledger.inventory()
+
+
+# =========================
+# Handlers
+# =========================
+def _is_number(v: Any) -> bool:
+    return isinstance(v, (int, float)) and not isinstance(v, bool)
+
+def _number(body: dict, key: str) -> Optional[float]:
+    """body[key] as a float (None if absent); JSON numbers only, so true isn't 1."""
+    v = body.get(key)
+    if v is None:
+        return None
+    if not _is_number(v):
+        raise ApiError(400, f'"{key}" must be a number, not {v!r}')
+    return float(v)
+
+def _recipe(catalog: RecipeCatalog, name: Any) -> str:
+    if not isinstance(name, str):
+        raise ApiError(400, f'"recipe" must be a recipe name, not {name!r}')
+    if name in catalog:
+        return name
+    folded = {fold_name(n): n for n in catalog.names}
+    if fold_name(name) in folded:
+        return folded[fold_name(name)]
+    raise ApiError(404, f"Unknown recipe: {name!r}")
+
+def _counts(body: dict) -> Optional[Dict[str, int]]:
+    counts = body.get("containers")
+    if counts is None:
+        return None
+    if not isinstance(counts, dict):
+        raise ApiError(400, f'"containers" must be {{"container name": count}}, not {counts!r}')
+    for c, n in counts.items():
+        if not (_is_number(n) and math.isfinite(n) and n >= 0 and n == int(n)):
+            raise ApiError(400, f"Container count for {c!r} must be a whole number of 0 or more, not {n!r}")
+    return {c: int(n) for c, n in counts.items()} or None
+
+def _scale_factor(state: ApiState, catalog: RecipeCatalog, name: str, body: dict) -> float:
+    density = _number(body, "density")
+    try:
+        factor, _ = scale_target(
+            catalog.index.recipes[name],
+            weight_g=_number(body, "weight_g"),
+            counts=_counts(body),
+            factor=_number(body, "factor"),
+            containers=state.containers(),
+            density_g_per_ml=DEFAULT_DENSITY if density is None else density,
+        )
+    except (TypeError, ValueError) as e:
+        raise ApiError(400, str(e)) from None
+    return factor
+
+def health(state: ApiState, query, body) -> dict:
+    return {"ok": True, "recipes": len(state.catalog()), "storage": state.storage.name, "ledger_seq": state.ledger.seq}
+
+def list_recipes(state: ApiState, query, body) -> dict:
+    return {"recipes": list(state.catalog().names)}
+
+def get_recipe(state: ApiState, query, body, name: str) -> dict:
+    catalog = state.catalog()
+    name = _recipe(catalog, name)
+    return {"recipe": name, "data": json.loads(json.dumps(catalog.get(name), default=dict))}
+
+def scale(state: ApiState, query, body) -> dict:
+    catalog = state.catalog()
+    name = _recipe(catalog, body.get("recipe"))
+    return scale_sheet(catalog, name, _scale_factor(state, catalog, name, body))
+
+def explode(state: ApiState, query, body) -> dict:
+    catalog = state.catalog()
+    name = _recipe(catalog, body.get("recipe"))
+    factor = _scale_factor(state, catalog, name, body)
+    try:
+        raw = explode_recipe(catalog.index, name, factor)
+    except RecipeCycleError as e:
+        raise ApiError(409, str(e)) from None
+    return {"recipe": name, "scale_factor": round(factor, 6), "ingredients": raw}
+
+def feasibility(state: ApiState, query, body) -> dict:
+    catalog = state.catalog()
+    idx = catalog.index
+    stock = inventory_vector(idx, state.inventory(), unlimited=state.doc(EXCLUDE_FILE, []))
+    feas = max_batches(idx, stock)
+    names = [_recipe(catalog, n) for n in query.get("recipe", [])] or list(idx.rows)
+    out = []
+    for name in names:
+        row = idx.rows[name]
+        f, j = float(feas.max_factor[row]), int(feas.binding[row])
+        out.append({
+            "recipe": name,
+            "max_factor": None if math.isinf(f) else round(f, 4),
+            "max_weight_g": None if math.isinf(f) else round(float(feas.max_weight[row]), 1),
+            "limited_by": idx.ingredients[j] if j >= 0 else None,
+            "blocked": name in idx.blocked,
+        })
+    return {"recipes": out}
+
+def get_inventory(state: ApiState, query, body) -> dict:
+    return {"seq": state.ledger.seq, "inventory": state.inventory()}
+
+def _check_event(k: int, ev: Any) -> dict:
+    if not (isinstance(ev, dict) and isinstance(ev.get("ingredient"), str) and ev["ingredient"].strip()):
+        raise ApiError(400, 'Expected {"events": [{"type", "ingredient", "amount", "unit"}, ...]}')
+    amount, unit = ev.get("amount"), ev.get("unit", "g")
+    # a count can be 0 (ran out); moving stock takes a positive amount
+    zero_ok = ev.get("type") == "count" and amount == 0
+    if not (_is_number(amount) and math.isfinite(amount) and (amount > 0 or zero_ok)):
+        raise ApiError(400, f"events[{k}]: amount must be a number more than 0, not {amount!r}")
+    if not isinstance(unit, str):
+        raise ApiError(400, f"events[{k}]: unit must be a string, not {unit!r}")
+    return {f: ev[f] for f in ("type", "ingredient", "amount", "unit", "note", "key") if f in ev}
+
+def post_events(state: ApiState, query, body) -> dict:
+    events = body.get("events")
+    if not isinstance(events, list):
+        raise ApiError(400, 'Expected {"events": [{"type", "ingredient", "amount", "unit"}, ...]}')
+    events = [_check_event(k, ev) for k, ev in enumerate(events)]
+    expect = body.get("expect")
+    if expect is not None and not (isinstance(expect, dict) and all(type(v) is int for v in expect.values())):
+        raise ApiError(400, '"expect" must be {ingredient: version}')
+    try:
+        events = draw_from_stock(state.ledger, state.catalog().index.names, events)
+        if expect:
+            # optimistic concurrency: {ingredient: version seen by the client}
+            records, stale = state.ledger.append_checked(
+                events, {str(k): ((str(k),), int(v)) for k, v in expect.items()}, txn=body.get("txn"))
+        else:
+            records, stale = state.ledger.append(events, txn=body.get("txn")), []
+    except (TypeError, ValueError) as e:
+        raise ApiError(400, str(e)) from None
+    return {"records": records, "stale": stale, "seq": state.ledger.seq}
+
+ROUTES = {
+    ("GET", "/health"): health,
+    ("GET", "/recipes"): list_recipes,
+    ("POST", "/scale"): scale,
+    ("POST", "/explode"): explode,
+    ("GET", "/feasibility"): feasibility,
+    ("GET", "/inventory"): get_inventory,
+    ("POST", "/inventory/events"): post_events,
+}
+
+
+def dispatch(state: ApiState, method: str, target: str, raw_body: bytes) -> tuple[int, Any]:
+    url = urlsplit(target)
+    path = url.path.rstrip("/") or "/"
+    query = parse_qs(url.query)
+    try:
+        body = json.loads(raw_body) if raw_body.strip() else {}
+        if not isinstance(body, dict):
+            raise ApiError(400, "Request body must be a JSON object")
+        handler = ROUTES.get((method, path))
+        if handler is not None:
+            return 200, handler(state, query, body)
+        if path.startswith("/recipes/"):
+            if method != "GET":
+                raise ApiError(405, f"{method} not allowed on {path}")
+            return 200, get_recipe(state, query, body, unquote(path[len("/recipes/"):]))
+        if any(p == path for _, p in ROUTES):
+            raise ApiError(405, f"{method} not allowed on {path}")
+        raise ApiError(404, f"No such endpoint: {path}")
+    except json.JSONDecodeError as e:
+        return 400, {"error": f"Invalid JSON: {e.msg}"}
+    except ApiError as e:
+        return e.status, {"error": str(e), **e.extra}
+    except Exception:
+        log.exception("%s %s failed", method, target)
+        return 500, {"error": "Internal error"}
+
+
+# =========================
+# HTTP/1.1 server
+# =========================
+async def _handle(state: ApiState, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        while True:
+            try:
+                head = await reader.readuntil(b"\r\n\r\n")
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                return
+            request_line, *header_lines = head.decode("latin-1").split("\r\n")
+            try:
+                method, target, version = request_line.split(" ", 2)
+            except ValueError:
+                return
+            headers = {}
+            for line in header_lines:
+                if ":" in line:
+                    k, v = line.split(":", 1)
+                    headers[k.strip().lower()] = v.strip()
+            conn = headers.get("connection", "").lower()
+            keep_alive = conn == "keep-alive" or (version == "HTTP/1.1" and conn != "close")
+            try:
+                length = int(headers.get("content-length", 0))
+            except ValueError:
+                length = -1
+            if length < 0 or length > MAX_BODY_BYTES:
+                status, payload, keep_alive = (413 if length > 0 else 400), {"error": "Bad Content-Length"}, False
+            else:
+                raw_body = await reader.readexactly(length) if length else b""
+                status, payload = dispatch(state, method.upper(), target, raw_body)
+            try:
+                data = json.dumps(payload, ensure_ascii=False, allow_nan=False, default=str).encode("utf-8")
+            except Exception:
+                # e.g. a NaN/inf that got past validation: answer, don't drop the connection
+                log.exception("%s %s: response not serializable", method, target)
+                status, data = 500, b'{"error": "Internal error"}'
+            writer.write(
+                f"HTTP/1.1 {status} {REASONS.get(status, 'OK')}\r\n"
+                f"Content-Type: application/json; charset=utf-8\r\n"
+                f"Content-Length: {len(data)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + data
+            )
+            await writer.drain()
+            if not keep_alive:
+                return
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+async def serve(host: str = "127.0.0.1", port: int = 8765, backend: str = STORAGE_BACKEND,
+                ready: Optional[asyncio.Event] = None):
+    state = ApiState(backend)
+    state.catalog()  # build it before the first request
+    server = await asyncio.start_server(lambda r, w: _handle(state, r, w), host, port)
+    log.info("Serving on %s", ", ".join(str(s.getsockname()) for s in server.sockets))
+    if ready is not None:
+        ready.set()
+    async with server:
+        await server.serve_forever()
@@ -0,0 +1,313 @@
+"""Benchmarks on synthetic catalogs, compared against a saved baseline.
+
+    python -m icecream_core.bench                       # 10x, 100x, 1000x; compare to the baseline
+    python -m icecream_core.bench --save                # ...and record this run as the new baseline
+    python -m icecream_core.bench --scales 1,10 --tolerance 0.5 --format json
+
+A scale of 1 is the size of today's recipes.json (64 recipes, ~150
+ingredients). Catalogs are generated from a seed, so every run (and every
+machine) times the same data; the baseline is still per machine. Each stage
+is timed best-of-`repeat`. A stage more than `tolerance` slower than the
+baseline is flagged, and the exit status is 1. Every stage runs at every
+scale (the recipe index is sparse, so 1000x fits in memory).
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import timeit
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+import scipy
+
+from .config import BENCH_BASELINE_FILE
+from .index import (
+    RecipeCatalog, explode_recipe, explode_recipes, plan_requirements, scale_recipes, scale_sheet,
+)
+from .ledger import InventoryLedger
+from .schema import get_all_ingredients_from_recipes, normalize_aliases_schema, normalize_recipes_schema
+from .storage import atomic_write_json, read_json
+
+BASE_RECIPES = 64
+BASE_INGREDIENTS = 150
+DEFAULT_SCALES = (10, 100, 1000)
+DEFAULT_TOLERANCE = 0.25
+
+_NOUNS = (
+    "milk", "cream", "sugar", "dextrose", "egg yolks", "guar gum", "salt", "dry milk", "cocoa", "vanilla",
+    "banana", "strawberry", "pistachio", "hazelnut", "almond", "coffee", "matcha", "honey", "caramel", "butter",
+    "flour", "lemon", "mango", "coconut", "raspberry", "blueberry", "cherry", "peanut", "sesame", "ginger",
+    "mint", "cinnamon", "maple", "rum", "oat", "rice", "yogurt", "cheese", "chocolate", "lime",
+)
+_MODIFIERS = (
+    "roasted", "toasted", "dark", "white", "brown", "fresh", "frozen", "organic", "salted", "candied",
+    "ground", "powdered", "liquid", "whole", "skim", "black", "green", "smoked", "spiced", "sweet",
+    "sour", "wild", "red", "golden", "burnt", "raw", "pure", "local", "house", "fine",
+)
+_SUB_NAMES = ("swirl", "crumble", "sauce", "ripple", "brittle", "compote")
+
+
+# =========================
+# Synthetic catalogs
+# =========================
+def _ingredient_names(n: int) -> list[str]:
+    names = list(_NOUNS)
+    names += [f"{m} {x}" for m in _MODIFIERS for x in _NOUNS]
+    names += [f"{m2} {m1} {x}" for m1 in _MODIFIERS for m2 in _MODIFIERS if m1 != m2 for x in _NOUNS]
+    if n > len(names):
+        raise ValueError(f"At most {len(names)} synthetic ingredients")
+    return names[:n]
+
+def _noisy(name: str, rng: np.random.Generator) -> str:
+    """Another spelling the app folds together: case or spacing."""
+    k = rng.integers(3)
+    if k == 0:
+        return name.title()
+    if k == 1:
+        return name.upper()
+    return name.replace(" ", "  ") + " " if " " in name else f" {name}"
+
+def synthetic_catalog(scale: float, seed: int = 0, noise: float = 0.03) -> tuple[dict, dict]:
+    """(recipes, aliases) shaped like recipes.json at `scale` times its size.
+
+    Merged shops share most ingredients: the universe grows with sqrt(scale)
+    and picks are Zipf-weighted, so staples (milk, cream, sugar...) are in
+    most recipes and the long tail is rare. About 10% of recipes have
+    subrecipes, 5% use another recipe (a base mix) as an ingredient, and
+    `noise` of the lines use a case/spacing variant or an alias.
+    """
+    rng = np.random.default_rng(seed)
+    n_recipes = max(int(round(BASE_RECIPES * scale)), 2)
+    universe = _ingredient_names(max(int(round(BASE_INGREDIENTS * scale ** 0.5)), len(_NOUNS)))
+    weights = 1.0 / np.arange(1, len(universe) + 1) ** 1.1
+    weights /= weights.sum()
+    # aliases the shops might use: "egg-yolks" -> "egg yolks", "sugars" -> "sugar"
+    aliases = {(name.replace(" ", "-") if " " in name else f"{name}s"): name
+               for name in universe[:: max(len(universe) // 40, 1)]}
+    alias_of = {v: k for k, v in aliases.items()}
+
+    picks = rng.choice(len(universe), size=(n_recipes, 24), p=weights)
+    sizes = rng.integers(4, 13, size=n_recipes)
+    grams = np.round(rng.lognormal(mean=5.0, sigma=1.0, size=(n_recipes, 24)))
+    n_bases = max(n_recipes // 50, 1)
+
+    recipes: dict = {}
+    names = [f"Base Mix {i}" if i < n_bases else f"{_MODIFIERS[i % len(_MODIFIERS)].title()} "
+             f"{_NOUNS[(i // len(_MODIFIERS)) % len(_NOUNS)].title()} {i}" for i in range(n_recipes)]
+    for i, name in enumerate(names):
+        lines: dict = {}
+        for j in dict.fromkeys(picks[i].tolist()):
+            if len(lines) >= sizes[i]:
+                break
+            ing = universe[j]
+            r = rng.random()
+            if r < noise / 3 and ing in alias_of:
+                ing = alias_of[ing]
+            elif r < noise:
+                ing = _noisy(ing, rng)
+            lines[ing] = float(max(grams[i, len(lines)], 1.0))
+        if i >= n_bases and rng.random() < 0.05:
+            lines[names[rng.integers(n_bases)]] = float(rng.integers(500, 3000))
+        recipe: dict = {"ingredients": lines, "instruction": [f"{k + 1}) Step {k + 1}." for k in range(rng.integers(1, 4))]}
+        if rng.random() < 0.10:
+            recipe["subrecipes"] = {
+                f"{_SUB_NAMES[k]}": {
+                    "ingredients": {universe[j]: float(rng.integers(5, 400))
+                                    for j in rng.choice(len(universe), size=rng.integers(2, 6), p=weights)},
+                    "instruction": ["Mix and fold in."],
+                }
+                for k in range(rng.integers(1, 3))
+            }
+        recipes[name] = recipe
+    return recipes, aliases
+
+
+# =========================
+# Timing
+# =========================
+def best_time(fn: Callable[[], Any], repeat: int = 5, min_time: float = 0.05) -> float:
+    """Best seconds per call: each of `repeat` runs loops fn until it takes >= min_time."""
+    timer = timeit.Timer(fn, setup="import gc; gc.enable()")  # keep GC on, like the app
+    number = 1
+    while True:
+        t = timer.timeit(number)
+        if t >= min_time:
+            break
+        number = max(number * 2, int(number * min_time / max(t, 1e-9) * 1.2))
+    runs = [t, *timer.repeat(repeat - 1, number)] if repeat > 1 else [t]
+    return min(runs) / number
+
+def _pick_recipe(catalog: RecipeCatalog) -> str:
+    """A recipe with subrecipes and a base mix if there is one (the slowest to scale)."""
+    idx = catalog.index
+    for name in idx.topo_order:
+        if idx.recipes[name].subrecipes and idx.depends_on[name]:
+            return name
+    return idx.topo_order[-1]
+
+def bench_scale(scale: float, workdir: str, repeat: int = 5, min_time: float = 0.05, seed: int = 0,
+                log=None) -> Dict[str, Any]:
+    """Time every stage on one synthetic catalog; {recipes, ingredients, stages: {stage: s}}."""
+    recipes, aliases = synthetic_catalog(scale, seed)
+    path = os.path.join(workdir, f"recipes_{scale:g}x.json")
+    atomic_write_json(path, recipes, fsync=False)
+    stages: Dict[str, float] = {}
+
+    def stage(name: str, fn: Callable[[], Any]):
+        stages[name] = best_time(fn, repeat, min_time)
+        if log:
+            log(f"  {scale:g}x {name}: {stages[name] * 1000:,.3f} ms")
+
+    stage("load", lambda: read_json(path))
+    raw = read_json(path)
+    stage("normalize", lambda: normalize_recipes_schema(raw))  # idempotent: same work every call
+    normalized = normalize_recipes_schema(raw)
+    stage("universe", lambda: get_all_ingredients_from_recipes(normalized))
+    n_ings = len(get_all_ingredients_from_recipes(normalized))
+    result = {"recipes": len(recipes), "ingredients": n_ings, "stages": stages}
+
+    aliases = normalize_aliases_schema(aliases)
+    stage("compile", lambda: RecipeCatalog(path, "bench", normalized, aliases))
+    catalog = RecipeCatalog(path, "bench", normalized, aliases)
+    idx = catalog.index
+    result["index_mb"] = round(sum(m.data.nbytes + m.indices.nbytes + m.indptr.nbytes
+                                   for m in (idx.matrix, idx.sub_matrix, idx.flat_matrix)) / 2**20, 1)
+    one = _pick_recipe(catalog)
+    ok = [n for n in idx.topo_order if n not in idx.blocked]
+    factors = np.linspace(0.5, 3.0, len(ok))
+    lineup = {n: 20000.0 for n in ok[-min(len(ok), 30):]}
+    stage("scale_one", lambda: scale_sheet(catalog, one, 1.7))
+    stage("scale_bulk", lambda: scale_recipes(idx, ok, factors, subrecipes=True))
+    stage("explode_one", lambda: explode_recipe(idx, one, 1.7))
+    stage("explode_bulk", lambda: explode_recipes(idx, ok, factors))
+    stage("plan", lambda: plan_requirements(idx, lineup))
+    catalog = idx = None  # free the index before the inventory stages
+    gc.collect()
+
+    # Inventory: a snapshot with every ingredient, plus a tail of events to replay
+    universe = get_all_ingredients_from_recipes(normalized)
+    snapshot = os.path.join(workdir, f"inventory_{scale:g}x.json")
+    ledger_path = os.path.join(workdir, f"ledger_{scale:g}x.jsonl")
+    for p in (snapshot, ledger_path):
+        if os.path.exists(p):
+            os.remove(p)
+    seed_ledger = InventoryLedger(ledger_path, snapshot, compact_every=10**9)
+    seed_ledger.append([{"type": "count", "ingredient": ing, "amount": 1000.0, "unit": "g"} for ing in universe])
+    seed_ledger.compact()
+    seed_ledger.append([{"type": "consume", "ingredient": universe[k % len(universe)], "amount": 5.0, "unit": "g"}
+                        for k in range(1000)])
+    stage("inventory_load", lambda: InventoryLedger(ledger_path, snapshot, compact_every=10**9))
+    events = [{"type": "receive", "ingredient": universe[k], "amount": 2.0, "unit": "kg"}
+              for k in range(min(20, len(universe)))]
+    stage("inventory_append", lambda: seed_ledger.append(events))
+    stage("inventory_save", seed_ledger.compact)
+    return result
+
+
+def run_benchmarks(scales=DEFAULT_SCALES, repeat: int = 5, min_time: float = 0.05, seed: int = 0,
+                   log=None) -> Dict[str, Any]:
+    """Baseline-file shaped results for every scale."""
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="icecream-bench-") as workdir:
+        for scale in scales:
+            if log:
+                log(f"{scale:g}x ...")
+            results[f"{scale:g}x"] = bench_scale(scale, workdir, repeat, min_time, seed, log)
+    return {
+        "format": 1,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "scipy": scipy.__version__,
+        "machine": f"{platform.system()} {platform.machine()}",
+        "seed": seed,
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+# =========================
+# Baseline comparison
+# =========================
+def compare_to_baseline(current: Dict[str, Any], baseline: Optional[Dict[str, Any]],
+                        tolerance: float = DEFAULT_TOLERANCE) -> tuple[list[dict], list[str]]:
+    """(report rows, regressions): a stage regresses when it's more than `tolerance` slower."""
+    rows, regressions = [], []
+    base_results = (baseline or {}).get("results", {})
+    for scale, res in current["results"].items():
+        base = base_results.get(scale, {})
+        if base and (base.get("recipes"), base.get("ingredients")) != (res["recipes"], res["ingredients"]):
+            base = {}  # different catalog (generator or seed changed): nothing to compare to
+        for stage, seconds in res["stages"].items():
+            before = base.get("stages", {}).get(stage)
+            change = seconds / before - 1.0 if before else None
+            flag = ""
+            if change is not None and change > tolerance:
+                flag = "REGRESSION"
+                regressions.append(f"{scale} {stage}: {before * 1000:,.3f} -> {seconds * 1000:,.3f} ms ({change:+.0%})")
+            elif change is not None and change < -tolerance:
+                flag = "faster"
+            rows.append({
+                "Scale": scale,
+                "Stage": stage,
+                "ms": round(seconds * 1000, 4),
+                "Baseline ms": round(before * 1000, 4) if before else None,
+                "Change": f"{change:+.0%}" if change is not None else "",
+                "Flag": flag,
+            })
+    return rows, regressions
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m icecream_core.bench", description="Benchmark the engine on synthetic catalogs.")
+    parser.add_argument("--scales", default=",".join(map(str, DEFAULT_SCALES)),
+                        help="comma-separated multiples of today's catalog size (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per stage; the best one counts")
+    parser.add_argument("--min-time", type=float, default=0.05, help="seconds each run loops for, at least")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", default=BENCH_BASELINE_FILE)
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="flag stages slower than baseline by more than this fraction (default: %(default)s)")
+    parser.add_argument("--save", action="store_true", help="write this run to --baseline")
+    parser.add_argument("--format", choices=["text", "json", "csv"], default="text")
+    parser.add_argument("-q", "--quiet", action="store_true", help="no progress on stderr")
+    return parser
+
+def main(argv=None) -> int:
+    from .cli import Report, write_report
+
+    args = build_parser().parse_args(argv)
+    try:
+        scales = [float(s) for s in args.scales.split(",") if s.strip()]
+    except ValueError:
+        print(f"error: bad --scales {args.scales!r}", file=sys.stderr)
+        return 2
+    try:
+        baseline = read_json(args.baseline)
+    except FileNotFoundError:
+        baseline = None
+    except json.JSONDecodeError as e:
+        print(f"error: invalid baseline {args.baseline}: {e}", file=sys.stderr)
+        return 2
+
+    log = None if args.quiet else (lambda msg: print(msg, file=sys.stderr, flush=True))
+    current = run_benchmarks(scales, args.repeat, args.min_time, args.seed, log)
+    rows, regressions = compare_to_baseline(current, baseline, args.tolerance)
+
+    notes = [f"Baseline: {args.baseline} ({baseline['created']})" if baseline else f"No baseline at {args.baseline}"]
+    notes += [f"REGRESSION {r}" for r in regressions]
+    if args.save:
+        atomic_write_json(args.baseline, current)
+        notes.append(f"Saved as the new baseline: {args.baseline}")
+    title = f"Benchmarks ({len(regressions)} regression(s), tolerance {args.tolerance:.0%})"
+    write_report(Report(title, rows, {**current, "regressions": regressions}, tuple(notes)), args.format)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
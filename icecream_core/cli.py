@@ -0,0 +1,275 @@
+"""Command-line batch planner (no Streamlit server needed).
+
+    python -m icecream_core scale "Banana" --weight 12000
+    python -m icecream_core scale "Banana" --containers "5 L pan=4" --format csv
+    python -m icecream_core scale "Banana" --factor 1.5 --format json
+    python -m icecream_core lineup
+    python -m icecream_core reorder --lead-days 2 --cover-days 7
+    python -m icecream_core serve --port 8765
+
+Reads the same documents as the app (ICECREAM_STORAGE or --storage picks
+the backend) and doesn't change them, so it's safe to run from cron while
+the app is up: the SQLite database is opened read-only, and must already
+exist. `serve` starts the local HTTP API (see api.py), which can
+also post inventory events.
+"""
+import argparse
+import csv
+import difflib
+import json
+import sys
+from typing import Any, NamedTuple
+
+from .config import (
+    ALIASES_FILE, CONTAINERS_FILE, DEFAULT_CONTAINERS, DEFAULT_DENSITY, DEFAULT_INGREDIENT_ALIASES, EXCLUDE_FILE,
+    LINEUP_FILE, RECIPES_PATH, STORAGE_BACKEND, THRESHOLD_FILE, UNITS_FILE,
+)
+from .index import (
+    RecipeCatalog, inventory_vector, lineup_targets, plan_requirements, reorder_rows, scale_sheet, scale_target,
+    threshold_vector,
+)
+from .schema import (
+    fold_name, normalize_aliases_schema, normalize_containers_schema, normalize_lineup_schema,
+    normalize_recipes_schema, normalize_thresholds_schema, plan_units, slugify,
+)
+from .storage import open_storage
+from .units import UnitRegistry, normalize_units_schema
+
+
+class CliError(Exception):
+    pass
+
+class Report(NamedTuple):
+    title: str
+    rows: list[dict]  # the table (text / csv output)
+    data: Any         # json output
+    notes: tuple = ()
+
+
+# =========================
+# Loading
+# =========================
+def load_catalog(storage) -> RecipeCatalog:
+    raw = storage.load(RECIPES_PATH, None)
+    if raw is None:
+        raise CliError(f"Missing recipes file: {RECIPES_PATH}")
+    aliases = normalize_aliases_schema(storage.load(ALIASES_FILE, DEFAULT_INGREDIENT_ALIASES))
+    return RecipeCatalog(RECIPES_PATH, storage.version(RECIPES_PATH), normalize_recipes_schema(raw), aliases)
+
+def find_recipe(catalog: RecipeCatalog, name: str) -> str:
+    if name in catalog:
+        return name
+    folded = {fold_name(n): n for n in catalog.names}
+    if fold_name(name) in folded:
+        return folded[fold_name(name)]
+    close = difflib.get_close_matches(name, catalog.names, n=3)
+    raise CliError(f"Unknown recipe {name!r}" + (f" (did you mean: {', '.join(close)}?)" if close else ""))
+
+def parse_counts(specs: list[str], containers: dict) -> dict:
+    """["5 L pan=4", "1.5_gal_tub=2"] -> {container name: count}."""
+    by_slug = {slugify(c): c for c in containers}
+    counts = {}
+    for spec in specs:
+        name, sep, n = spec.rpartition("=")
+        name = name.strip()
+        container = name if name in containers else by_slug.get(slugify(name))
+        if not sep or container is None:
+            raise CliError(f"Bad --containers {spec!r}: use NAME=COUNT with one of: {', '.join(containers)}")
+        try:
+            counts[container] = counts.get(container, 0) + int(n)
+        except ValueError:
+            raise CliError(f"Bad container count in {spec!r}") from None
+    return counts
+
+def load_plan_inputs(storage, catalog: RecipeCatalog, density: float):
+    containers = normalize_containers_schema(storage.load(CONTAINERS_FILE, DEFAULT_CONTAINERS))
+    lineup = normalize_lineup_schema(storage.load(LINEUP_FILE, {}), plan_units(containers))
+    targets = lineup_targets(catalog.index, lineup, containers, density)
+    notes = tuple(f"Skipping {n}: " + ("recipe cycle" if n in catalog.index.blocked else "unknown recipe")
+                  for n in lineup if n not in targets)
+    return targets, notes
+
+
+# =========================
+# Commands
+# =========================
+def cmd_scale(args, storage) -> Report:
+    catalog = load_catalog(storage)
+    name = find_recipe(catalog, args.recipe)
+    containers = normalize_containers_schema(storage.load(CONTAINERS_FILE, DEFAULT_CONTAINERS))
+    counts = parse_counts(args.containers, containers) if args.containers else None
+    try:
+        factor, target = scale_target(catalog.index.recipes[name], args.weight, counts, args.factor,
+                                      containers, args.density)
+    except ValueError as e:
+        raise CliError(str(e)) from None
+
+    data = scale_sheet(catalog, name, factor)
+    rows = [{"Part": name, "Ingredient": ing, "Grams": g} for ing, g in data["ingredients"].items()]
+    rows += [{"Part": s, "Ingredient": ing, "Grams": g}
+             for s, sub in data["subrecipes"].items() for ing, g in sub["ingredients"].items()]
+    steps = [*data["instruction"]]
+    for s, sub in data["subrecipes"].items():
+        steps += [f"[{s}] {line}" for line in sub["instruction"]]
+    return Report(f"{name} ×{factor:.3f} ({target:,.0f} g)", rows, data, tuple(f"- {line}" for line in steps))
+
+def cmd_lineup(args, storage) -> Report:
+    catalog = load_catalog(storage)
+    idx = catalog.index
+    targets, notes = load_plan_inputs(storage, catalog, args.density)
+    totals = plan_requirements(idx, targets)
+    stock = inventory_vector(idx, storage.ledger().inventory())
+    rows = [
+        {
+            "Ingredient": idx.ingredients[j],
+            "Grams": round(float(totals[j]), 1),
+            "Kg": round(float(totals[j]) / 1000.0, 2),
+            "Stock (g)": round(float(stock[j])),
+            "Short (g)": round(max(float(totals[j] - stock[j]), 0.0)),
+        }
+        for j in (-totals).argsort(kind="stable") if totals[j] > 0
+    ]
+    data = {"targets_g": {n: round(w, 1) for n, w in targets.items()}, "ingredients": rows}
+    return Report(f"Lineup: {len(targets)} flavours, {sum(targets.values()):,.0f} g of mix", rows, data, notes)
+
+def cmd_reorder(args, storage) -> Report:
+    catalog = load_catalog(storage)
+    idx = catalog.index
+    registry = UnitRegistry(normalize_units_schema(storage.load(UNITS_FILE, {})))
+    thresholds = idx.names.rekey(normalize_thresholds_schema(storage.load(THRESHOLD_FILE, {})))
+    excluded = set(idx.names.ids(storage.load(EXCLUDE_FILE, [])).tolist())
+    targets, notes = load_plan_inputs(storage, catalog, args.density)
+
+    stock = inventory_vector(idx, storage.ledger().inventory())
+    min_g = threshold_vector(idx, thresholds, registry)
+    weekly = plan_requirements(idx, targets)
+    units = tuple(thresholds.get(ing, {}).get("unit", "grams") for ing in idx.ingredients)
+    rows = reorder_rows(idx, stock, min_g, weekly, units, registry, args.lead_days, args.cover_days,
+                        excluded, args.all)
+    due = sum(1 for r in rows if r["Order (g)"] > 0)
+    return Report(f"Reorder: {due} ingredients to order", rows, rows, notes)
+
+
+# =========================
+# Output
+# =========================
+def _cell(v: Any) -> str:
+    if v is None:
+        return ""
+    if isinstance(v, float):
+        return f"{v:,.2f}"
+    if isinstance(v, int):
+        return f"{v:,}"
+    return str(v)
+
+def format_text(report: Report) -> str:
+    lines = [report.title, ""]
+    if report.rows:
+        cols = list(report.rows[0])
+        cells = [[_cell(r.get(c)) for c in cols] for r in report.rows]
+        numeric = [all(isinstance(r.get(c), (int, float)) or r.get(c) is None for r in report.rows) for c in cols]
+        widths = [max(len(c), *(len(row[i]) for row in cells)) for i, c in enumerate(cols)]
+
+        def line(values):
+            return "  ".join(v.rjust(w) if num else v.ljust(w)
+                             for v, w, num in zip(values, widths, numeric)).rstrip()
+
+        lines += [line(cols), line(["-" * w for w in widths]), *(line(row) for row in cells)]
+    else:
+        lines.append("(nothing)")
+    if report.notes:
+        lines += ["", *report.notes]
+    return "\n".join(lines) + "\n"
+
+def write_report(report: Report, fmt: str, out=None):
+    out = out or sys.stdout
+    if fmt == "json":
+        json.dump(report.data, out, indent=2, ensure_ascii=False)
+        out.write("\n")
+    elif fmt == "csv":
+        if report.rows:
+            writer = csv.DictWriter(out, fieldnames=list(report.rows[0]), lineterminator="\n")
+            writer.writeheader()
+            writer.writerows(report.rows)
+    else:
+        out.write(format_text(report))
+
+
+def build_parser() -> argparse.ArgumentParser:
+    def add_common(p: argparse.ArgumentParser, suppress: bool = False):
+        p.add_argument("--format", choices=["text", "json", "csv"],
+                       default=argparse.SUPPRESS if suppress else "text")
+        p.add_argument("--storage", choices=["json", "sqlite"],
+                       default=argparse.SUPPRESS if suppress else STORAGE_BACKEND,
+                       help="storage backend (default: $ICECREAM_STORAGE or json)")
+
+    parser = argparse.ArgumentParser(prog="python -m icecream_core", description="Ice cream batch planner.")
+    add_common(parser)
+    # the same options on every command, so they work before or after the command name;
+    # suppressed defaults keep a command from resetting what was given before it
+    common = argparse.ArgumentParser(add_help=False)
+    add_common(common, suppress=True)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    scale = commands.add_parser("scale", parents=[common], help="scale one recipe")
+    scale.add_argument("recipe")
+    how = scale.add_mutually_exclusive_group(required=True)
+    how.add_argument("--weight", type=float, help="target batch weight in grams")
+    how.add_argument("--containers", action="append", metavar="NAME=COUNT",
+                     help="containers to fill (repeatable), e.g. '5 L pan=4'")
+    how.add_argument("--factor", type=float, help="multiplier")
+    scale.add_argument("--density", type=float, default=DEFAULT_DENSITY, help="mix density in g/mL")
+    scale.set_defaults(func=cmd_scale)
+
+    lineup = commands.add_parser("lineup", parents=[common], help="total ingredients for the saved weekly lineup")
+    lineup.add_argument("--density", type=float, default=DEFAULT_DENSITY, help="mix density in g/mL")
+    lineup.set_defaults(func=cmd_lineup)
+
+    reorder = commands.add_parser("reorder", parents=[common], help="what to order, from stock, minimums and the lineup")
+    reorder.add_argument("--lead-days", type=float, default=2.0)
+    reorder.add_argument("--cover-days", type=float, default=7.0)
+    reorder.add_argument("--all", action="store_true", help="list every ingredient, not just the ones to order")
+    reorder.add_argument("--density", type=float, default=DEFAULT_DENSITY, help="mix density in g/mL")
+    reorder.set_defaults(func=cmd_reorder)
+
+    serve = commands.add_parser("serve", parents=[common], help="run the local HTTP/JSON API (POS, label printer)")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.set_defaults(func=None)
+    return parser
+
+def run_server(args) -> int:
+    import asyncio
+    import logging
+
+    from .api import serve
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    try:
+        asyncio.run(serve(args.host, args.port, args.storage))
+    except KeyboardInterrupt:
+        pass
+    except OSError as e:  # port in use & co.
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.command == "serve":
+        return run_server(args)
+    try:
+        storage = open_storage(args.storage, readonly=True)
+    except FileNotFoundError as e:
+        print(f"error: no database at {e} (the app creates it when run with ICECREAM_STORAGE=sqlite)", file=sys.stderr)
+        return 1
+    try:
+        report = args.func(args, storage)
+    except (CliError, json.JSONDecodeError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    try:
+        write_report(report, args.format)
+    except BrokenPipeError:  # piped into head & co.
+        sys.stdout = None
+    return 0
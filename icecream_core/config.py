@@ -0,0 +1,67 @@
+"""Paths, units and defaults shared by the app and headless scripts."""
+import os
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+RECIPES_PATH    = os.path.join(BASE_DIR, "recipes.json")
+LINEUP_FILE     = os.path.join(BASE_DIR, "weekly_lineup.json")
+INVENTORY_FILE  = os.path.join(BASE_DIR, "inventory.json")  # flavor inventory
+INGREDIENT_FILE = os.path.join(BASE_DIR, "ingredient_inventory.json")  # compacted snapshot
+LEDGER_FILE     = os.path.join(BASE_DIR, "ingredient_ledger.jsonl")    # append-only events
+THRESHOLD_FILE  = os.path.join(BASE_DIR, "ingredient_thresholds.json")
+EXCLUDE_FILE    = os.path.join(BASE_DIR, "excluded_ingredients.json")
+CONTAINERS_FILE = os.path.join(BASE_DIR, "containers.json")
+UNITS_FILE      = os.path.join(BASE_DIR, "ingredient_units.json")  # per-ingredient pack sizes / densities
+ALIASES_FILE    = os.path.join(BASE_DIR, "ingredient_aliases.json")  # {alias: canonical ingredient name}
+DB_FILE         = os.path.join(BASE_DIR, "icecream.db")  # only used by the sqlite backend
+BENCH_BASELINE_FILE = os.path.join(BASE_DIR, "bench_baseline.json")  # python -m icecream_core.bench --save
+
+# "json": one file per document (default, fine for small installs)
+# "sqlite": everything in DB_FILE; the JSON files above are imported once on first start
+STORAGE_BACKEND = os.environ.get("ICECREAM_STORAGE", "json").lower()
+# Documents the sqlite backend imports from their JSON files (the ledger is imported separately)
+DOCUMENT_FILES = [RECIPES_PATH, LINEUP_FILE, INVENTORY_FILE, THRESHOLD_FILE, EXCLUDE_FILE,
+                  CONTAINERS_FILE, UNITS_FILE, ALIASES_FILE]
+
+UNIT_OPTIONS = ["cans", "50lbs bags", "grams", "liters", "gallons"]
+UNIT_FACTORS = {"g": 1.0, "kg": 1000.0, "lb": 453.59237, "oz": 28.349523125}
+VOLUME_ML    = {"ml": 1.0, "l": 1000.0, "qt": 946.352946, "gal": 3785.411784}
+PACK_FACTORS = {"50 lb bag": 50 * 453.59237}  # fixed-weight packs; per-ingredient ones live in UNITS_FILE
+UNIT_ALIASES = {
+    "grams": "g", "gram": "g", "kilograms": "kg", "kgs": "kg",
+    "lbs": "lb", "pounds": "lb", "pound": "lb", "ounces": "oz",
+    "liters": "l", "liter": "l", "litres": "l", "litre": "l", "milliliters": "ml",
+    "quarts": "qt", "gallons": "gal", "gallon": "gal",
+    "cans": "can", "50lbs bags": "50 lb bag", "50 lbs bags": "50 lb bag", "50lb bag": "50 lb bag",
+}
+
+GAL_TO_L        = 3.785411784
+VOL_5L_L        = 5.0
+VOL_1_5GAL_L    = 1.5 * GAL_TO_L
+DEFAULT_DENSITY = 1.03  # mix density, g/mL
+MAX_BATCH_G     = 1_000_000.0  # largest batch the app's weight inputs accept (1 t)
+PACK_MAX_STEPS  = 20_000  # container packing table size: coarser than 10 g steps above 200 kg
+
+WATCH_POLL_SECONDS = 2.0  # only used when watchdog (inotify) isn't available
+SAVE_DELAY_SECONDS = 0.25  # a save waits this long for newer data for the same file
+SAVE_FSYNC = True          # fsync files (and their folder once per batch) before moving on
+
+# Rerun profiler: ICECREAM_DIAGNOSTICS=1 (or ?diagnostics=1 in the URL) shows the
+# Diagnostics page; ICECREAM_PROFILE_LOG=path also writes every rerun to a JSON-lines log
+DIAGNOSTICS = os.environ.get("ICECREAM_DIAGNOSTICS", "") not in ("", "0")
+PROFILE_LOG_FILE = os.environ.get("ICECREAM_PROFILE_LOG") or None
+PROFILE_LOG_MAX_BYTES = 5 * 1024 * 1024  # rotate the log at this size...
+PROFILE_LOG_BACKUPS = 3                  # ...keeping this many old files
+PROFILE_KEEP = 200                       # reruns kept in memory for the page
+
+LEDGER_EVENT_TYPES = ("receive", "consume", "count", "waste")
+LEDGER_COMPACT_EVERY = 200
+
+# Used until ALIASES_FILE is saved from the Ingredient Names page
+DEFAULT_INGREDIENT_ALIASES = {"yolks": "egg yolks", "guar": "guar gum"}
+
+# volume_l: nominal volume, fill: fraction actually filled, slots: freezer footprint
+DEFAULT_CONTAINERS = {
+    "5 L pan":     {"volume_l": VOL_5L_L,     "fill": 1.0, "slots": 1.0},
+    "1.5 gal tub": {"volume_l": VOL_1_5GAL_L, "fill": 1.0, "slots": 1.0},
+}
@@ -0,0 +1,100 @@
+"""Container registry maths: capacities and packing a batch into containers."""
+import math
+import threading
+from collections.abc import Mapping
+from typing import Any, NamedTuple, Optional
+
+from .config import DEFAULT_CONTAINERS, DEFAULT_DENSITY, PACK_MAX_STEPS
+
+
+def container_capacity_g(container: Mapping[str, Any], density_g_per_ml: float = DEFAULT_DENSITY) -> float:
+    return container["volume_l"] * container["fill"] * 1000.0 * density_g_per_ml
+
+def containers_weight_g(counts: Mapping[str, int], containers: Mapping[str, Any],
+                        density_g_per_ml: float = DEFAULT_DENSITY) -> float:
+    """Reverse direction: batch weight that fills a given container mix."""
+    return sum(n * container_capacity_g(containers[c], density_g_per_ml) for c, n in counts.items() if c in containers)
+
+def target_weight_g(amount: float, unit: str, density_g_per_ml: float = DEFAULT_DENSITY,
+                    containers: Mapping[str, Any] = DEFAULT_CONTAINERS) -> float:
+    """Batch weight for `amount` of a plan unit: grams, or a container name."""
+    if unit in containers:
+        return float(amount) * container_capacity_g(containers[unit], density_g_per_ml)
+    return float(amount)
+
+class Packing(NamedTuple):
+    counts: dict      # container name -> how many
+    packed_g: float
+    leftover_g: float
+    slots: float
+
+_PACK_TABLES: dict = {}
+_PACK_LOCK = threading.Lock()
+_PACK_TABLES_MAX = 32
+
+def _pack_table(sizes: tuple, costs: tuple, limit: int) -> tuple[list, list]:
+    # Unbounded knapsack: cost[c] = cheapest (fewest freezer slots) way to fill
+    # exactly c units, pick[c] = the container used last. Tables are memoized
+    # per container set and only grown when a bigger target comes along.
+    with _PACK_LOCK:
+        key = (sizes, costs)
+        cost, pick = _PACK_TABLES.pop(key, None) or ([0.0], [-1])
+        for c in range(len(cost), limit + 1):
+            best, arg = float("inf"), -1
+            for i, (size, w) in enumerate(zip(sizes, costs)):
+                if size <= c and cost[c - size] + w < best:
+                    best, arg = cost[c - size] + w, i
+            cost.append(best)
+            pick.append(arg)
+        _PACK_TABLES[key] = (cost, pick)
+        while len(_PACK_TABLES) > _PACK_TABLES_MAX:
+            _PACK_TABLES.pop(next(iter(_PACK_TABLES)))
+        return cost, pick
+
+def pack_containers(target_g: float, containers: Mapping[str, Any], density_g_per_ml: float = DEFAULT_DENSITY,
+                    max_slots: Optional[float] = None, resolution_g: float = 10.0) -> Packing:
+    """Container mix that holds as much of `target_g` as possible (least leftover),
+    using the fewest freezer slots among equally good fills.
+
+    The table covers at most PACK_MAX_STEPS steps of `resolution_g` (200 kg at
+    10 g). A bigger target is first filled with the container that holds the
+    most per freezer slot, and only the last stretch goes through the table.
+    """
+    if not math.isfinite(target_g):
+        raise ValueError(f"Can't pack {target_g} g")
+    original_g = target_g
+    names = list(containers)
+    caps = [container_capacity_g(containers[n], density_g_per_ml) for n in names]
+    counts = {n: 0 for n in names}
+
+    window = PACK_MAX_STEPS * resolution_g
+    if target_g > window:
+        b = max(range(len(names)), key=lambda i: (caps[i] / containers[names[i]]["slots"], caps[i]))
+        n = int((target_g - window) // caps[b])
+        if max_slots is not None:
+            n = min(n, int(max_slots // containers[names[b]]["slots"]))
+            max_slots -= n * containers[names[b]]["slots"]
+        counts[names[b]] = n
+        target_g -= n * caps[b]
+
+    # Round capacities up so a fill that fits the table never overflows the target
+    sizes = tuple(max(1, int(math.ceil(cap / resolution_g))) for cap in caps)
+    costs = tuple(containers[n]["slots"] + 1e-6 for n in names)  # tie-break: fewer containers
+    limit = min(max(int(target_g // resolution_g), 0), 2 * PACK_MAX_STEPS)
+    cost, pick = _pack_table(sizes, costs, limit)
+
+    best = 0
+    for c in range(limit, 0, -1):
+        if cost[c] < float("inf") and (max_slots is None or cost[c] <= max_slots + 1e-3):
+            best = c
+            break
+
+    c = best
+    while c > 0:
+        i = pick[c]
+        counts[names[i]] += 1
+        c -= sizes[i]
+
+    packed = containers_weight_g(counts, containers, density_g_per_ml)
+    slots = sum(n * containers[name]["slots"] for name, n in counts.items())
+    return Packing(counts=counts, packed_g=packed, leftover_g=max(original_g - packed, 0.0), slots=slots)
@@ -0,0 +1,654 @@
+"""Compiled recipe index and the vectorized scaling engine built on it.
+
+One RecipeIndex per recipes.json version: sparse (CSR) recipes x ingredients
+matrices (direct, subrecipes, and fully flattened through referenced
+recipes), so scaling, planning, feasibility and reorder maths are array
+operations. A recipe uses a dozen of the catalog's ingredients, so the
+matrices stay small as merged catalogs grow (64k recipes x 5k ingredients
+is ~30 MB; dense it would be ~7 GB).
+"""
+import math
+import time
+from collections import deque
+from collections.abc import Mapping
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Any, Dict, NamedTuple, Optional
+
+import numpy as np
+from scipy import sparse
+
+from .config import DEFAULT_CONTAINERS, DEFAULT_DENSITY, UNIT_FACTORS
+from .containers import containers_weight_g, target_weight_g
+from .names import IngredientNames
+from .schema import fold_name, slugify
+from .units import BASE_UNITS, UnitRegistry, canonical_unit, to_grams
+
+if TYPE_CHECKING:
+    from .ledger import InventoryLedger
+
+
+# =========================
+# Shared recipe catalog + compiled index (one per file version)
+# =========================
+def _freeze(obj: Any) -> Any:
+    if isinstance(obj, Mapping):
+        return MappingProxyType({k: _freeze(v) for k, v in obj.items()})
+    if isinstance(obj, (list, tuple)):
+        return tuple(_freeze(v) for v in obj)
+    return obj
+
+def _as_float(v: Any) -> float:
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return 0.0
+
+def _readonly(a: np.ndarray) -> np.ndarray:
+    a.flags.writeable = False
+    return a
+
+def _csr(parts: list[tuple[np.ndarray, np.ndarray]], n_cols: int) -> sparse.csr_array:
+    """Read-only CSR matrix with one row per (ingredient ids, grams) pair; repeated ids are summed."""
+    indptr = np.zeros(len(parts) + 1, dtype=np.int64)
+    np.cumsum([len(ids) for ids, _ in parts], out=indptr[1:])
+    indices = np.concatenate([ids for ids, _ in parts]) if parts else np.zeros(0, dtype=np.int32)
+    data = np.concatenate([q for _, q in parts]) if parts else np.zeros(0)
+    m = sparse.csr_array((data.astype(np.float64), indices.astype(np.int32), indptr), shape=(len(parts), n_cols))
+    m.sum_duplicates()
+    m.eliminate_zeros()
+    for a in (m.data, m.indices, m.indptr):
+        _readonly(a)
+    return m
+
+class CompiledRecipe(NamedTuple):
+    name: str
+    slug: str
+    total_weight: float
+    ingredient_names: tuple[str, ...]  # as written in the recipe (display order)
+    ingredient_ids: np.ndarray         # positions in RecipeIndex.ingredients
+    quantities: np.ndarray             # grams, aligned with ingredient_ids
+    subrecipes: Mapping[str, "CompiledRecipe"]
+
+class RecipeIndex(NamedTuple):
+    ingredients: tuple[str, ...]       # sorted canonical ingredient names
+    ingredient_ids: Mapping[str, int]  # canonical name -> id; other spellings via names.id()
+    names: IngredientNames
+    recipes: Mapping[str, CompiledRecipe]
+    rows: Mapping[str, int]            # recipe name -> row in matrix / sub_matrix
+    matrix: sparse.csr_array           # recipes x ingredients, grams at 1x
+    sub_matrix: sparse.csr_array       # recipes x ingredients, subrecipe grams at 1x
+    references: Mapping[str, str]      # ingredient name -> recipe it stands for
+    depends_on: Mapping[str, frozenset]
+    topo_order: tuple[str, ...]        # dependencies before the recipes using them
+    blocked: frozenset                 # recipes in (or depending on) a cycle
+    flat_matrix: sparse.csr_array      # recipes x ingredients, raw grams at 1x, all levels
+
+def _compile_recipe(name: str, r: Any, names: IngredientNames, with_subs: bool = True) -> CompiledRecipe:
+    r = r if isinstance(r, Mapping) else {}
+    ings = r.get("ingredients") or {}
+    qty = np.fromiter((_as_float(v) for v in ings.values()), dtype=np.float64, count=len(ings))
+    subs = {}
+    if with_subs:
+        for sname, srec in (r.get("subrecipes") or {}).items():
+            if isinstance(srec, Mapping):
+                subs[sname] = _compile_recipe(sname, srec, names, with_subs=False)
+    return CompiledRecipe(
+        name=name,
+        slug=slugify(name),
+        total_weight=float(qty.sum()),
+        ingredient_names=tuple(ings.keys()),
+        ingredient_ids=_readonly(names.ids(ings).astype(np.int32)),
+        quantities=_readonly(qty),
+        subrecipes=MappingProxyType(subs),
+    )
+
+def _line_names(r: Any):
+    if not isinstance(r, Mapping):
+        return
+    yield from (str(k).strip() for k in (r.get("ingredients") or {}))
+    for s in (r.get("subrecipes") or {}).values():
+        if isinstance(s, Mapping):
+            yield from (str(k).strip() for k in (s.get("ingredients") or {}))
+
+def find_recipe_references(recipes: Mapping[str, Any], names: Optional[IngredientNames] = None) -> dict[str, str]:
+    """Map ingredient names that stand for another recipe to that recipe.
+
+    A line references a recipe when it spells another recipe's name exactly
+    ("white mix" in Basil). Other spellings of an already-referenced name
+    ("White Mix" in the W.Mix recipes, or an alias of it when `names` is
+    given) resolve the same way. Flavours that list their own name ("ricotta"
+    in ricotta) mean the raw ingredient, and loose case matches ("ginger" vs
+    the Ginger ice cream) are not treated as references.
+    """
+    same = names.id if names is not None else fold_name
+    refs: dict[str, str] = {}
+    for name, r in recipes.items():
+        for ing in _line_names(r):
+            if ing != name and ing in recipes:
+                refs[ing] = ing
+    folded = {same(k): v for k, v in refs.items()}
+    for r in recipes.values():
+        for ing in _line_names(r):
+            if ing not in refs and same(ing) in folded:
+                refs[ing] = folded[same(ing)]
+    return refs
+
+def _recipe_dependencies(c: CompiledRecipe, references: Mapping[str, str]) -> frozenset:
+    deps = set()
+    for part in (c, *c.subrecipes.values()):
+        for ing in part.ingredient_names:
+            target = references.get(str(ing).strip())
+            if target is not None and target != c.name and ing not in c.subrecipes:
+                deps.add(target)
+    return frozenset(deps)
+
+def _topological_order(depends_on: Mapping[str, frozenset]) -> tuple[list[str], set[str]]:
+    # Kahn's algorithm; whatever never becomes ready is in or behind a cycle.
+    waiting = {name: set(deps) for name, deps in depends_on.items()}
+    users: dict[str, list[str]] = {}
+    for name, deps in depends_on.items():
+        for d in deps:
+            users.setdefault(d, []).append(name)
+    ready = deque(name for name, deps in waiting.items() if not deps)
+    order: list[str] = []
+    while ready:
+        name = ready.popleft()
+        order.append(name)
+        for u in users.get(name, ()):
+            waiting[u].discard(name)
+            if not waiting[u]:
+                ready.append(u)
+    return order, set(depends_on) - set(order)
+
+def _flatten(c: CompiledRecipe, owner: str, references: Mapping[str, str],
+             compiled: Mapping[str, CompiledRecipe], flat: Mapping[str, tuple]) -> tuple[np.ndarray, np.ndarray]:
+    """(raw ingredient ids, grams) of one recipe at 1x, all levels expanded.
+
+    An id can repeat (milk in the recipe and in its base mix); _csr() sums them.
+    """
+    if not c.subrecipes and not any(str(ing).strip() in references for ing in c.ingredient_names):
+        return c.ingredient_ids, c.quantities
+    ids, grams, direct = [], [], []
+    for k, ing in enumerate(c.ingredient_names):
+        if ing in c.subrecipes:
+            continue
+        target = references.get(str(ing).strip(), owner)
+        if target != owner and compiled[target].total_weight > 0:
+            # Referenced recipes are used by weight: 3920 g of a 100 kg base.
+            t_ids, t_grams = flat[target]
+            ids.append(t_ids)
+            grams.append(t_grams * (c.quantities[k] / compiled[target].total_weight))
+        else:
+            direct.append(k)
+    ids.append(c.ingredient_ids[direct])
+    grams.append(c.quantities[direct])
+    # Subrecipes are made at the parent's scale factor, like scale_subrecipes().
+    for sub in c.subrecipes.values():
+        s_ids, s_grams = _flatten(sub, owner, references, compiled, flat)
+        ids.append(s_ids)
+        grams.append(s_grams)
+    return np.concatenate(ids), np.concatenate(grams)
+
+def compile_recipe_index(recipes: Mapping[str, Any], aliases: Optional[Mapping[str, str]] = None) -> RecipeIndex:
+    spellings: Dict[str, int] = {}
+    for r in recipes.values():
+        for ing in _line_names(r):
+            spellings[ing] = spellings.get(ing, 0) + 1
+    names = IngredientNames(spellings, aliases)
+    universe = names.names
+    ids = MappingProxyType({ing: i for i, ing in enumerate(universe)})
+    compiled = {name: _compile_recipe(name, r, names) for name, r in recipes.items()}
+
+    # Sparse: memory grows with recipe lines, not recipes x ingredients
+    n = len(universe)
+    matrix = _csr([(c.ingredient_ids, c.quantities) for c in compiled.values()], n)
+    sub_matrix = _csr([
+        (np.concatenate([s.ingredient_ids for s in c.subrecipes.values()] or [np.zeros(0, dtype=np.int32)]),
+         np.concatenate([s.quantities for s in c.subrecipes.values()] or [np.zeros(0)]))
+        for c in compiled.values()
+    ], n)
+
+    rows = {name: row for row, name in enumerate(compiled)}
+    references = find_recipe_references(recipes, names)
+    depends_on = {name: _recipe_dependencies(c, references) for name, c in compiled.items()}
+    order, blocked = _topological_order(depends_on)
+
+    # Memoized expansion: walking in topological order means every referenced
+    # recipe is already flattened when its users need it. Recipes in a cycle
+    # stay empty.
+    flat: Dict[str, tuple] = {}
+    for name in order:
+        flat[name] = _flatten(compiled[name], name, references, compiled, flat)
+    empty = (np.zeros(0, dtype=np.int32), np.zeros(0))
+    flat_matrix = _csr([flat.get(name, empty) for name in compiled], n)
+
+    return RecipeIndex(
+        ingredients=universe,
+        ingredient_ids=ids,
+        names=names,
+        recipes=MappingProxyType(compiled),
+        rows=MappingProxyType(rows),
+        matrix=matrix,
+        sub_matrix=sub_matrix,
+        references=MappingProxyType(references),
+        depends_on=MappingProxyType(depends_on),
+        topo_order=tuple(order),
+        blocked=frozenset(blocked),
+        flat_matrix=flat_matrix,
+    )
+
+class RecipeCatalog:
+    """Normalized, frozen view of recipes.json shared by every session.
+
+    Recipes are MappingProxyType all the way down (lists become tuples), so a
+    lookup hands out the shared object without copying and nobody can mutate it.
+    """
+    __slots__ = ("path", "version", "recipes", "names", "index")
+
+    def __init__(self, path: str, version: str, recipes: dict, aliases: Optional[Mapping[str, str]] = None):
+        self.path = path
+        self.version = version
+        self.recipes: Mapping[str, Any] = _freeze(recipes)
+        self.names: tuple[str, ...] = tuple(sorted(self.recipes.keys()))
+        self.index: RecipeIndex = compile_recipe_index(self.recipes, aliases)
+
+    def __len__(self) -> int:
+        return len(self.recipes)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self.recipes
+
+    def get(self, name: str, default: Any = None) -> Any:
+        return self.recipes.get(name, default)
+
+
+# =========================
+# Scaling engine
+# =========================
+def recipe_rows(index: RecipeIndex, names) -> np.ndarray:
+    return np.fromiter((index.rows[n] for n in names), dtype=np.intp)
+
+def _scaled_rows(source: sparse.csr_array, rows: np.ndarray, factors) -> sparse.csr_array:
+    picked = source[rows]
+    f = np.broadcast_to(np.asarray(factors, dtype=np.float64), rows.shape)
+    data = picked.data * np.repeat(f, np.diff(picked.indptr))
+    return sparse.csr_array((data, picked.indices, picked.indptr), shape=picked.shape)
+
+def scale_recipes(index: RecipeIndex, names, factors, subrecipes: bool = False) -> sparse.csr_array:
+    """Scale many recipes in one call.
+
+    Returns a sparse len(names) x len(index.ingredients) matrix of grams
+    (.toarray() for a dense one); `factors` is one scale factor per recipe
+    (or a single scalar for all of them).
+    """
+    source = index.sub_matrix if subrecipes else index.matrix
+    return _scaled_rows(source, recipe_rows(index, names), factors)
+
+class RecipeCycleError(ValueError):
+    pass
+
+def _cycle_path(index: RecipeIndex, name: str) -> list[str]:
+    path: list[str] = []
+    cur = name
+    while cur not in path:
+        path.append(cur)
+        cur = min(d for d in index.depends_on[cur] if d in index.blocked)
+    return path[path.index(cur):] + [cur]
+
+def explode_recipes(index: RecipeIndex, names, factors) -> sparse.csr_array:
+    """Like scale_recipes(), but with every subrecipe and referenced recipe
+    expanded down to raw ingredients (intermediate columns stay at zero)."""
+    for n in names:
+        if n in index.blocked:
+            raise RecipeCycleError(f"{n}: recipe cycle " + " -> ".join(_cycle_path(index, n)))
+    return _scaled_rows(index.flat_matrix, recipe_rows(index, names), factors)
+
+def plan_requirements(index: RecipeIndex, targets: Mapping[str, float]) -> np.ndarray:
+    """Combined raw grams per ingredient for a {recipe: target batch grams} plan.
+
+    One matrix-vector product over the flattened matrix, so subrecipes and
+    referenced recipes are included.
+    """
+    names = [n for n, w in targets.items() if w > 0]
+    if not names:
+        return np.zeros(len(index.ingredients))
+    weights = np.fromiter((targets[n] for n in names), dtype=np.float64, count=len(names))
+    totals = np.fromiter((index.recipes[n].total_weight for n in names), dtype=np.float64, count=len(names))
+    factors = np.divide(weights, totals, out=np.zeros_like(weights), where=totals > 0)
+    return explode_recipes(index, names, 1.0).T @ factors
+
+def _grams_by_id(index: RecipeIndex, table: Mapping[str, Any], registry: UnitRegistry, field: str,
+                 default_unit: str) -> np.ndarray:
+    # Keys go through the name registry, so "yolks" and "egg yolks" land in
+    # the same column and are added up.
+    out = np.zeros(len(index.ingredients))
+    keys = list(table or {})
+    if not keys:
+        return out
+    ids = index.names.ids(keys)
+    rows = [table[k] or {} for k in keys]
+    amounts = np.fromiter((float(r.get(field, 0) or 0) for r in rows), dtype=np.float64, count=len(rows))
+    names = tuple(index.ingredients[j] if j >= 0 else str(k) for j, k in zip(ids, keys))
+    units = tuple(r.get("unit", default_unit) for r in rows)
+    # zero of an unconvertible unit is still zero
+    grams = np.where(amounts == 0, 0.0, amounts * registry.compile(names, units))
+    known = ids >= 0
+    np.add.at(out, ids[known], grams[known])
+    return out
+
+def inventory_vector(index: RecipeIndex, inv: Mapping[str, Any], unlimited=()) -> np.ndarray:
+    """Stock in grams aligned with index.ingredients (normalized inventory in).
+
+    Stock kept under several spellings of one ingredient is added up.
+    Ingredients in `unlimited` (e.g. the exclusion list: water, salt...) never
+    limit a batch.
+    """
+    stock = _grams_by_id(index, inv, BASE_UNITS, "amount", "g")
+    ids = index.names.ids(unlimited)
+    stock[ids[ids >= 0]] = np.inf
+    return stock
+
+def threshold_vector(index: RecipeIndex, thresholds: Mapping[str, Any], registry: UnitRegistry) -> np.ndarray:
+    """Minimum levels in grams aligned with index.ingredients (NaN = unit can't be converted).
+
+    When several spellings carry a minimum, the canonical spelling's entry wins.
+    """
+    return _grams_by_id(index, index.names.rekey(thresholds), registry, "min", "grams")
+
+def merge_stock(a: Mapping[str, Any], b: Mapping[str, Any]) -> Dict[str, Any]:
+    """rekey() merge for inventory rows: add the amounts (in grams if the units differ)."""
+    if a["unit"] == b["unit"]:
+        return {"amount": a["amount"] + b["amount"], "unit": a["unit"]}
+    return {"amount": to_grams(a["amount"], a["unit"]) + to_grams(b["amount"], b["unit"]), "unit": "g"}
+
+class Feasibility(NamedTuple):
+    max_factor: np.ndarray   # per recipe row; inf = nothing limits it
+    max_weight: np.ndarray   # grams of finished mix
+    binding: np.ndarray      # ingredient id of the binding constraint, -1 if none
+
+def max_batches(index: RecipeIndex, stock: np.ndarray) -> Feasibility:
+    """Largest batch of every recipe the stock allows, all recipes at once.
+
+    For each row of the flattened matrix the limit is min(stock / need) over
+    the ingredients it uses; argmin is the ingredient that runs out first.
+    """
+    need = index.flat_matrix
+    n_rows = need.shape[0]
+    per_row = np.diff(need.indptr)
+    row_of = np.repeat(np.arange(n_rows), per_row)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratios = np.where(need.data > 0, stock[need.indices] / need.data, np.inf)
+    factor = np.full(n_rows, np.inf)
+    binding = np.full(n_rows, -1, dtype=np.intp)
+    used = per_row > 0
+    if used.any():
+        factor[used] = np.minimum.reduceat(ratios, need.indptr[:-1][used])
+        # first (lowest id) ingredient at each row's minimum, like argmin
+        at_min = np.flatnonzero(ratios == factor[row_of])
+        rows, first = np.unique(row_of[at_min], return_index=True)
+        binding[rows] = need.indices[at_min[first]]
+    binding = np.where(np.isfinite(factor), binding, -1)
+    for name in index.blocked:
+        factor[index.rows[name]] = 0.0
+        binding[index.rows[name]] = -1
+    totals = np.fromiter((c.total_weight for c in index.recipes.values()), dtype=np.float64, count=len(index.recipes))
+    return Feasibility(max_factor=factor, max_weight=factor * totals, binding=binding)
+
+class Allocation(NamedTuple):
+    ok: bool
+    message: str
+    weights: np.ndarray       # grams of mix per flavour, in the order asked for
+    usage: np.ndarray         # grams used per ingredient
+    binding: tuple[int, ...]  # ingredient ids that are fully used up
+
+def _linprog():
+    # scipy.optimize is slow to import and only the optimizer needs it
+    from scipy.optimize import linprog
+    return linprog
+
+def optimize_allocation(index: RecipeIndex, names, stock: np.ndarray, priorities,
+                        minimums=None, maximums=None) -> Allocation:
+    """Split shared stock across flavours to maximize priority-weighted output.
+
+    Linear program over x = grams of each flavour:
+        max  priorities . x
+        s.t. need_per_gram^T x <= stock   (every ingredient with finite stock)
+             minimums <= x <= maximums    (NaN / None maximum = no cap)
+    """
+    names = list(names)
+    n = len(index.ingredients)
+    if not names:
+        return Allocation(True, "Nothing to plan.", np.zeros(0), np.zeros(n), ())
+
+    totals = np.fromiter((index.recipes[f].total_weight for f in names), dtype=np.float64, count=len(names))
+    need = explode_recipes(index, names, 1.0).toarray()  # one row per lineup flavour
+    per_g = np.divide(need, totals[:, None], out=np.zeros_like(need), where=totals[:, None] > 0)
+
+    limited = np.isfinite(stock) & (per_g.sum(axis=0) > 0)
+    lo = np.zeros(len(names)) if minimums is None else np.nan_to_num(np.asarray(minimums, dtype=np.float64))
+    hi = np.full(len(names), np.nan) if maximums is None else np.asarray(maximums, dtype=np.float64)
+    bounds = [(float(a), None if np.isnan(b) else float(b)) for a, b in zip(lo, hi)]
+
+    res = _linprog()(
+        -np.asarray(priorities, dtype=np.float64),
+        A_ub=per_g[:, limited].T if limited.any() else None,
+        b_ub=stock[limited] if limited.any() else None,
+        bounds=bounds,
+        method="highs",
+    )
+    if res.status != 0:
+        return Allocation(False, res.message, np.zeros(len(names)), np.zeros(n), ())
+
+    x = np.maximum(res.x, 0.0)
+    usage = x @ per_g
+    used_up = np.flatnonzero(limited)
+    used_up = used_up[usage[used_up] >= stock[used_up] - 1e-6 * np.maximum(stock[used_up], 1.0)]
+    return Allocation(True, res.message, x, usage, tuple(int(j) for j in used_up))
+
+def lineup_targets(index: RecipeIndex, lineup: Mapping[str, Any], containers: Mapping[str, Any],
+                   density_g_per_ml: float = DEFAULT_DENSITY) -> Dict[str, float]:
+    """{recipe: planned grams} for the saved lineup (unknown / cyclic recipes left out)."""
+    return {
+        name: target_weight_g(v["amount"], v["unit"], density_g_per_ml, containers)
+        for name, v in lineup.items()
+        if name in index.recipes and name not in index.blocked
+    }
+
+class ReorderPlan(NamedTuple):
+    daily_use_g: np.ndarray
+    days_of_cover: np.ndarray   # inf = not used by the plan
+    reorder_point_g: np.ndarray
+    shortfall_g: np.ndarray     # how far below the reorder point stock is
+    order_g: np.ndarray         # suggested order, rounded up to whole packs where known
+
+def reorder_plan(stock_g: np.ndarray, min_g: np.ndarray, weekly_use_g: np.ndarray,
+                 lead_days: float = 2.0, cover_days: float = 7.0, pack_g: Optional[np.ndarray] = None) -> ReorderPlan:
+    """Reorder numbers for every ingredient in one pass (all inputs aligned with the index).
+
+    Reorder point = minimum + usage over the lead time. Anything at or below it
+    gets an order that brings stock back to minimum + lead time + `cover_days`
+    of usage.
+    """
+    min_g = np.nan_to_num(min_g)
+    daily = weekly_use_g / 7.0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cover = np.where(daily > 0, stock_g / daily, np.inf)
+    reorder_point = min_g + daily * lead_days
+    shortfall = np.maximum(reorder_point - stock_g, 0.0)
+    due = (shortfall > 0) | ((reorder_point > 0) & (stock_g <= reorder_point))
+    order = np.where(due, np.maximum(min_g + daily * (lead_days + cover_days) - stock_g, 0.0), 0.0)
+    if pack_g is not None:
+        packs = np.isfinite(pack_g) & (pack_g > 0)
+        order = np.where(packs, np.ceil(order / np.where(packs, pack_g, 1.0)) * np.where(packs, pack_g, 1.0), order)
+    return ReorderPlan(daily_use_g=daily, days_of_cover=cover, reorder_point_g=reorder_point,
+                       shortfall_g=shortfall, order_g=order)
+
+def reorder_rows(index: RecipeIndex, stock_g: np.ndarray, min_g: np.ndarray, weekly_use_g: np.ndarray,
+                 units: tuple, registry: UnitRegistry, lead_days: float = 2.0, cover_days: float = 7.0,
+                 excluded=(), show_all: bool = False) -> list[dict]:
+    """The reorder list, least days of cover first (the Reorder page's table).
+
+    `units` is the unit each ingredient's minimum is kept in; orders in pack
+    units (cans, bags...) are rounded up to whole packs. Ingredient ids in
+    `excluded` are left out, and so is everything with nothing to order
+    unless `show_all`.
+    """
+    per_unit = registry.compile(index.ingredients, units)
+    is_pack = np.fromiter((canonical_unit(u) not in UNIT_FACTORS for u in units), dtype=bool, count=len(units))
+    plan = reorder_plan(stock_g, min_g, weekly_use_g, lead_days, cover_days, np.where(is_pack, per_unit, np.nan))
+
+    due = plan.order_g > 0
+    rows_idx = np.arange(len(index.ingredients)) if show_all else np.flatnonzero(due)
+    rows_idx = rows_idx[np.argsort(plan.days_of_cover[rows_idx], kind="stable")]
+    rows = []
+    for j in rows_idx:
+        if j in excluded:
+            continue
+        f = per_unit[j]
+        rows.append({
+            "Ingredient": index.ingredients[j],
+            "Stock (g)": round(float(stock_g[j])),
+            "Min (g)": None if np.isnan(min_g[j]) else round(float(min_g[j])),
+            "Use / day (g)": round(float(plan.daily_use_g[j])),
+            "Days of cover": None if np.isinf(plan.days_of_cover[j]) else round(float(plan.days_of_cover[j]), 1),
+            "Reorder point (g)": round(float(plan.reorder_point_g[j])),
+            "Order (g)": round(float(plan.order_g[j])),
+            "Order": f"{plan.order_g[j] / f:,.1f} {units[j]}" if np.isfinite(f) and plan.order_g[j] > 0 else "",
+        })
+    return rows
+
+def explode_recipe(index: RecipeIndex, name: str, scale_factor: float = 1.0) -> dict:
+    """Raw {ingredient: grams} for one recipe at `scale_factor`, all levels expanded."""
+    row = explode_recipes(index, [name], scale_factor)
+    nz = np.flatnonzero(row.data)
+    return dict(zip((index.ingredients[j] for j in row.indices[nz]), np.round(row.data[nz], 2).tolist()))
+
+def scaled_ingredients(entry: CompiledRecipe, scale_factor: float) -> dict:
+    """Scaled {ingredient: grams} for one recipe, in the recipe's own order."""
+    return dict(zip(entry.ingredient_names, np.round(entry.quantities * scale_factor, 2).tolist()))
+
+def scaled_subrecipes(entry: CompiledRecipe, subrecipes: Mapping[str, Any], scale_factor: float) -> dict:
+    """Same output as scale_subrecipes(), read from the compiled index."""
+    return {
+        sname: {
+            "ingredients": scaled_ingredients(sub, scale_factor),
+            "instruction": ((subrecipes or {}).get(sname) or {}).get("instruction") or [],
+        }
+        for sname, sub in entry.subrecipes.items()
+    }
+
+def scale_target(entry: CompiledRecipe, weight_g: Optional[float] = None, counts: Optional[Mapping[str, int]] = None,
+                 factor: Optional[float] = None, containers: Mapping[str, Any] = DEFAULT_CONTAINERS,
+                 density_g_per_ml: float = DEFAULT_DENSITY) -> tuple[float, float]:
+    """(scale factor, target grams) from a multiplier, a target weight or container counts.
+
+    Raises ValueError unless the factor and the target come out finite and more than 0.
+    """
+    if factor is not None:
+        factor = float(factor)
+        if not (math.isfinite(factor) and factor > 0):
+            raise ValueError(f"Scale factor must be a finite number more than 0, not {factor}")
+        target = entry.total_weight * factor
+    else:
+        if weight_g is not None:
+            target = float(weight_g)
+        else:
+            unknown = [c for c in (counts or {}) if c not in containers]
+            if unknown:
+                raise ValueError(f"Unknown container(s): {', '.join(unknown)} (known: {', '.join(containers)})")
+            density_g_per_ml = float(density_g_per_ml)
+            if not (math.isfinite(density_g_per_ml) and density_g_per_ml > 0):
+                raise ValueError(f"Density must be a finite number more than 0, not {density_g_per_ml}")
+            target = containers_weight_g(counts or {}, containers, density_g_per_ml)
+        if not (math.isfinite(target) and target > 0):
+            raise ValueError("Target weight must be a finite number more than 0 g")
+        factor = target / entry.total_weight if entry.total_weight else 1.0
+    if not (math.isfinite(factor) and math.isfinite(target)):
+        raise ValueError("Scaled batch is too large")
+    return factor, target
+
+def scale_sheet(catalog: RecipeCatalog, name: str, factor: float) -> dict:
+    """JSON-ready scaled recipe: ingredients, subrecipes and instructions."""
+    entry = catalog.index.recipes[name]
+    recipe = catalog.get(name)
+    subrecipes = scaled_subrecipes(entry, recipe.get("subrecipes") or {}, factor)
+    return {
+        "recipe": name,
+        "scale_factor": round(factor, 6),
+        "target_weight_g": round(entry.total_weight * factor, 1),
+        "ingredients": scaled_ingredients(entry, factor),
+        "instruction": list(recipe.get("instruction", ())),
+        "subrecipes": {s: {"ingredients": sub["ingredients"], "instruction": list(sub["instruction"])}
+                       for s, sub in subrecipes.items()},
+    }
+
+
+# =========================
+# Batch consumption
+# =========================
+def batch_consumption(index: RecipeIndex, name: str, scale_factor: float) -> Dict[str, float]:
+    """Raw grams a finished batch takes out of stock (subrecipes included)."""
+    try:
+        return explode_recipe(index, name, scale_factor)
+    except RecipeCycleError:
+        # Can't expand a cyclic recipe; take out what was actually weighed
+        entry = index.recipes[name]
+        used: Dict[str, float] = {}
+        for part in (entry, *entry.subrecipes.values()):
+            for ing, j, g in zip(part.ingredient_names, part.ingredient_ids, np.round(part.quantities * scale_factor, 2)):
+                if ing not in entry.subrecipes:
+                    used[index.ingredients[j]] = used.get(index.ingredients[j], 0.0) + float(g)
+        return used
+
+def draw_from_stock(ledger: "InventoryLedger", names: IngredientNames, events: list[dict]) -> list[dict]:
+    """Point consume/waste events at the ledger keys that hold the stock.
+
+    Stock can still be filed under an older spelling ("yolks") while recipes
+    and the app use the canonical name ("egg yolks"); taking it out of the
+    canonical key would clamp at zero and leave the old stock in place. Each
+    event is drawn from the canonical key first, then the other spellings,
+    and split into one gram event per key when it spans several. What's
+    left over once all of them are empty is added to the canonical key's
+    share. Events keep their "key" (for append_checked) and other events
+    pass through.
+    """
+    if ledger.stale():
+        ledger.refresh()
+    keys: Dict[str, list] = {}
+    for k in ledger.inventory():
+        keys.setdefault(names.canonical(k), []).append(k)
+    drawn: Dict[str, float] = {}  # grams already taken per key by earlier events of this batch
+    out = []
+    for ev in events:
+        ing, unit = names.canonical(ev.get("ingredient")), ev.get("unit") or "g"
+        if ev.get("type") not in ("consume", "waste") or not isinstance(unit, str):
+            out.append(ev)  # bad units are the ledger's to reject
+            continue
+        grams = to_grams(float(ev.get("amount", 0) or 0), unit.lower(), ing)
+        if not math.isfinite(grams) or ing not in keys:
+            out.append(ev)
+            continue
+        left, parts = grams, {}  # key -> grams, one event per key
+        for k in sorted(keys[ing], key=lambda k: k != ing):
+            g = min(ledger.stock_g(k) - drawn.get(k, 0.0), left)
+            if g > 0:
+                parts[k] = g
+                drawn[k] = drawn.get(k, 0.0) + g
+                left -= g
+        if left > 1e-9 or not parts:
+            parts[ing] = parts.get(ing, 0.0) + left
+        extra = {"key": ev.get("key", ev["ingredient"])}
+        if len(parts) == 1:
+            out.append({**ev, **extra, "ingredient": next(iter(parts))})
+        else:
+            out += [{**ev, **extra, "ingredient": k, "amount": round(g, 3), "unit": "g"} for k, g in parts.items()]
+    return out
+
+def post_batch_consumption(ledger: "InventoryLedger", index: RecipeIndex, name: str, scale_factor: float) -> str:
+    """Take a completed batch out of inventory as one transaction; returns the txn id."""
+    txn = f"batch:{index.recipes[name].slug}:{time.strftime('%Y%m%dT%H%M%S')}"
+    note = f"{name} ×{scale_factor:.3f}"
+    used = batch_consumption(index, name, scale_factor)
+    events = [{"type": "consume", "ingredient": ing, "amount": g, "unit": "g", "note": note} for ing, g in used.items() if g > 0]
+    ledger.append(draw_from_stock(ledger, index.names, events), txn=txn)
+    return txn
@@ -0,0 +1,321 @@
+"""Event-sourced ingredient inventory (JSONL ledger or SQLite tables)."""
+import contextlib
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+from collections.abc import Mapping
+from typing import Any, Dict, Optional
+
+from .config import LEDGER_COMPACT_EVERY, LEDGER_EVENT_TYPES
+from .schema import normalize_inventory_schema
+from .storage import SqliteStorage, atomic_write_json
+from .units import BASE_UNITS, to_grams
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process locking only
+    fcntl = None
+
+class InventoryLedger:
+    """Append-only log of inventory events with a materialized stock view.
+
+    Events go to `ledger_path` as JSON lines ({seq, ts, type, ingredient,
+    amount, unit, grams, txn, note}). Every LEDGER_COMPACT_EVERY events the
+    view is written to `snapshot_path` (ingredient_inventory.json, same
+    {ingredient: {amount, unit}} shape as before, plus a "_snapshot" key with
+    the ledger position), so startup only replays the tail of the log.
+    A snapshot file without "_snapshot" is a pre-ledger inventory and seeds
+    the view as-is.
+
+    version() is the seq of the last event for an ingredient, which is what
+    append_checked() compares to catch edits made on stale stock.
+    """
+
+    def __init__(self, ledger_path: str, snapshot_path: str, compact_every: int = LEDGER_COMPACT_EVERY,
+                 watcher=None):
+        self.ledger_path = ledger_path
+        self.snapshot_path = snapshot_path
+        self.compact_every = compact_every
+        self.watcher = watcher  # FileWatcher with ledger_path among its logs, if any
+        self._lock = threading.RLock()
+        self._grams: Dict[str, float] = {}
+        self._units: Dict[str, str] = {}
+        self._last: Dict[str, dict] = {}  # ingredient -> its latest event record
+        self._seq = 0
+        self._offset = 0
+        self._since_snapshot = 0
+        self.recent: deque = deque(maxlen=200)
+        self._load_snapshot()
+        self.refresh()
+
+    # ---- view ----
+    def stock_g(self, ingredient: str) -> float:
+        return self._grams.get(ingredient, 0.0)
+
+    def unit(self, ingredient: str) -> str:
+        return self._units.get(ingredient, "g")
+
+    def inventory(self) -> Dict[str, Any]:
+        """Current stock in the normalize_inventory_schema() shape."""
+        with self._lock:
+            return {
+                ing: {"amount": g / BASE_UNITS.factor(self.unit(ing)), "unit": self.unit(ing)}
+                for ing, g in self._grams.items()
+            }
+
+    def version(self, *ingredients: str) -> int:
+        """Seq of the newest event for any of `ingredients` (0 = none since the snapshot)."""
+        return max((self._last[i]["seq"] for i in ingredients if i in self._last), default=0)
+
+    def last_event(self, ingredient: str) -> Optional[dict]:
+        return self._last.get(ingredient)
+
+    @property
+    def seq(self) -> int:
+        return self._seq
+
+    @property
+    def offset(self) -> int:
+        """Bytes of the ledger file already applied to the view."""
+        return self._offset
+
+    def stale(self) -> bool:
+        """True when the log grew past what we've read (the watcher's size, or one stat)."""
+        if self.watcher is not None:
+            return (self.watcher.version(self.ledger_path) or 0) > self._offset
+        try:
+            return os.path.getsize(self.ledger_path) > self._offset
+        except FileNotFoundError:
+            return False
+
+    # ---- writes ----
+    def append(self, events: list[dict], txn: Optional[str] = None) -> list[dict]:
+        """Append a batch of events with one write; returns the stored records."""
+        return self._append(events, txn)[0]
+
+    def append_checked(self, events: list[dict], expect: Mapping[str, tuple],
+                       txn: Optional[str] = None) -> tuple[list[dict], list[str]]:
+        """append() for edits made on a view of the stock (optimistic concurrency).
+
+        `expect` maps a key to (ingredient names, version(*names) when the
+        edit started); each event names its key in "key" (default: its
+        ingredient). Under the write lock, events whose key has moved on are
+        held back. Returns (stored records, conflicting keys).
+        """
+        return self._append(events, txn, expect)
+
+    def _append(self, events: list[dict], txn: Optional[str], expect: Optional[Mapping[str, tuple]] = None):
+        if not events:
+            return [], []
+        with self._lock, self._exclusive() as f:
+            self.refresh()  # pick up other processes' events before numbering (or checking) ours
+            stale = sorted(k for k, (names, v) in (expect or {}).items() if self.version(*names) != v)
+            events = [ev for ev in events if ev.get("key", ev["ingredient"]) not in stale]
+            # Check and convert the whole batch before numbering any of it: a
+            # bad event must not use up seqs, or refresh() would skip other
+            # processes' events written under them.
+            checked = []
+            for ev in events:
+                etype = ev.get("type")
+                if etype not in LEDGER_EVENT_TYPES:
+                    raise ValueError(f"Unknown inventory event type: {etype}")
+                unit, amount = ev.get("unit") or "g", ev.get("amount", 0) or 0
+                if not isinstance(unit, str):
+                    raise ValueError(f"Unit must be a string, not {unit!r}")
+                if isinstance(amount, bool):
+                    raise ValueError(f"Amount must be a number, not {amount!r}")
+                unit, amount = unit.lower(), float(amount)
+                if amount < 0:
+                    # the type says which way stock moves; a negative amount would reverse it
+                    raise ValueError(f"Amount can't be negative: {amount:g} {unit} {ev['ingredient']}")
+                grams = to_grams(amount, unit, ev["ingredient"])
+                if not math.isfinite(grams):
+                    raise ValueError(f"Can't convert {amount:g} {unit!r} to grams for {ev['ingredient']}")
+                checked.append((ev, etype, unit, amount, grams))
+            ts = time.strftime("%Y-%m-%dT%H:%M:%S")
+            records = []
+            for seq, (ev, etype, unit, amount, grams) in enumerate(checked, self._seq + 1):
+                rec = {
+                    "seq": seq,
+                    "ts": ts,
+                    "type": etype,
+                    "ingredient": str(ev["ingredient"]),
+                    "amount": amount,
+                    "unit": unit,
+                    "grams": grams,
+                }
+                if txn or ev.get("txn"):
+                    rec["txn"] = ev.get("txn") or txn
+                if ev.get("note"):
+                    rec["note"] = ev["note"]
+                records.append(rec)
+            if records:
+                self._write(f, records)
+                self._seq = records[-1]["seq"]
+            for r in records:
+                self._apply(r)
+        if self._since_snapshot >= self.compact_every:
+            self.compact()
+        return records, stale
+
+    def refresh(self):
+        """Replay events other processes appended since we last looked."""
+        with self._lock:
+            try:
+                size = os.path.getsize(self.ledger_path)
+            except FileNotFoundError:
+                return
+            if size <= self._offset:
+                return
+            with open(self.ledger_path, "rb") as f:
+                f.seek(self._offset)
+                chunk = f.read(size - self._offset)
+            end = chunk.rfind(b"\n") + 1  # ignore a half-written last line
+            for line in chunk[:end].splitlines():
+                if line.strip():
+                    rec = json.loads(line)
+                    if rec.get("seq", 0) > self._seq:
+                        self._seq = rec["seq"]
+                        self._apply(rec)
+            self._offset += end
+
+    def compact(self):
+        """Write the current view as a snapshot (atomically) and mark the ledger position."""
+        with self._lock:
+            snap: Dict[str, Any] = {"_snapshot": {"seq": self._seq, "offset": self._offset}}
+            snap.update(self.inventory())
+            atomic_write_json(self.snapshot_path, snap)
+            self._since_snapshot = 0
+
+    # ---- internals ----
+    @contextlib.contextmanager
+    def _exclusive(self):
+        """Cross-process write lock; yields what _write() writes to."""
+        with open(self.ledger_path, "ab") as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield f
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _write(self, f, records: list[dict]):
+        f.write("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records).encode("utf-8"))
+        f.flush()
+        self._offset = f.tell()
+
+    @staticmethod
+    def _next_grams(current: float, rec: dict) -> float:
+        grams = float(rec.get("grams", 0) or 0)
+        if rec["type"] == "count":
+            return grams
+        if rec["type"] == "receive":
+            return current + grams
+        return max(current - grams, 0.0)  # consume / waste
+
+    def _apply(self, rec: dict):
+        ing = rec["ingredient"]
+        self._grams[ing] = self._next_grams(self._grams.get(ing, 0.0), rec)
+        if rec["type"] == "count":
+            self._units[ing] = rec.get("unit", "g")
+        self._units.setdefault(ing, rec.get("unit", "g"))
+        self._last[ing] = rec
+        self._since_snapshot += 1
+        self.recent.append(rec)
+
+    def _load_snapshot(self):
+        try:
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            raw = {}
+        raw = raw if isinstance(raw, dict) else {}
+        pos = raw.get("_snapshot") or {}
+        self._seq = int(pos.get("seq", 0))
+        self._offset = int(pos.get("offset", 0))
+        inv, _ = normalize_inventory_schema(raw)
+        for ing, v in inv.items():
+            g = to_grams(v["amount"], v["unit"])
+            if math.isnan(g):  # unknown unit in an old file: keep the number as grams
+                g, v["unit"] = float(v["amount"]), "g"
+            self._grams[ing] = g
+            self._units[ing] = v["unit"]
+
+
+class SqliteLedger(InventoryLedger):
+    """InventoryLedger on the sqlite backend.
+
+    Events are rows of inventory_events, and inventory_stock is updated in
+    the same transaction, so the view is loaded with one query at startup
+    and there is nothing to compact.
+    """
+
+    EVENT_COLUMNS = ("seq", "ts", "type", "ingredient", "amount", "unit", "grams", "txn", "note")
+
+    def __init__(self, db: SqliteStorage):
+        self.db = db
+        self._data_version = None
+        super().__init__(db.path, db.path)
+
+    def stale(self) -> bool:
+        dv = self.db.data_version()
+        changed, self._data_version = dv != self._data_version, dv
+        return changed
+
+    def refresh(self):
+        cols = ", ".join(self.EVENT_COLUMNS)
+        with self._lock, self.db.lock:
+            rows = self.db.conn.execute(
+                f"SELECT {cols} FROM inventory_events WHERE seq > ? ORDER BY seq", (self._seq,)).fetchall()
+            for row in rows:
+                rec = self._record(row)
+                self._seq = rec["seq"]
+                self._apply(rec)
+
+    def compact(self):
+        self._since_snapshot = 0  # inventory_stock is always current
+
+    @contextlib.contextmanager
+    def _exclusive(self):
+        with self.db.transaction() as conn:
+            yield conn
+
+    def _write(self, conn, records: list[dict]):
+        conn.executemany(
+            f"INSERT INTO inventory_events ({', '.join(self.EVENT_COLUMNS)}) "
+            f"VALUES ({', '.join(':' + c for c in self.EVENT_COLUMNS)})",
+            [{c: r.get(c) for c in self.EVENT_COLUMNS} for r in records])
+        stock = {}
+        for r in records:
+            ing = r["ingredient"]
+            grams, unit, _ = stock.get(ing, (self._grams.get(ing, 0.0), self._units.get(ing), 0))
+            if r["type"] == "count" or unit is None:
+                unit = r["unit"]
+            stock[ing] = (self._next_grams(grams, r), unit, r["seq"])
+        conn.executemany(
+            "INSERT OR REPLACE INTO inventory_stock (ingredient, grams, unit, last_seq) VALUES (?, ?, ?, ?)",
+            [(ing, *v) for ing, v in stock.items()])
+
+    def _record(self, row) -> dict:
+        return {c: v for c, v in zip(self.EVENT_COLUMNS, row) if v is not None}
+
+    def _load_snapshot(self):
+        cols = ", ".join(self.EVENT_COLUMNS)
+        with self.db.lock:
+            conn = self.db.conn
+            self._data_version = self.db.data_version()
+            for ing, grams, unit in conn.execute("SELECT ingredient, grams, unit FROM inventory_stock"):
+                self._grams[ing] = grams
+                self._units[ing] = unit
+            for row in conn.execute(f"SELECT {cols} FROM inventory_events WHERE seq IN "
+                                    f"(SELECT last_seq FROM inventory_stock)"):
+                rec = self._record(row)
+                self._last[rec["ingredient"]] = rec
+            recent = conn.execute(f"SELECT {cols} FROM inventory_events ORDER BY seq DESC LIMIT ?",
+                                  (self.recent.maxlen,)).fetchall()
+            self.recent.extend(self._record(row) for row in reversed(recent))
+            self._seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM inventory_events").fetchone()[0]
@@ -0,0 +1,129 @@
+"""Canonical ingredient names with compact integer ids (aliases and
+case/spacing variants share an id)."""
+import difflib
+from collections.abc import Mapping
+from typing import Any, Dict, NamedTuple, Optional
+
+import numpy as np
+
+from .schema import fold_name
+
+
+class Suggestion(NamedTuple):
+    alias: str       # the spelling to retire
+    into: str        # the one to keep
+    similarity: float
+    decided: bool    # False: nothing tells the two apart, the user picks the direction
+
+
+class IngredientNames:
+    """Canonical ingredient names, each with a compact integer id.
+
+    Spellings that only differ by case or spacing share an id, and so does
+    every alias ("yolks" -> "egg yolks", followed transitively). A group is
+    named after the spelling most recipe lines use (lower case on a tie), or
+    after the alias target when no recipe spells it that way.
+    """
+
+    def __init__(self, spellings: Mapping[str, int], aliases: Optional[Mapping[str, str]] = None):
+        # spellings: {name as written in recipes.json: number of lines using it}
+        aliases = {fold_name(a): t for a, t in (aliases or {}).items()}
+
+        def root(name: str) -> tuple[str, str]:
+            key, seen = fold_name(name), set()
+            while key in aliases and key not in seen:
+                seen.add(key)
+                name = aliases[key]
+                key = fold_name(name)
+            return key, name
+
+        groups: Dict[str, Dict[str, int]] = {}
+        targets: Dict[str, str] = {}
+        for s, n in spellings.items():
+            key, target = root(s)
+            groups.setdefault(key, {})[s] = n
+            targets.setdefault(key, target)
+        canonical = {}
+        for key, group in groups.items():
+            own = [s for s in group if fold_name(s) == key]
+            canonical[key] = min(own, key=lambda s: (-group[s], not s.islower(), s)) if own else targets[key]
+
+        self.names: tuple[str, ...] = tuple(sorted(canonical.values()))
+        pos = {name: i for i, name in enumerate(self.names)}
+        self._ids: Dict[str, int] = {key: pos[name] for key, name in canonical.items()}
+        for s in spellings:
+            self._ids[fold_name(s)] = self._ids[root(s)[0]]
+        for a in aliases:
+            j = self._ids.get(root(a)[0])
+            if j is not None:
+                self._ids.setdefault(a, j)
+        self.variants: Dict[str, tuple[str, ...]] = {
+            canonical[key]: tuple(sorted(s for s in group if s != canonical[key]))
+            for key, group in groups.items()
+        }
+        self.line_counts = np.zeros(len(self.names), dtype=np.int64)
+        for s, n in spellings.items():
+            self.line_counts[self._ids[fold_name(s)]] += n
+        self._suggestions: Dict[tuple, tuple] = {}  # (cutoff, known ids) -> suggestions
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def id(self, name: Any) -> int:
+        """Id for any spelling or alias; -1 if it isn't a known ingredient."""
+        return self._ids.get(fold_name(name), -1)
+
+    def ids(self, names) -> np.ndarray:
+        return np.fromiter((self.id(n) for n in names), dtype=np.intp)
+
+    def canonical(self, name: Any) -> str:
+        j = self.id(name)
+        return self.names[j] if j >= 0 else str(name).strip()
+
+    def rekey(self, table: Mapping[str, Any], merge=None) -> Dict[str, Any]:
+        """Re-key {name: value} by canonical name (unknown names kept as-is).
+
+        When several spellings collide, `merge(kept, other)` combines them;
+        without it the canonical spelling's own entry wins.
+        """
+        out: Dict[str, Any] = {}
+        for name, v in (table or {}).items():
+            c = self.canonical(name)
+            if c not in out:
+                out[c] = v
+            elif merge is not None:
+                out[c] = merge(out[c], v)
+            elif name == c:
+                out[c] = v
+        return out
+
+    def suggestions(self, cutoff: float = 0.8, known=()) -> tuple:
+        """Likely duplicates that no alias covers yet, as Suggestions.
+
+        The spelling more recipe lines use is kept; on a tie, the one in
+        `known` (spellings with stock on file or in the unit registry). When
+        that ties too the pair is still listed, but not `decided`.
+
+        Fuzzy matching is quadratic in the worst case, so it only runs on
+        request and is kept per cutoff for the lifetime of this catalog version.
+        """
+        known_ids = frozenset(j for j in map(self.id, known) if j >= 0)
+        key = (cutoff, known_ids)
+        hit = self._suggestions.get(key)
+        if hit is not None:
+            return hit
+        folded = [fold_name(n) for n in self.names]
+        out = []
+        for i, a in enumerate(folded):
+            for b in difflib.get_close_matches(a, folded[i + 1:], n=5, cutoff=cutoff):
+                j = self._ids[b]
+                score = difflib.SequenceMatcher(None, a, b).ratio()
+                rank_i = (int(self.line_counts[i]), i in known_ids)
+                rank_j = (int(self.line_counts[j]), j in known_ids)
+                keep, drop = (i, j) if rank_i >= rank_j else (j, i)
+                out.append(Suggestion(self.names[drop], self.names[keep], score, rank_i != rank_j))
+        hit = tuple(sorted(out, key=lambda t: (-t.similarity, t.alias)))
+        if len(self._suggestions) >= 8:
+            self._suggestions.clear()
+        self._suggestions[key] = hit
+        return hit
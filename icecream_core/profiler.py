@@ -0,0 +1,153 @@
+"""Per-rerun profiler: timing spans, counters and a rotating JSON-lines log.
+
+The app starts a RerunProfile at the top of every script run and finishes
+it at the end. Code anywhere below reports into the active profile with
+span()/count()/@timed, which are no-ops when no profile is active (scripts,
+the CLI, the API), so the core can be instrumented without depending on
+the app.
+
+    with span("load_json"):
+        ...
+    count("json_cache.miss")
+"""
+import contextlib
+import functools
+import json
+import logging
+import logging.handlers
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+from .config import PROFILE_KEEP, PROFILE_LOG_BACKUPS, PROFILE_LOG_MAX_BYTES
+
+_current: ContextVar[Optional["RerunProfile"]] = ContextVar("icecream_rerun_profile", default=None)
+
+
+class RerunProfile:
+    """Spans and counters of one script run (one session, one thread).
+
+    Spans are aggregated by name: {name: [calls, seconds]}, in the order they
+    first started. Nested spans each keep their own (inclusive) time.
+    """
+
+    def __init__(self, label: str = "", session: str = ""):
+        self.label = label
+        self.session = session
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        self.spans: Dict[str, list] = {}
+        self.counters: Counter = Counter()
+        self.widgets: Dict[str, int] = {}  # page -> widgets it created
+        self.extra: Dict[str, Any] = {}
+        self.seconds: Optional[float] = None
+
+    @contextlib.contextmanager
+    def span(self, name: str):
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            s = self.spans.setdefault(name, [0, 0.0])
+            s[0] += 1
+            s[1] += time.perf_counter() - t
+
+    def count(self, name: str, n: int = 1):
+        self.counters[name] += n
+
+    def record(self) -> Dict[str, Any]:
+        """JSON-ready summary (what the log and the Diagnostics page show)."""
+        return {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started_at)),
+            "label": self.label,
+            "session": self.session,
+            "ms": round((self.seconds if self.seconds is not None else time.perf_counter() - self._t0) * 1000, 2),
+            "spans": {k: {"calls": n, "ms": round(s * 1000, 3)} for k, (n, s) in self.spans.items()},
+            "counters": dict(self.counters),
+            "widgets": dict(self.widgets),
+            **self.extra,
+        }
+
+
+def current() -> Optional[RerunProfile]:
+    return _current.get()
+
+@contextlib.contextmanager
+def span(name: str):
+    profile = _current.get()
+    if profile is None:
+        yield
+    else:
+        with profile.span(name):
+            yield
+
+def count(name: str, n: int = 1):
+    profile = _current.get()
+    if profile is not None:
+        profile.count(name, n)
+
+def timed(name: Optional[str] = None):
+    """Decorator: run the function inside span(name or its __name__)."""
+    def wrap(fn):
+        label = name or fn.__name__
+
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            profile = _current.get()
+            if profile is None:
+                return fn(*args, **kwargs)
+            with profile.span(label):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+
+class ProfileStore:
+    """Process-wide: recent reruns of every session, counter totals, the log.
+
+    `log_path` turns on a JSON-lines log (one rerun per line) that rotates at
+    `max_bytes`, keeping `backups` old files (.1, .2, ...).
+    """
+
+    def __init__(self, keep: int = PROFILE_KEEP, log_path: Optional[str] = None,
+                 max_bytes: int = PROFILE_LOG_MAX_BYTES, backups: int = PROFILE_LOG_BACKUPS):
+        self.recent: deque = deque(maxlen=keep)
+        self.totals: Counter = Counter()
+        self.reruns = 0
+        self.log_path = log_path
+        self._lock = threading.Lock()
+        self._log: Optional[logging.Logger] = None
+        if log_path:
+            handler = logging.handlers.RotatingFileHandler(
+                log_path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8", delay=True)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self._log = logging.getLogger(f"icecream_core.profiler.{id(self)}")
+            self._log.propagate = False
+            self._log.setLevel(logging.INFO)
+            self._log.addHandler(handler)
+
+    def start(self, label: str = "", session: str = "") -> RerunProfile:
+        """Make a new profile the active one for this thread's script run."""
+        profile = RerunProfile(label, session)
+        _current.set(profile)
+        return profile
+
+    def finish(self, profile: RerunProfile) -> Dict[str, Any]:
+        profile.seconds = time.perf_counter() - profile._t0
+        if _current.get() is profile:
+            _current.set(None)
+        record = profile.record()
+        with self._lock:
+            self.recent.append(record)
+            self.totals.update(profile.counters)
+            self.reruns += 1
+        if self._log is not None:
+            self._log.info(json.dumps(record, ensure_ascii=False, default=str))
+        return record
+
+    def snapshot(self) -> tuple[list[dict], Dict[str, int], int]:
+        """(recent records, oldest first; counter totals; reruns since start)."""
+        with self._lock:
+            return list(self.recent), dict(self.totals), self.reruns
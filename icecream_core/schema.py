@@ -0,0 +1,159 @@
+"""Pure dict-level helpers: recipe/inventory/lineup schema normalizers,
+ingredient name folding and subrecipe scaling. No third-party imports."""
+import re
+from collections.abc import Mapping
+from typing import Any, Dict
+
+from .config import DEFAULT_CONTAINERS, UNIT_OPTIONS
+
+
+def slugify(s: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", (s or "x").lower()).strip("_")
+
+def scale_subrecipes(subrecipes: dict, scale_factor: float) -> dict:
+    """Return a scaled copy of subrecipes (ingredients scaled, instructions unchanged)."""
+    scaled_subs = {}
+    for sname, srec in (subrecipes or {}).items():
+        if not isinstance(srec, Mapping):
+            continue
+        base_ings = (srec.get("ingredients") or {})
+        new_ings = {}
+        for ing, qty in base_ings.items():
+            try:
+                new_ings[ing] = round(float(qty) * scale_factor, 2)
+            except Exception:
+                # keep non-numeric as-is
+                new_ings[ing] = qty
+
+        scaled_subs[sname] = {
+            "ingredients": new_ings,
+            "instruction": (srec.get("instruction") or []),
+        }
+    return scaled_subs
+
+
+# =========================
+# Recipe schema normalizer
+# =========================
+def normalize_recipes_schema(recipes: dict) -> dict:
+    if not isinstance(recipes, dict):
+        return {}
+    for name, r in list(recipes.items()):
+        if not isinstance(r, dict):
+            continue
+        r.setdefault("ingredients", {})
+        instr = r.get("instruction", [])
+        if instr is None:
+            instr = []
+        elif isinstance(instr, str):
+            instr = [instr]
+        r["instruction"] = instr
+        r.setdefault("subrecipes", {})
+        if not isinstance(r["subrecipes"], dict):
+            r["subrecipes"] = {}
+
+        for sname, s in r["subrecipes"].items():
+            if not isinstance(s, dict):
+                continue
+            s.setdefault("ingredients", {})
+            sinstr = s.get("instruction", [])
+            if sinstr is None:
+                sinstr = []
+            elif isinstance(sinstr, str):
+                sinstr = [sinstr]
+            s["instruction"] = sinstr
+    return recipes
+
+
+# =========================
+# Threshold/inventory schema normalizers
+# =========================
+def get_all_ingredients_from_recipes(recipes: Dict[str, Any]) -> list[str]:
+    names = set()
+    for r in (recipes or {}).values():
+        if not isinstance(r, Mapping):
+            continue
+        for ing in (r.get("ingredients") or {}).keys():
+            names.add(str(ing).strip())
+        for s in (r.get("subrecipes") or {}).values():
+            if not isinstance(s, Mapping):
+                continue
+            for ing in (s.get("ingredients") or {}).keys():
+                names.add(str(ing).strip())
+    return sorted(names)
+
+def normalize_thresholds_schema(thresholds: Dict[str, Any]) -> Dict[str, Any]:
+    upgraded: Dict[str, Any] = {}
+    for ing, val in (thresholds or {}).items():
+        if isinstance(val, dict):
+            min_val = float(val.get("min", 0) or 0)
+            unit = val.get("unit", "grams")
+            if unit not in UNIT_OPTIONS:
+                unit = "grams"
+            upgraded[ing] = {"min": min_val, "unit": unit}
+        else:
+            upgraded[ing] = {"min": float(val) if val is not None else 0.0, "unit": "grams"}
+    return upgraded
+
+def normalize_inventory_schema(raw: dict) -> tuple[dict, bool]:
+    inv, changed = {}, False
+    for k, v in (raw or {}).items():
+        if str(k).startswith("_"):  # reserved keys, e.g. the ledger's "_snapshot"
+            continue
+        if isinstance(v, dict):
+            amt = float(v.get("amount", 0) or 0)
+            unit = (v.get("unit") or "g").lower()
+        else:
+            amt = float(v or 0)
+            unit = "g"
+            changed = True
+        inv[str(k)] = {"amount": amt, "unit": unit}
+    return inv, changed
+
+def normalize_containers_schema(raw: Any) -> Dict[str, Any]:
+    containers: Dict[str, Any] = {}
+    for name, v in (raw or {}).items():
+        v = v if isinstance(v, dict) else {"volume_l": v}
+        vol = float(v.get("volume_l", 0) or 0)
+        if vol <= 0:
+            continue
+        containers[str(name)] = {
+            "volume_l": vol,
+            "fill": min(max(float(v.get("fill", 1.0) or 1.0), 0.01), 1.0),
+            "slots": max(float(v.get("slots", 1.0) or 1.0), 0.01),
+        }
+    return containers or dict(DEFAULT_CONTAINERS)
+
+def plan_units(containers: Mapping[str, Any]) -> list[str]:
+    return ["grams", *containers]
+
+def normalize_lineup_schema(raw: Any, units: list[str]) -> Dict[str, Any]:
+    """Upgrade the old list-of-flavours lineup to {flavour: {'amount', 'unit'}}."""
+    if isinstance(raw, list):
+        raw = {str(name): {} for name in raw}
+    lineup: Dict[str, Any] = {}
+    for name, v in (raw or {}).items():
+        v = v if isinstance(v, dict) else {"amount": v}
+        unit = v.get("unit", units[0])
+        if unit not in units:
+            # "5 L pans" -> "5 L pan"
+            unit = unit[:-1] if unit.endswith("s") and unit[:-1] in units else units[0]
+        lineup[str(name)] = {"amount": float(v.get("amount", 0) or 0), "unit": unit}
+    return lineup
+
+
+# =========================
+# Ingredient names
+# =========================
+def fold_name(name: Any) -> str:
+    """Case- and spacing-insensitive key: "White  Mix" -> "white mix"."""
+    return " ".join(str(name).split()).casefold()
+
+def normalize_aliases_schema(raw: Any) -> Dict[str, str]:
+    """{alias: canonical name}; blanks and self-aliases dropped."""
+    aliases: Dict[str, str] = {}
+    for alias, target in (raw or {}).items() if isinstance(raw, dict) else ():
+        alias, target = " ".join(str(alias).split()), " ".join(str(target or "").split())
+        if alias and target and fold_name(alias) != fold_name(target):
+            aliases[alias] = target
+    return aliases
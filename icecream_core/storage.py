@@ -0,0 +1,571 @@
+"""Document storage: file watcher, atomic JSON writes, the write-behind
+queue and the two backends (one JSON file per document, or SQLite)."""
+import atexit
+import contextlib
+import copy
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import urllib.request
+from collections import deque
+from collections.abc import Mapping
+from typing import TYPE_CHECKING, Any, Dict, NamedTuple, Optional
+
+from .config import (
+    DB_FILE, DOCUMENT_FILES, INGREDIENT_FILE, LEDGER_FILE, SAVE_DELAY_SECONDS, SAVE_FSYNC,
+    STORAGE_BACKEND, WATCH_POLL_SECONDS,
+)
+
+if TYPE_CHECKING:
+    from .ledger import InventoryLedger, SqliteLedger
+
+
+# =========================
+# File watcher (cache invalidation)
+# =========================
+def content_hash(path: str) -> str:
+    """Version of a JSON file: hash of its bytes (raises FileNotFoundError)."""
+    with open(path, "rb") as f:
+        return hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+
+class FileWatcher:
+    """Content version of every watched file, kept current in the background.
+
+    A watchdog observer (inotify on Linux) reports changes as they happen;
+    without watchdog, a daemon thread polls stat() every `poll_seconds`.
+    Either way a file only gets a new version when its content hash changes,
+    so rewriting it with the same data invalidates nothing. Append-only logs
+    (`logs`) are versioned by their size instead of being rehashed.
+    version() of a watched file is a dict lookup: no filesystem calls.
+    """
+
+    def __init__(self, paths, logs=(), poll_seconds: float = WATCH_POLL_SECONDS):
+        self.logs = frozenset(logs)
+        self.poll_seconds = poll_seconds
+        self._watched: set = set()
+        self._stat: Dict[str, tuple] = {}
+        self._versions: Dict[str, Any] = {}  # None = file missing
+        self._lock = threading.Lock()
+        self._observer = None
+        self._dirs: set = set()
+        for path in (*paths, *self.logs):
+            self.watch(path)
+        self.mode = self._start()
+
+    def version(self, path: str) -> Any:
+        try:
+            return self._versions[path]
+        except KeyError:  # first use of an unwatched file
+            self.watch(path)
+            return self._versions.get(path)
+
+    def watch(self, path: str):
+        with self._lock:
+            self._watched.add(path)
+        self.check(path)
+        folder = os.path.dirname(path) or "."
+        if self._observer is not None and folder not in self._dirs:
+            self._observer.schedule(self, folder, recursive=False)
+            self._dirs.add(folder)
+
+    def check(self, path: str):
+        """Re-read `path` if its stat changed (writers call this right after saving)."""
+        try:
+            info = os.stat(path)
+            # the inode catches an atomic replace with the same size within the mtime granularity
+            sig = (info.st_ino, info.st_mtime_ns, info.st_size)
+            if self._stat.get(path) == sig:
+                return
+            if path in self.logs:
+                version: Any = info.st_size
+            else:
+                version = content_hash(path)
+        except FileNotFoundError:
+            sig, version = None, None
+        with self._lock:
+            self._stat[path] = sig
+            self._versions[path] = version
+
+    # watchdog calls this for every event in a watched folder
+    def dispatch(self, event):
+        for p in (getattr(event, "src_path", None), getattr(event, "dest_path", None)):
+            if p and os.fsdecode(p) in self._watched:
+                self.check(os.fsdecode(p))
+
+    def _start(self) -> str:
+        try:
+            from watchdog.observers import Observer
+            observer = Observer()
+            observer.daemon = True
+            for folder in {os.path.dirname(p) or "." for p in self._watched}:
+                observer.schedule(self, folder, recursive=False)
+                self._dirs.add(folder)
+            observer.start()
+            self._observer = observer
+            return "watchdog"
+        except Exception:  # not installed, or out of inotify watches
+            threading.Thread(target=self._poll, daemon=True, name="file-watcher").start()
+            return "polling"
+
+    def _poll(self):
+        while True:
+            time.sleep(self.poll_seconds)
+            for path in list(self._watched):
+                self.check(path)
+
+
+# =========================
+# Persistence (atomic writes + write-behind)
+# =========================
+def _fsync_dir(folder: str):
+    if os.name != "posix":  # Windows can't open a directory for fsync
+        return
+    fd = os.open(folder, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def atomic_write_json(path: str, data: Any, fsync: bool = SAVE_FSYNC, sync_dir: bool = True):
+    """Write JSON to a temp file next to `path`, then rename it over `path`.
+
+    Readers (and a crash) see either the old file or the new one, never a
+    truncated one. Every writer gets its own temp file, so two processes
+    saving at once can't clobber each other's half-written data.
+    """
+    folder = os.path.dirname(path) or "."
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=folder)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        try:
+            os.chmod(tmp, os.stat(path).st_mode & 0o777)
+        except FileNotFoundError:
+            os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(tmp)
+        raise
+    if fsync and sync_dir:
+        _fsync_dir(folder)
+
+class WriteBehind:
+    """Background writer that coalesces saves of the same file.
+
+    save() records the newest data for a path and returns at once. The
+    writer thread waits `delay` seconds for more saves, then writes every
+    pending file once with atomic_write_json() and fsyncs each folder once
+    per batch. The caller hands `data` over: don't mutate it after saving.
+    """
+
+    def __init__(self, delay: float = SAVE_DELAY_SECONDS, fsync: bool = SAVE_FSYNC, on_written=None):
+        self.delay = delay
+        self.fsync = fsync
+        self.on_written = on_written
+        self.writes = 0
+        self.coalesced = 0
+        self._revisions: Dict[str, int] = {}
+        self._pending: Dict[str, Any] = {}
+        self._inflight: Dict[str, Any] = {}
+        self._errors: deque = deque(maxlen=20)
+        self._cond = threading.Condition()
+        threading.Thread(target=self._run, daemon=True, name="write-behind").start()
+        atexit.register(self.flush, 5.0)
+
+    def save(self, path: str, data: Any):
+        with self._cond:
+            if path in self._pending:
+                self.coalesced += 1
+            self._pending[path] = data
+            self._revisions[path] = self._revisions.get(path, 0) + 1
+            self._cond.notify_all()
+
+    def revision(self, path: str) -> int:
+        """How many times this process has saved `path`."""
+        return self._revisions.get(path, 0)
+
+    def pending(self, path: str) -> tuple[bool, Any]:
+        """(True, data) while a save of `path` hasn't reached the disk yet."""
+        with self._cond:
+            for queue in (self._pending, self._inflight):
+                if path in queue:
+                    return True, queue[path]
+        return False, None
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until everything saved so far is on disk; False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._pending and not self._inflight, timeout)
+
+    def take_errors(self) -> list[tuple[str, str]]:
+        with self._cond:
+            errors = list(self._errors)
+            self._errors.clear()
+        return errors
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending)
+            time.sleep(self.delay)  # let rapid successive saves pile up
+            with self._cond:
+                self._inflight, self._pending = self._pending, {}
+            folders = set()
+            for path, data in self._inflight.items():
+                try:
+                    atomic_write_json(path, data, self.fsync, sync_dir=False)
+                except Exception as e:
+                    with self._cond:
+                        self._errors.append((path, f"{type(e).__name__}: {e}"))
+                    continue
+                folders.add(os.path.dirname(path) or ".")
+                self.writes += 1
+                if self.on_written is not None:
+                    self.on_written(path)
+            if self.fsync:
+                for folder in folders:
+                    with contextlib.suppress(OSError):
+                        _fsync_dir(folder)
+            with self._cond:
+                self._inflight = {}
+                self._cond.notify_all()
+
+
+# =========================
+# Storage backends
+# =========================
+def read_json(path: str, version: Any = None) -> Any:
+    # version is only there so callers can key a cache on it
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+class JsonStorage:
+    """One JSON file per document. The default backend.
+
+    In the app, reads go through a FileWatcher (versions without touching
+    the disk) and a cached `reader`, and saves through the WriteBehind
+    queue. Without them (scripts) every call reads or writes the file
+    directly.
+    """
+
+    name = "json"
+
+    def __init__(self, watcher: Optional[FileWatcher] = None, writer: Optional[WriteBehind] = None,
+                 reader=read_json, ledger_path: str = LEDGER_FILE, snapshot_path: str = INGREDIENT_FILE):
+        self.watcher = watcher
+        self.writer = writer
+        self.reader = reader
+        self.ledger_path = ledger_path
+        self.snapshot_path = snapshot_path
+        self._lock = threading.Lock()
+
+    def version(self, path: str) -> Optional[str]:
+        """Changes whenever anyone saves `path` (None = no such document)."""
+        rev = self.writer.revision(path) if self.writer is not None else 0
+        if self.watcher is not None:
+            version = self.watcher.version(path)
+        else:
+            try:
+                version = content_hash(path)
+            except FileNotFoundError:
+                version = None
+        return None if version is None and not rev else f"{version}:{rev}"
+
+    def load(self, path: str, default: Any) -> Any:
+        if self.writer is not None:
+            queued, data = self.writer.pending(path)
+            if queued:  # read your own writes before they reach the disk
+                return copy.deepcopy(data)
+        if self.watcher is None:
+            try:
+                return self.reader(path)
+            except FileNotFoundError:
+                return default
+        version = self.watcher.version(path)
+        return default if version is None else self.reader(path, version)
+
+    def save(self, path: str, data: Any, wait: bool = False):
+        if self.writer is None:
+            atomic_write_json(path, data)
+            return
+        self.writer.save(path, data)
+        if wait:
+            self.writer.flush()
+
+    def update(self, path: str, changes: Mapping[str, Any]):
+        """Set some keys of a {key: value} document (the whole file is rewritten)."""
+        with self._lock:
+            doc = dict(self.load(path, {}))
+            doc.update(changes)
+            self.save(path, doc)
+
+    def ledger(self) -> "InventoryLedger":
+        from .ledger import InventoryLedger
+        return InventoryLedger(self.ledger_path, self.snapshot_path, watcher=self.watcher)
+
+
+class SqliteStorage:
+    """All documents in one SQLite database (WAL mode).
+
+    A document is named after its JSON file and stored one row per key (or
+    list item) in `rows`, so update() writes only the rows that changed and
+    readers never see a half-saved document. Inventory events go to their
+    own tables (see SqliteLedger). Each process keeps one connection, shared
+    under `lock`; commits from other processes are noticed through
+    PRAGMA data_version, which costs no disk read.
+    """
+
+    name = "sqlite"
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS documents (
+            doc  TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,           -- 'dict' or 'list'
+            rev  INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS rows (
+            doc   TEXT NOT NULL,
+            key   TEXT NOT NULL,          -- dict key, or list position
+            pos   INTEGER NOT NULL,       -- keeps the document's order
+            value TEXT NOT NULL,          -- JSON
+            PRIMARY KEY (doc, key)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS rows_by_pos ON rows (doc, pos);
+        CREATE TABLE IF NOT EXISTS inventory_events (
+            seq        INTEGER PRIMARY KEY,
+            ts         TEXT NOT NULL,
+            type       TEXT NOT NULL,
+            ingredient TEXT NOT NULL,
+            amount     REAL,
+            unit       TEXT,
+            grams      REAL,
+            txn        TEXT,
+            note       TEXT
+        );
+        CREATE INDEX IF NOT EXISTS inventory_events_by_ingredient ON inventory_events (ingredient, seq);
+        CREATE INDEX IF NOT EXISTS inventory_events_by_txn ON inventory_events (txn);
+        CREATE TABLE IF NOT EXISTS inventory_stock (
+            ingredient TEXT PRIMARY KEY,
+            grams      REAL NOT NULL,
+            unit       TEXT NOT NULL,
+            last_seq   INTEGER NOT NULL
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS meta (
+            key   TEXT PRIMARY KEY,
+            value TEXT
+        );
+    """
+
+    def __init__(self, path: str, readonly: bool = False):
+        self.path = path
+        self.lock = threading.RLock()
+        if readonly:
+            # an existing database only (FileNotFoundError otherwise); writes raise sqlite3.OperationalError
+            if not os.path.exists(path):
+                raise FileNotFoundError(path)
+            uri = f"file:{urllib.request.pathname2url(os.path.abspath(path))}?mode=ro"
+            self.conn = sqlite3.connect(uri, uri=True, timeout=10, check_same_thread=False, isolation_level=None)
+        else:
+            # autocommit mode: transactions are opened explicitly in transaction()
+            self.conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")  # durable at checkpoints; WAL keeps it consistent
+            self.conn.executescript(self.SCHEMA)
+        self._cache: Dict[str, tuple] = {}  # doc -> (rev, kind, data)
+        self._data_version = None
+
+    @staticmethod
+    def doc(path: str) -> str:
+        return os.path.basename(path)
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """BEGIN IMMEDIATE ... COMMIT: takes the database write lock up front."""
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.conn
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    def data_version(self) -> int:
+        """Changes when another connection commits (our own commits don't move it)."""
+        with self.lock:
+            return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def meta(self, key: str) -> Optional[str]:
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str):
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    # ---- documents ----
+    def version(self, path: str) -> Optional[str]:
+        rev = self._get(self.doc(path))[0]
+        return None if rev is None else f"db:{rev}"
+
+    def load(self, path: str, default: Any) -> Any:
+        rev, _, data = self._get(self.doc(path))
+        return default if rev is None else copy.deepcopy(data)
+
+    def save(self, path: str, data: Any, wait: bool = False):
+        """Replace a whole document; only rows that differ are written."""
+        if isinstance(data, list):
+            # keyed by position: equal items are still separate rows
+            rows = {str(i): (i, v) for i, v in enumerate(data)}
+            self._write(self.doc(path), "list", rows, replace=True)
+        else:
+            rows = {str(k): (i, v) for i, (k, v) in enumerate(data.items())}
+            self._write(self.doc(path), "dict", rows, replace=True)
+
+    def update(self, path: str, changes: Mapping[str, Any]):
+        """Set some keys of a {key: value} document, leaving the other rows alone."""
+        self._write(self.doc(path), "dict", {str(k): (None, v) for k, v in changes.items()}, replace=False)
+
+    def ledger(self) -> "SqliteLedger":
+        from .ledger import SqliteLedger
+        return SqliteLedger(self)
+
+    # ---- internals ----
+    def _get(self, doc: str) -> tuple:
+        with self.lock:
+            dv = self.data_version()
+            if dv != self._data_version:  # someone else committed: drop what we cached
+                self._cache.clear()
+                self._data_version = dv
+            hit = self._cache.get(doc)
+            if hit is None:
+                row = self.conn.execute("SELECT kind, rev FROM documents WHERE doc = ?", (doc,)).fetchone()
+                if row is None:
+                    hit = (None, None, None)
+                else:
+                    kind, rev = row
+                    items = self.conn.execute(
+                        "SELECT key, value FROM rows WHERE doc = ? ORDER BY pos", (doc,)).fetchall()
+                    if kind == "list":
+                        data = [json.loads(v) for _, v in items]
+                    else:
+                        data = {k: json.loads(v) for k, v in items}
+                    hit = (rev, kind, data)
+                self._cache[doc] = hit
+            return hit
+
+    def _write(self, doc: str, kind: str, rows: Mapping[str, tuple], replace: bool):
+        with self.transaction() as conn:
+            old = {k: (pos, v) for k, pos, v in
+                   conn.execute("SELECT key, pos, value FROM rows WHERE doc = ?", (doc,))}
+            next_pos = max((pos for pos, _ in old.values()), default=-1) + 1
+            upserts = []
+            for key, (pos, value) in rows.items():
+                if pos is None:  # update(): existing keys stay put, new ones go last
+                    if key in old:
+                        pos = old[key][0]
+                    else:
+                        pos, next_pos = next_pos, next_pos + 1
+                text = json.dumps(value, ensure_ascii=False)
+                if old.get(key) != (pos, text):
+                    upserts.append((doc, key, pos, text))
+            gone = [(doc, k) for k in old if k not in rows] if replace else []
+            conn.executemany(
+                "INSERT INTO rows (doc, key, pos, value) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (doc, key) DO UPDATE SET pos = excluded.pos, value = excluded.value", upserts)
+            conn.executemany("DELETE FROM rows WHERE doc = ? AND key = ?", gone)
+            if upserts or gone or not old:
+                conn.execute(
+                    "INSERT INTO documents (doc, kind, rev) VALUES (?, ?, 1) "
+                    "ON CONFLICT (doc) DO UPDATE SET rev = rev + 1" + (", kind = excluded.kind" if replace else ""),
+                    (doc, kind))
+        self._cache.pop(doc, None)
+
+
+def import_json_storage(db: SqliteStorage, paths=DOCUMENT_FILES, ledger_path: str = LEDGER_FILE,
+                        snapshot_path: str = INGREDIENT_FILE) -> list[str]:
+    """One-shot import of the JSON files into a new database.
+
+    Copies every document in `paths` the database doesn't have yet, and
+    seeds the inventory with one "count" event per ingredient from the JSON
+    ledger's current stock (the old event history stays in `ledger_path`).
+    Runs once per database; returns the names of what was imported.
+    """
+    if db.meta("json_import"):
+        return []
+    done = []
+    for path in paths:
+        if db.version(path) is None and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                db.save(path, json.load(f))
+            done.append(os.path.basename(path))
+    ledger = db.ledger()
+    if not ledger.seq and (os.path.exists(ledger_path) or os.path.exists(snapshot_path)):
+        stock = JsonStorage(ledger_path=ledger_path, snapshot_path=snapshot_path).ledger().inventory()
+        ledger.append([{"type": "count", "ingredient": ing, "amount": v["amount"], "unit": v["unit"],
+                        "note": "imported from JSON"} for ing, v in stock.items()], txn="json-import")
+        done.append(os.path.basename(ledger_path))
+    db.set_meta("json_import", time.strftime("%Y-%m-%dT%H:%M:%S"))
+    return done
+
+def open_storage(backend: str = STORAGE_BACKEND, db_path: str = DB_FILE, readonly: bool = False):
+    """Storage for scripts: plain file access for "json", or the database
+    for "sqlite" (importing the JSON files the first time). With `readonly`
+    the database must already exist and is opened read-only."""
+    if backend == "sqlite":
+        if readonly:
+            return SqliteStorage(db_path, readonly=True)
+        db = SqliteStorage(db_path)
+        import_json_storage(db)
+        return db
+    if backend != "json":
+        raise ValueError(f"Unknown storage backend: {backend!r} (use 'json' or 'sqlite')")
+    return JsonStorage()
+
+
+# =========================
+# Per-key merged saves
+# =========================
+class SaveConflict(NamedTuple):
+    key: str
+    mine: Any    # what this session tried to save
+    theirs: Any  # what someone else saved in the meantime (kept)
+    base: Any    # what the edit was made on
+
+_MERGE_LOCK = threading.Lock()
+
+def save_merged(storage, path: str, changes: Mapping[str, Any], base: Mapping[str, Any], base_version: Optional[str] = None,
+                     default: Any = None, normalize=None) -> list[SaveConflict]:
+    """Conditional per-key save for {key: value} documents.
+
+    `changes` are one session's edits and `base` the values they were made on
+    (`base_version` = storage.version(path) at that point). The latest document
+    is re-read under a lock and the changes are merged into it, so edits of
+    different keys from different devices never erase each other. A key
+    someone else changed in the meantime is a conflict: their value is kept
+    and the conflict is returned for the caller to report.
+    """
+    with _MERGE_LOCK:
+        raw = storage.load(path, {} if default is None else default)
+        current = normalize(raw) if normalize else dict(raw)
+        unchanged = base_version is not None and storage.version(path) == base_version
+        applied = {}
+        conflicts = []
+        for k, mine in changes.items():
+            theirs = current.get(k)
+            if not unchanged and theirs != base.get(k) and theirs != mine:
+                conflicts.append(SaveConflict(k, mine, theirs, base.get(k)))
+            elif raw.get(k) != mine:
+                applied[k] = mine
+        if applied:
+            storage.update(path, applied)  # row-level on sqlite
+        return conflicts
@@ -0,0 +1,92 @@
+"""Unit conversion: fixed mass units, volumes through a density, and
+per-ingredient pack sizes. numpy is only imported for the vector helpers."""
+import math
+import threading
+from collections.abc import Mapping
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+from .config import PACK_FACTORS, UNIT_ALIASES, UNIT_FACTORS, VOLUME_ML
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+def canonical_unit(unit: str) -> str:
+    u = (unit or "g").strip().lower()
+    return UNIT_ALIASES.get(u, u)
+
+def normalize_units_schema(raw: Dict[str, Any]) -> Dict[str, Any]:
+    """{ingredient: {"density_g_per_ml": float, "packs": {unit: grams per pack}}}"""
+    spec: Dict[str, Any] = {}
+    for ing, v in (raw or {}).items():
+        if not isinstance(v, dict):
+            continue
+        entry: Dict[str, Any] = {}
+        if v.get("density_g_per_ml"):
+            entry["density_g_per_ml"] = float(v["density_g_per_ml"])
+        packs = {canonical_unit(u): float(g) for u, g in (v.get("packs") or {}).items() if g}
+        if packs:
+            entry["packs"] = packs
+        if entry:
+            spec[str(ing)] = entry
+    return spec
+
+class UnitRegistry:
+    """Grams-per-unit lookup: fixed mass units, volumes through a density
+    (water if the ingredient has none on file), and per-ingredient pack sizes."""
+
+    def __init__(self, per_ingredient: Optional[Mapping[str, Any]] = None, default_density: float = 1.0):
+        self.per_ingredient = per_ingredient or {}
+        self.default_density = default_density
+        self._compiled: Dict[tuple, Any] = {}  # (ingredients, units) -> read-only np.ndarray
+        self._lock = threading.Lock()
+
+    def density(self, ingredient: Optional[str]) -> float:
+        return float((self.per_ingredient.get(ingredient) or {}).get("density_g_per_ml", self.default_density))
+
+    def factor(self, unit: str, ingredient: Optional[str] = None) -> float:
+        u = canonical_unit(unit)
+        if u in UNIT_FACTORS:
+            return UNIT_FACTORS[u]
+        if u in VOLUME_ML:
+            return VOLUME_ML[u] * self.density(ingredient)
+        packs = (self.per_ingredient.get(ingredient) or {}).get("packs") or {}
+        if u in packs:
+            return packs[u]
+        return PACK_FACTORS.get(u, math.nan)
+
+    def compile(self, ingredients: tuple, units: tuple) -> "np.ndarray":
+        """Grams-per-unit vector aligned with `ingredients` (NaN = can't convert).
+
+        Memoized per unit assignment, so converting a whole inventory or
+        threshold table is one elementwise multiply.
+        """
+        key = (ingredients, units)
+        vec = self._compiled.get(key)
+        if vec is None:
+            import numpy as np
+            vec = np.fromiter((self.factor(u, ing) for ing, u in zip(ingredients, units)),
+                              dtype=np.float64, count=len(ingredients))
+            vec.flags.writeable = False
+            with self._lock:
+                if len(self._compiled) >= 16:
+                    self._compiled.clear()
+                self._compiled[key] = vec
+        return vec
+
+    def to_grams_vector(self, ingredients: tuple, table: Mapping[str, Any], field: str = "amount",
+                        default_unit: str = "g") -> "np.ndarray":
+        """Align {ingredient: {field, unit}} with `ingredients` and convert in one go."""
+        import numpy as np
+        rows = [table.get(ing) or {} for ing in ingredients]
+        amounts = np.fromiter((float(r.get(field, 0) or 0) for r in rows), dtype=np.float64, count=len(rows))
+        units = tuple(r.get("unit", default_unit) for r in rows)
+        # zero of an unconvertible unit is still zero
+        return np.where(amounts == 0, 0.0, amounts * self.compile(tuple(ingredients), units))
+
+BASE_UNITS = UnitRegistry()
+
+def to_grams(amount: float, unit: str, ingredient: Optional[str] = None, registry: Optional[UnitRegistry] = None) -> float:
+    """Grams for `amount` of `unit`; NaN when the unit can't be converted
+    (e.g. cans of an ingredient with no can size on file)."""
+    return float(amount) * (registry or BASE_UNITS).factor(unit, ingredient)
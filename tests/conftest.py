@@ -0,0 +1,5 @@
+import os
+import sys
+
+# run from a checkout: `python -m pytest` in the repo folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,78 @@
+import json
+
+import pytest
+
+from icecream_core.api import ApiState, dispatch
+from icecream_core.config import RECIPES_PATH
+from icecream_core.storage import SqliteStorage
+
+
+@pytest.fixture
+def state(tmp_path):
+    db = SqliteStorage(str(tmp_path / "icecream.db"))
+    db.save(RECIPES_PATH, {"Banana": {"ingredients": {"milk": 700, "sugar": 200, "banana": 100}, "instruction": []}})
+    return ApiState(storage=db)
+
+
+def call(state, method, path, body=None):
+    return dispatch(state, method, path, json.dumps(body).encode() if body is not None else b"")
+
+
+def test_scale(state):
+    status, out = call(state, "POST", "/scale", {"recipe": "banana", "factor": 2})
+    assert status == 200 and out["ingredients"] == {"milk": 1400, "sugar": 400, "banana": 200}
+
+
+@pytest.mark.parametrize("body", [
+    {"recipe": ["Banana"], "factor": 1},
+    {"recipe": None, "factor": 1},
+    {"recipe": "Banana", "containers": ["a"]},
+    {"recipe": "Banana", "containers": {"1.5 gal tub": 1e400}},
+    {"recipe": "Banana", "containers": {"1.5 gal tub": -1}},
+    {"recipe": "Banana", "containers": {"1.5 gal tub": 1.5}},
+    {"recipe": "Banana", "containers": {"1.5 gal tub": True}},
+    {"recipe": "Banana", "weight_g": True},
+    {"recipe": "Banana", "weight_g": "500"},
+    {"recipe": "Banana", "factor": "nan"},
+    {"recipe": "Banana", "factor": 0},
+    {"recipe": "Banana", "weight_g": 1e400},
+    {"recipe": "Banana", "containers": {"1.5 gal tub": 1}, "density": 0},
+])
+def test_bad_scale_requests_are_400(state, body):
+    for path in ("/scale", "/explode"):
+        status, out = call(state, "POST", path, body)
+        assert status == 400, out
+
+
+def test_events(state):
+    status, out = call(state, "POST", "/inventory/events",
+                       {"events": [{"type": "receive", "ingredient": "sugar", "amount": 500, "unit": "g"},
+                                   {"type": "count", "ingredient": "milk", "amount": 0}]})
+    assert status == 200 and out["seq"] == 2
+    assert call(state, "GET", "/inventory")[1]["inventory"]["sugar"] == {"amount": 500.0, "unit": "g"}
+
+
+@pytest.mark.parametrize("event", [
+    {"type": "receive", "ingredient": "sugar", "amount": -5000, "unit": "g"},
+    {"type": "consume", "ingredient": "sugar", "amount": 0, "unit": "g"},
+    {"type": "count", "ingredient": "sugar", "amount": -1, "unit": "g"},
+    {"type": "receive", "ingredient": "sugar", "amount": True, "unit": "g"},
+    {"type": "receive", "ingredient": "sugar", "amount": "5", "unit": "g"},
+    {"type": "receive", "ingredient": "sugar", "amount": 1e400, "unit": "g"},
+    {"type": "consume", "ingredient": "sugar", "amount": 5, "unit": 7},
+    {"type": "receive", "ingredient": ["sugar"], "amount": 5, "unit": "g"},
+    {"type": "spill", "ingredient": "sugar", "amount": 5, "unit": "g"},
+])
+def test_bad_events_are_400(state, event):
+    call(state, "POST", "/inventory/events", {"events": [{"type": "receive", "ingredient": "sugar", "amount": 500}]})
+    status, out = call(state, "POST", "/inventory/events", {"events": [event]})
+    assert status == 400, out
+    assert state.ledger.seq == 1 and state.ledger.stock_g("sugar") == 500
+    feas = call(state, "GET", "/feasibility")[1]["recipes"][0]
+    assert feas["max_factor"] is None or feas["max_factor"] >= 0
+
+
+def test_bad_expect_is_400(state):
+    ev = {"type": "receive", "ingredient": "sugar", "amount": 5}
+    for expect in (["sugar"], {"sugar": 1e400}, {"sugar": True}):
+        assert call(state, "POST", "/inventory/events", {"events": [ev], "expect": expect})[0] == 400
@@ -0,0 +1,52 @@
+import pytest
+
+from icecream_core.containers import container_capacity_g, containers_weight_g, pack_containers
+
+CONTAINERS = {
+    "5 L pan": {"volume_l": 5.0, "fill": 1.0, "slots": 1.0},
+    "1 L tub": {"volume_l": 1.0, "fill": 1.0, "slots": 0.5},
+}
+
+
+def test_capacity_and_reverse():
+    assert container_capacity_g(CONTAINERS["5 L pan"], 1.0) == 5000
+    assert containers_weight_g({"5 L pan": 2, "1 L tub": 3, "unknown": 9}, CONTAINERS, 1.0) == 13000
+
+
+def test_exact_fill_uses_fewest_slots():
+    p = pack_containers(11000, CONTAINERS, 1.0)
+    assert p.counts == {"5 L pan": 2, "1 L tub": 1}
+    assert p.packed_g == 11000 and p.leftover_g == 0 and p.slots == 2.5
+
+
+def test_never_overfills():
+    p = pack_containers(5500, CONTAINERS, 1.0)
+    assert p.packed_g <= 5500 and p.leftover_g == pytest.approx(500)
+    assert p.counts == {"5 L pan": 1, "1 L tub": 0}
+
+
+def test_max_slots():
+    p = pack_containers(11000, CONTAINERS, 1.0, max_slots=1.5)
+    assert p.slots <= 1.5
+    assert p.packed_g == 6000 and p.counts == {"5 L pan": 1, "1 L tub": 1}
+
+
+def test_nothing_fits():
+    p = pack_containers(500, CONTAINERS, 1.0)
+    assert p.counts == {"5 L pan": 0, "1 L tub": 0}
+    assert p.packed_g == 0 and p.leftover_g == 500
+
+
+def test_big_targets_stay_bounded():
+    from icecream_core.config import PACK_MAX_STEPS
+    from icecream_core.containers import _PACK_TABLES
+
+    for target in (1e6, 1e9):
+        p = pack_containers(target, CONTAINERS, 1.0)
+        assert p.packed_g <= target and p.leftover_g < 1000  # less than the smallest container
+    assert max(len(cost) for cost, _ in _PACK_TABLES.values()) <= 2 * PACK_MAX_STEPS + 1
+
+
+def test_big_target_with_max_slots():
+    p = pack_containers(1e9, CONTAINERS, 1.0, max_slots=100)
+    assert p.slots <= 100 and p.packed_g == 500000  # 5 L pans hold the most per slot
@@ -0,0 +1,80 @@
+import math
+
+import numpy as np
+import pytest
+
+from icecream_core.index import (
+    RecipeCatalog, RecipeCycleError, explode_recipe, plan_requirements, scale_target, scaled_subrecipes,
+)
+from icecream_core.schema import normalize_recipes_schema, scale_subrecipes
+
+RECIPES = {
+    "Black Sesame": {
+        "ingredients": {"milk": 1000, "sugar": 200, "yolks": 80, "black sesame paste": 100},
+        "instruction": ["Mix.", "Blend in the paste."],
+        "subrecipes": {"black sesame paste": {"ingredients": {"black sesame": 90, "sesame oil": 10},
+                                              "instruction": ["Roast.", "Grind."]}},
+    },
+    "Caramel": {"ingredients": {"sugar": 500, "cream": 500}, "instruction": []},
+    "Salted Caramel": {"ingredients": {"milk": 800, "Caramel": 200, "salt": 5}, "instruction": []},
+}
+
+
+@pytest.fixture(scope="module")
+def catalog():
+    return RecipeCatalog("recipes.json", "v1", normalize_recipes_schema(RECIPES), {"yolks": "egg yolks"})
+
+
+def test_scaled_subrecipes_match_scale_subrecipes(catalog):
+    entry = catalog.index.recipes["Black Sesame"]
+    subs = catalog.get("Black Sesame")["subrecipes"]
+    for factor in (0.5, 1.0, 2.37):
+        expected = scale_subrecipes(RECIPES["Black Sesame"]["subrecipes"], factor)
+        got = scaled_subrecipes(entry, subs, factor)
+        assert {s: v["ingredients"] for s, v in got.items()} == {s: v["ingredients"] for s, v in expected.items()}
+        assert [list(v["instruction"]) for v in got.values()] == [v["instruction"] for v in expected.values()]
+
+
+def test_explode_expands_subrecipes(catalog):
+    factor = 2.0
+    sub = scale_subrecipes(RECIPES["Black Sesame"]["subrecipes"], factor)["black sesame paste"]["ingredients"]
+    raw = explode_recipe(catalog.index, "Black Sesame", factor)
+    assert "black sesame paste" not in raw
+    assert raw == {"milk": 2000, "sugar": 400, "egg yolks": 160, **sub}
+
+
+def test_explode_expands_referenced_recipes(catalog):
+    raw = explode_recipe(catalog.index, "Salted Caramel", 1.0)
+    assert raw == {"milk": 800, "sugar": 100, "cream": 100, "salt": 5}
+
+
+def test_plan_requirements_sums_exploded_batches(catalog):
+    idx = catalog.index
+    targets = {"Black Sesame": 2760.0, "Salted Caramel": 1005.0, "Caramel": 0}
+    totals = plan_requirements(idx, targets)
+    expected = np.zeros(len(idx.ingredients))
+    for name, weight in targets.items():
+        if weight > 0:
+            for ing, g in explode_recipe(idx, name, weight / idx.recipes[name].total_weight).items():
+                expected[idx.ingredient_ids[ing]] += g
+    np.testing.assert_allclose(totals, expected, atol=0.01)
+    assert totals[idx.ingredient_ids["Caramel"]] == 0  # intermediate, not bought
+
+
+def test_cycle_is_reported():
+    recipes = {"A": {"ingredients": {"B": 1}, "instruction": []}, "B": {"ingredients": {"A": 1}, "instruction": []}}
+    catalog = RecipeCatalog("recipes.json", "v1", normalize_recipes_schema(recipes))
+    with pytest.raises(RecipeCycleError):
+        explode_recipe(catalog.index, "A")
+    with pytest.raises(RecipeCycleError):
+        plan_requirements(catalog.index, {"A": 100})
+
+
+def test_scale_target(catalog):
+    entry = catalog.index.recipes["Caramel"]
+    assert scale_target(entry, factor=2) == (2.0, 2000.0)
+    assert scale_target(entry, weight_g=500) == (0.5, 500.0)
+    for bad in ({"factor": math.nan}, {"factor": 0}, {"factor": -1}, {"weight_g": math.inf}, {"weight_g": 0},
+                {"factor": 1e308}):
+        with pytest.raises(ValueError):
+            scale_target(entry, **bad)
@@ -0,0 +1,133 @@
+import json
+
+import pytest
+
+from icecream_core.ledger import InventoryLedger
+from icecream_core.storage import SqliteStorage
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def open_ledger(request, tmp_path):
+    """Factory: each call is another process's view of the same ledger."""
+    if request.param == "json":
+        return lambda **kw: InventoryLedger(str(tmp_path / "ledger.jsonl"), str(tmp_path / "inventory.json"), **kw)
+    return lambda **kw: SqliteStorage(str(tmp_path / "icecream.db")).ledger()
+
+
+def ev(etype, ing, amount, unit="g", **kw):
+    return {"type": etype, "ingredient": ing, "amount": amount, "unit": unit, **kw}
+
+
+def test_append_updates_stock(open_ledger):
+    led = open_ledger()
+    records = led.append([ev("receive", "milk", 2, "kg"), ev("consume", "milk", 500), ev("count", "sugar", 3, "kg")])
+    assert [r["seq"] for r in records] == [1, 2, 3]
+    assert led.stock_g("milk") == 1500
+    assert led.inventory()["sugar"] == {"amount": 3.0, "unit": "kg"}
+    assert led.version("milk") == 2
+    led.append([ev("consume", "milk", 9999)])
+    assert led.stock_g("milk") == 0  # consumption clamps at zero
+
+
+def test_refresh_sees_other_writers(open_ledger):
+    a, b = open_ledger(), open_ledger()
+    a.append([ev("receive", "cream", 1000)])
+    assert b.stale()
+    b.refresh()
+    assert b.stock_g("cream") == 1000
+    # b numbers its events after a's
+    assert b.append([ev("consume", "cream", 100)])[0]["seq"] == 2
+    a.refresh()
+    assert a.stock_g("cream") == 900 and a.seq == 2
+
+
+def test_bad_batch_does_not_use_seqs(open_ledger):
+    a, b = open_ledger(), open_ledger()
+    a.append([ev("receive", "milk", 1000)])
+    with pytest.raises(ValueError):
+        a.append([ev("receive", "milk", 1), ev("spill", "milk", 1)])
+    with pytest.raises(ValueError):
+        a.append([ev("receive", "vanilla", 1, "cans")])  # no can size on file
+    assert a.seq == 1 and a.stock_g("milk") == 1000
+    b.append([ev("receive", "cream", 500)])
+    a.refresh()
+    assert a.stock_g("cream") == 500
+
+
+def test_append_checked_holds_back_stale_keys(open_ledger):
+    a, b = open_ledger(), open_ledger()
+    a.append([ev("count", "milk", 1000), ev("count", "sugar", 1000)])
+    b.refresh()
+    seen = {k: ((k,), b.version(k)) for k in ("milk", "sugar")}
+    a.append([ev("consume", "milk", 100)])
+    records, stale = b.append_checked([ev("count", "milk", 5000), ev("count", "sugar", 5000)], seen)
+    assert stale == ["milk"]
+    assert [r["ingredient"] for r in records] == ["sugar"]
+    assert b.stock_g("milk") == 900 and b.stock_g("sugar") == 5000
+
+
+def test_compaction_snapshot_and_replay(tmp_path):
+    ledger_path, snap_path = str(tmp_path / "ledger.jsonl"), str(tmp_path / "inventory.json")
+    led = InventoryLedger(ledger_path, snap_path, compact_every=3)
+    led.append([ev("receive", "milk", 1000), ev("receive", "milk", 1000), ev("receive", "milk", 1000)])
+    with open(snap_path, encoding="utf-8") as f:
+        snap = json.load(f)
+    assert snap["_snapshot"]["seq"] == 3
+    assert snap["milk"] == {"amount": 3000.0, "unit": "g"}
+    led.append([ev("consume", "milk", 500)])  # after the snapshot: replayed from the log
+
+    again = InventoryLedger(ledger_path, snap_path, compact_every=3)
+    assert again.seq == 4 and again.stock_g("milk") == 2500
+
+
+def test_pre_ledger_inventory_seeds_the_view(tmp_path):
+    snap_path = tmp_path / "inventory.json"
+    snap_path.write_text(json.dumps({"milk": {"amount": 2, "unit": "kg"}}), encoding="utf-8")
+    led = InventoryLedger(str(tmp_path / "ledger.jsonl"), str(snap_path))
+    assert led.stock_g("milk") == 2000 and led.seq == 0
+
+
+def test_consumption_comes_out_of_legacy_spellings(open_ledger):
+    # stock counted before the alias existed is still filed under "yolks"/"guar"
+    from icecream_core.index import RecipeCatalog, draw_from_stock, merge_stock, post_batch_consumption
+    from icecream_core.schema import normalize_recipes_schema
+
+    recipes = {"Black Sesame": {"ingredients": {"milk": 1000, "egg yolks": 80, "guar gum": 4}, "instruction": []}}
+    catalog = RecipeCatalog("recipes.json", "v1", normalize_recipes_schema(recipes),
+                            {"yolks": "egg yolks", "guar": "guar gum"})
+    names = catalog.index.names
+    led = open_ledger()
+    led.append([ev("count", "milk", 5, "kg"), ev("count", "yolks", 1, "kg"), ev("count", "guar", 10),
+                ev("count", "guar gum", 5)])
+
+    post_batch_consumption(led, catalog.index, "Black Sesame", 2.0)
+    stock = names.rekey(led.inventory(), merge_stock)
+    assert stock["egg yolks"] == {"amount": 0.84, "unit": "kg"}
+    assert stock["milk"] == {"amount": 3.0, "unit": "kg"}
+    assert led.stock_g("guar gum") == 0 and led.stock_g("guar") == 7  # canonical key drawn first
+
+    led.append(draw_from_stock(led, names, [ev("waste", "egg yolks", 1, "kg")]))
+    assert led.stock_g("yolks") == 0 and led.stock_g("egg yolks") == 0
+
+
+@pytest.mark.parametrize("bad", [ev("receive", "milk", -5), ev("count", "milk", -1), ev("receive", "milk", True),
+                                 ev("receive", "milk", 5, unit=7)])
+def test_ledger_rejects_bad_amounts_and_units(open_ledger, bad):
+    led = open_ledger()
+    led.append([ev("receive", "milk", 100)])
+    with pytest.raises(ValueError):
+        led.append([bad])
+    assert led.seq == 1 and led.stock_g("milk") == 100
+
+
+def test_overdraw_is_one_event_per_key(open_ledger):
+    from icecream_core.index import RecipeCatalog, draw_from_stock
+    from icecream_core.schema import normalize_recipes_schema
+
+    recipes = {"Syrup": {"ingredients": {"sugar": 100, "egg yolks": 10}, "instruction": []}}
+    names = RecipeCatalog("recipes.json", "v1", normalize_recipes_schema(recipes), {"yolks": "egg yolks"}).index.names
+    led = open_ledger()
+    led.append([ev("count", "sugar", 500), ev("count", "egg yolks", 50), ev("count", "yolks", 20)])
+
+    out = draw_from_stock(led, names, [ev("consume", "sugar", 1293.6), ev("consume", "egg yolks", 100)])
+    assert [(e["ingredient"], e["amount"]) for e in out] == [("sugar", 1293.6), ("egg yolks", 80), ("yolks", 20)]
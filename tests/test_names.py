@@ -0,0 +1,20 @@
+from icecream_core.names import IngredientNames
+
+
+def test_suggestion_keeps_the_more_used_spelling():
+    names = IngredientNames({"strawberry": 3, "sreawberry": 1})
+    (s,) = names.suggestions()
+    assert (s.alias, s.into, s.decided) == ("sreawberry", "strawberry", True)
+
+
+def test_tie_goes_to_the_known_spelling():
+    names = IngredientNames({"strawberry": 1, "sreawberry": 1})
+    (s,) = names.suggestions(known=["Strawberry"])
+    assert (s.alias, s.into, s.decided) == ("sreawberry", "strawberry", True)
+    (s,) = names.suggestions()
+    assert not s.decided  # nothing to go on: listed, but the user picks
+
+
+def test_aliases_are_not_suggested():
+    names = IngredientNames({"strawberry": 1, "sreawberry": 1}, {"sreawberry": "strawberry"})
+    assert names.suggestions() == ()
@@ -0,0 +1,83 @@
+import pytest
+
+from icecream_core.storage import JsonStorage, SaveConflict, SqliteStorage, save_merged
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def storage(request, tmp_path):
+    if request.param == "json":
+        return JsonStorage()
+    return SqliteStorage(str(tmp_path / "icecream.db"))
+
+
+@pytest.fixture
+def doc(tmp_path):
+    return str(tmp_path / "thresholds.json")
+
+
+def test_save_merged_keeps_other_sessions_keys(storage, doc):
+    storage.save(doc, {"milk": 1, "sugar": 1})
+    base, version = storage.load(doc, {}), storage.version(doc)
+    storage.update(doc, {"sugar": 2})  # someone else
+    assert save_merged(storage, doc, {"milk": 5}, base, version) == []
+    assert storage.load(doc, {}) == {"milk": 5, "sugar": 2}
+
+
+def test_save_merged_reports_conflicts(storage, doc):
+    storage.save(doc, {"milk": 1, "sugar": 1})
+    base, version = storage.load(doc, {}), storage.version(doc)
+    storage.update(doc, {"milk": 3})
+    conflicts = save_merged(storage, doc, {"milk": 5, "sugar": 7}, base, version)
+    assert conflicts == [SaveConflict("milk", 5, 3, 1)]
+    assert storage.load(doc, {}) == {"milk": 3, "sugar": 7}  # theirs kept, the rest applied
+
+
+def test_save_merged_same_value_is_not_a_conflict(storage, doc):
+    storage.save(doc, {"milk": 1})
+    base, version = storage.load(doc, {}), storage.version(doc)
+    storage.update(doc, {"milk": 5})
+    assert save_merged(storage, doc, {"milk": 5}, base, version) == []
+
+
+def test_save_merged_unchanged_version_wins(storage, doc):
+    storage.save(doc, {"milk": 1})
+    # the base is stale, but nobody saved since base_version: no conflict
+    assert save_merged(storage, doc, {"milk": 5}, {"milk": 0}, storage.version(doc)) == []
+    assert storage.load(doc, {}) == {"milk": 5}
+
+
+def test_sqlite_list_documents_keep_duplicates(tmp_path):
+    db = SqliteStorage(str(tmp_path / "icecream.db"))
+    items = ["vanilla", {"recipe": "Banana"}, "vanilla", {"recipe": "Banana"}]
+    db.save("exclude.json", items)
+    assert db.load("exclude.json", []) == items
+    db.save("exclude.json", items[:1])
+    assert SqliteStorage(str(tmp_path / "icecream.db")).load("exclude.json", []) == ["vanilla"]
+
+
+def test_sqlite_readonly(tmp_path):
+    import sqlite3
+
+    path = str(tmp_path / "icecream.db")
+    with pytest.raises(FileNotFoundError):
+        SqliteStorage(path, readonly=True)
+    SqliteStorage(path).save("thresholds.json", {"milk": 1})
+    ro = SqliteStorage(path, readonly=True)
+    assert ro.load("thresholds.json", {}) == {"milk": 1}
+    with pytest.raises(sqlite3.OperationalError):
+        ro.update("thresholds.json", {"milk": 2})
+
+
+def test_watcher_sees_same_size_replace_within_mtime_granularity(tmp_path):
+    import os
+
+    from icecream_core.storage import FileWatcher, atomic_write_json
+
+    path = str(tmp_path / "lineup.json")
+    atomic_write_json(path, {"flavor": "A"}, fsync=False)
+    watcher = FileWatcher([], poll_seconds=3600)
+    before, mtime = watcher.version(path), os.stat(path).st_mtime_ns
+    atomic_write_json(path, {"flavor": "B"}, fsync=False)  # same size, new inode
+    os.utime(path, ns=(mtime, mtime))
+    watcher.check(path)
+    assert watcher.version(path) != before